@@ -5,7 +5,53 @@
 PROJECT_NAME = 'weather_backend'
 
 
-HOUR_IN_SECONDS = 3600
+HOURS_IN_DAY = 24
 GENERATED_ENERGY_DECIMAL_PART_LENGTH = 4
 MEAN_PRESSURE_DECIMAL_PART_LENGTH = 1
 MEAN_SUNSHINE_DURATION_DECIMAL_PART_LENGTH = 2
+COORDINATE_GRID_DECIMAL_PART_LENGTH = 6
+# Values computed by NumPy closer than this (after scaling) to the middle between two rounding results
+# are rounded again in Python, so results are identical to the per-location transforms.
+COLUMNAR_ROUNDING_TOLERANCE = 1e-6
+# Number of forecast dates whose week days are remembered (forecasts of all locations share the same dates).
+DAY_CACHE_SIZE = 64
+
+# PV generation model: output at standard test conditions (1000 W/m², cells at 25 °C) scaled by irradiance,
+# and derated by the power temperature coefficient of crystalline silicon modules. Cells are heated above
+# the air temperature proportionally to irradiance: by (NOCT - 20 °C) at 800 W/m² (nominal operating cell temperature).
+PV_STANDARD_IRRADIANCE = 1000
+PV_REFERENCE_CELL_TEMPERATURE = 25
+PV_TEMPERATURE_COEFFICIENT = -0.004
+PV_NOMINAL_OPERATING_CELL_TEMPERATURE = 45
+PV_NOMINAL_OPERATING_IRRADIANCE = 800
+PV_NOMINAL_OPERATING_AIR_TEMPERATURE = 20
+
+# Cached values are compressed once, when first sent, and then sent as compressed responses on every hit,
+# so the ratio matters more than the speed.
+CACHE_COMPRESSION_LEVEL = 6
+BROTLI_QUALITY = 9
+# Version of the cache payload format, part of the cached model version (entries in other formats are misses).
+CACHE_FORMAT_VERSION = 2
+# Length of the model schema fingerprint stored with cached values.
+CACHE_MODEL_VERSION_LENGTH = 8
+# ETag is a hash of the response body (16 bytes - collisions are practically impossible).
+ETAG_DIGEST_SIZE = 16
+# Bodies created per request (e.g. forecast of a requested installation, or entries read from an out-of-process cache)
+# are compressed only with fast encodings - brotli takes much longer than the rest of the request.
+PER_REQUEST_CONTENT_ENCODINGS = ('gzip',)
+# Cache lookups shouldn't wait long for a database lock - a miss is cheaper than a slow request.
+SQLITE_BUSY_TIMEOUT_MS = 100
+SQLITE_MAX_QUERY_PARAMETERS = 900
+# Expired entries are removed at most once per interval (not on every write, to keep the write lock short).
+SQLITE_SWEEP_INTERVAL_SECONDS = 60
+
+# Upstream responses worth retrying - throttling and (usually temporary) server errors.
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# Count-min sketch size used to find the most requested locations (~128 KB of counters).
+HOT_LOCATION_SKETCH_WIDTH = 4096
+HOT_LOCATION_SKETCH_DEPTH = 4
+
+# Upper bounds (in seconds) of latency histogram buckets, from cache hits (sub-millisecond) to slow upstream requests.
+METRICS_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
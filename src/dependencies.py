@@ -1,30 +1,254 @@
-from fastapi import Depends
+from functools import lru_cache
 
-from src.models import CacheService, WeatherForecastService, WeatherWeekSummaryService
-from src.open_meteo.services import OpenMeteoForecastService, OpenMeteoWeekSummaryService
-from src.services import DailyCacheService
+import httpx
+from fastapi import Depends, Request
+from redis.asyncio import Redis
+
+from src.models import (
+	CacheService,
+	CoordinateGrid,
+	LocationWeatherForecast,
+	WeatherForecast,
+	WeatherForecastService,
+	WeatherWeekSummary,
+	WeatherWeekSummaryService,
+)
+from src.open_meteo.models import OpenMeteoWeatherWeekSummary
+from src.open_meteo.services import OpenMeteoForecastService, OpenMeteoWeatherDataService, OpenMeteoWeekSummaryService
+from src.services import (
+	BoundedCacheService,
+	DailyCacheService,
+	DecimalCoordinateGrid,
+	ExactCoordinateGrid,
+	HotLocationTracker,
+	PrewarmScheduler,
+	RedisCacheService,
+	ResolutionCoordinateGrid,
+	SqliteCacheService,
+)
 from src.settings import settings
+from src.utils import CircuitBreaker, MicroBatcher, RateLimiter, RateLimiterTimeoutError, RetryPolicy
+
+
+# HTTP client shared by the whole application (created and closed in the FastAPI lifespan).
+# Pooled keep-alive connections (and HTTP/2 multiplexing) avoid a new handshake for every upstream request.
+# Timeouts bound the time of a request to a slow upstream (read timeout also applies to writes and waiting
+# for a pooled connection).
+def create_http_client() -> httpx.AsyncClient:
+	return httpx.AsyncClient(
+		timeout=httpx.Timeout(
+			settings.open_meteo_read_timeout_seconds, connect=settings.open_meteo_connect_timeout_seconds
+		),
+		limits=httpx.Limits(
+			max_connections=settings.open_meteo_max_connections,
+			max_keepalive_connections=settings.open_meteo_max_keepalive_connections,
+			keepalive_expiry=settings.open_meteo_keepalive_expiry
+		),
+		http2=settings.open_meteo_http2
+	)
+
+
+# Dependencies used by requests are coroutines - FastAPI calls sync dependencies in a worker thread, which takes
+# longer than the rest of a cached response. Shared instances are created by sync functions, usable on startup.
+async def get_http_client(request: Request) -> httpx.AsyncClient:
+	return request.app.state.http_client
+
+
+# Models stored by out-of-process cache backends.
+CACHED_MODELS = [WeatherForecast, LocationWeatherForecast, WeatherWeekSummary, OpenMeteoWeatherWeekSummary]
+
+
+# Cached, so the whole application shares one cache service instance.
+@lru_cache
+def create_cache_service() -> CacheService:
+	match settings.cache_backend:
+		case 'bounded':
+			return BoundedCacheService(
+				max_entries=settings.cache_max_entries,
+				max_bytes=settings.cache_max_bytes,
+				ttl_seconds=settings.cache_ttl_seconds
+			)
+		case 'redis':
+			return RedisCacheService(
+				redis=Redis.from_url(settings.redis_url, max_connections=settings.redis_max_connections),
+				ttl_seconds=settings.cache_ttl_seconds,
+				models=CACHED_MODELS
+			)
+		case 'sqlite':
+			return SqliteCacheService(
+				path=settings.sqlite_cache_path,
+				ttl_seconds=settings.cache_ttl_seconds,
+				models=CACHED_MODELS
+			)
+		case _:
+			return DailyCacheService()
+
+
+async def get_cache_service() -> CacheService:
+	return create_cache_service()
+
+
+async def get_coordinate_grid() -> CoordinateGrid:
+	match settings.coordinate_grid:
+		case 'decimal':
+			return DecimalCoordinateGrid(decimals=settings.coordinate_grid_decimals)
+		case 'resolution':
+			return ResolutionCoordinateGrid(resolution=settings.coordinate_grid_resolution)
+		case _:
+			return ExactCoordinateGrid()
+
+
+# Cached, so the whole application shares one tracker instance.
+@lru_cache
+def create_hot_location_tracker() -> HotLocationTracker:
+	return HotLocationTracker(capacity=settings.prewarm_top_locations)
+
+
+async def get_hot_location_tracker() -> HotLocationTracker:
+	return create_hot_location_tracker()
+
+
+# Cached, so the whole application shares one circuit breaker (and its state) for Open-Meteo requests.
+# Requests rejected by the rate limiter never reached Open-Meteo, so they don't open the circuit.
+@lru_cache
+def create_circuit_breaker() -> CircuitBreaker:
+	return CircuitBreaker(
+		name='open_meteo',
+		failure_threshold=settings.open_meteo_circuit_failure_threshold,
+		reset_timeout_seconds=settings.open_meteo_circuit_reset_timeout_seconds,
+		ignored_errors=(RateLimiterTimeoutError,)
+	)
+
+
+async def get_circuit_breaker() -> CircuitBreaker:
+	return create_circuit_breaker()
+
+
+# Cached, so requests of all services (and the micro-batcher, and prewarming) share the limits.
+@lru_cache
+def create_rate_limiter() -> RateLimiter:
+	return RateLimiter(
+		name='open_meteo',
+		max_in_flight=settings.open_meteo_max_in_flight_requests,
+		rate_per_second=settings.open_meteo_rate_limit_per_second,
+		burst=settings.open_meteo_rate_limit_burst,
+		max_wait_seconds=settings.open_meteo_rate_limit_max_wait_seconds
+	)
+
+
+async def get_rate_limiter() -> RateLimiter:
+	return create_rate_limiter()
+
+
+# Micro-batcher shared by the whole application (created in the FastAPI lifespan), None when disabled.
+# It sends merged requests through its own data service, the one without a micro-batcher.
+async def create_micro_batcher(
+		http_client: httpx.AsyncClient
+) -> MicroBatcher[tuple[float, float], OpenMeteoWeatherWeekSummary] | None:
+	if not settings.micro_batching_enabled:
+		return None
+
+	weather_data_service = await get_weather_data_service(
+		create_cache_service(), http_client, None, create_circuit_breaker(), create_rate_limiter()
+	)
+
+	return MicroBatcher(
+		function=weather_data_service.fetch_many_weather_data,
+		window_seconds=settings.micro_batching_window_seconds,
+		max_batch_size=settings.open_meteo_max_locations_per_request
+	)
+
+
+async def get_micro_batcher(request: Request) -> MicroBatcher[tuple[float, float], OpenMeteoWeatherWeekSummary] | None:
+	return request.app.state.micro_batcher
 
 
-def get_cache_service() -> CacheService:
-	return DailyCacheService()
+async def get_weather_data_service(
+		cache_service: CacheService = Depends(get_cache_service),
+		http_client: httpx.AsyncClient = Depends(get_http_client),
+		micro_batcher: MicroBatcher[tuple[float, float], OpenMeteoWeatherWeekSummary] | None = Depends(
+			get_micro_batcher
+		),
+		circuit_breaker: CircuitBreaker = Depends(get_circuit_breaker),
+		rate_limiter: RateLimiter = Depends(get_rate_limiter)
+) -> OpenMeteoWeatherDataService:
+	return OpenMeteoWeatherDataService(
+		base_url=settings.open_meteo_base_url,
+		cache_service=cache_service,
+		cache_soft_ttl_seconds=settings.cache_soft_ttl_seconds,
+		http_client=http_client,
+		max_locations_per_request=settings.open_meteo_max_locations_per_request,
+		micro_batcher=micro_batcher,
+		retry_policy=RetryPolicy(
+			max_retries=settings.open_meteo_max_retries,
+			base_delay_seconds=settings.open_meteo_retry_base_delay_seconds,
+			max_delay_seconds=settings.open_meteo_retry_max_delay_seconds
+		),
+		circuit_breaker=circuit_breaker,
+		rate_limiter=rate_limiter
+	)
 
 
-def get_forecast_service(
-		cache_service: CacheService = Depends(get_cache_service)
+async def get_forecast_service(
+		cache_service: CacheService = Depends(get_cache_service),
+		weather_data_service: OpenMeteoWeatherDataService = Depends(get_weather_data_service),
+		coordinate_grid: CoordinateGrid = Depends(get_coordinate_grid),
+		hot_location_tracker: HotLocationTracker = Depends(get_hot_location_tracker)
 ) -> WeatherForecastService:
 	return OpenMeteoForecastService(
-		base_url=settings.open_meteo_base_url,
 		installation_power_kw=settings.installation_power_kw,
 		installation_efficiency=settings.installation_efficiency,
-		cache_service=cache_service
+		cache_service=cache_service,
+		cache_soft_ttl_seconds=settings.cache_soft_ttl_seconds,
+		weather_data_service=weather_data_service,
+		coordinate_grid=coordinate_grid,
+		hot_location_tracker=hot_location_tracker
 	)
 
 
-def get_week_summary_service(
-		cache_service: CacheService = Depends(get_cache_service)
+async def get_week_summary_service(
+		cache_service: CacheService = Depends(get_cache_service),
+		weather_data_service: OpenMeteoWeatherDataService = Depends(get_weather_data_service),
+		coordinate_grid: CoordinateGrid = Depends(get_coordinate_grid),
+		hot_location_tracker: HotLocationTracker = Depends(get_hot_location_tracker)
 ) -> WeatherWeekSummaryService:
 	return OpenMeteoWeekSummaryService(
-		base_url=settings.open_meteo_base_url,
-		cache_service=cache_service
+		cache_service=cache_service,
+		cache_soft_ttl_seconds=settings.cache_soft_ttl_seconds,
+		weather_data_service=weather_data_service,
+		coordinate_grid=coordinate_grid,
+		hot_location_tracker=hot_location_tracker
+	)
+
+
+# Scheduler is created on application startup (outside of any request), so dependencies are resolved manually.
+async def create_prewarm_scheduler(
+		http_client: httpx.AsyncClient,
+		micro_batcher: MicroBatcher[tuple[float, float], OpenMeteoWeatherWeekSummary] | None
+) -> PrewarmScheduler:
+	cache_service = create_cache_service()
+	hot_location_tracker = create_hot_location_tracker()
+	weather_data_service = await get_weather_data_service(
+		cache_service, http_client, micro_batcher, create_circuit_breaker(), create_rate_limiter()
+	)
+	forecast_service = await get_forecast_service(
+		cache_service, weather_data_service, await get_coordinate_grid(), hot_location_tracker
+	)
+	week_summary_service = await get_week_summary_service(
+		cache_service, weather_data_service, await get_coordinate_grid(), hot_location_tracker
+	)
+	# Entries which would become stale before the next run are refreshed now.
+	max_age = max(settings.cache_soft_ttl_seconds - settings.prewarm_interval_seconds, 0)
+
+	async def prewarm(latitude: float, longitude: float) -> None:
+		# Run one after another - the summary reuses weather data fetched for the forecast.
+		await forecast_service.prewarm_weather_forecast(latitude, longitude, max_age)
+		await week_summary_service.prewarm_week_summary(latitude, longitude, max_age)
+
+	return PrewarmScheduler(
+		hot_location_tracker=hot_location_tracker,
+		prewarm=prewarm,
+		top_locations=settings.prewarm_top_locations,
+		interval_seconds=settings.prewarm_interval_seconds,
+		concurrency=settings.prewarm_concurrency
 	)
@@ -1,11 +1,35 @@
-from typing import Annotated, Callable
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Annotated, AsyncIterator, Callable
 
 from fastapi import Depends, FastAPI, Query, Request, Response, status
 from fastapi.responses import JSONResponse
 
-from .dependencies import get_forecast_service, get_week_summary_service
+from .constants import METRICS_CONTENT_TYPE
+from .dependencies import (
+	create_cache_service,
+	create_circuit_breaker,
+	create_http_client,
+	create_micro_batcher,
+	create_prewarm_scheduler,
+	create_rate_limiter,
+	get_coordinate_grid,
+	get_forecast_service,
+	get_week_summary_service,
+)
+from .metrics import NOT_AVAILABLE_ERRORS, REQUEST_DURATION, metrics
 from .models import (
+	CacheEntry,
+	CoordinateGrid,
+	FleetEnergy,
+	FleetEnergyItem,
+	FleetEnergyRequest,
 	WeatherForecast,
+	WeatherForecastBatch,
+	WeatherForecastBatchItem,
+	WeatherForecastBatchRequest,
 	WeatherForecastNotAvailableError,
 	WeatherForecastService,
 	WeatherWeekSummary,
@@ -13,10 +37,86 @@ from .models import (
 	WeatherWeekSummaryService,
 )
 from .settings import settings
-from .utils import create_logger
+from .utils import (
+	CIRCUIT_BREAKER_STATES,
+	CONTENT_ENCODERS,
+	RateLimiterTimeoutError,
+	access_log_fields,
+	create_logger,
+	log_pipeline,
+)
 
-app = FastAPI()
 logger = create_logger(name='App')
+access_logger = create_logger(name='access')
+
+metrics.callback(
+	'cache_operations_total',
+	'Operations of the cache backend (counted by "bounded" backend only).',
+	'counter',
+	('operation',),
+	lambda: {(operation,): count for operation, count in create_cache_service().get_stats().items()}
+)
+metrics.callback(
+	'log_records_lost_total',
+	'Log records dropped by the full log queue or sampled out.',
+	'counter',
+	('reason',),
+	lambda: {(reason,): count for reason, count in log_pipeline.get_stats().items()}
+)
+
+metrics.callback(
+	'open_meteo_circuit_breaker_state',
+	'State of the Open-Meteo circuit breaker (1 for the current state).',
+	'gauge',
+	('state',),
+	lambda: {(state,): int(state == create_circuit_breaker().get_state()) for state in CIRCUIT_BREAKER_STATES}
+)
+metrics.callback(
+	'open_meteo_circuit_breaker_transitions_total',
+	'Transitions of the Open-Meteo circuit breaker to each state.',
+	'counter',
+	('state',),
+	lambda: {(state,): count for state, count in create_circuit_breaker().get_stats().items()}
+)
+metrics.callback(
+	'open_meteo_rate_limiter_requests',
+	'Open-Meteo requests in flight and waiting for the rate limiter.',
+	'gauge',
+	('state',),
+	lambda: {(state,): create_rate_limiter().get_stats()[state] for state in ('in_flight', 'waiting')}
+)
+metrics.callback(
+	'open_meteo_rate_limiter_rejections_total',
+	'Open-Meteo requests not sent, because they waited for the rate limiter too long.',
+	'counter',
+	(),
+	lambda: {(): create_rate_limiter().get_stats()['rejected']}
+)
+
+
+# Resources shared by all requests are created on startup and released on shutdown.
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+	async with create_http_client() as http_client:
+		app.state.http_client = http_client
+		app.state.micro_batcher = await create_micro_batcher(http_client)
+		prewarm_scheduler = await create_prewarm_scheduler(http_client, app.state.micro_batcher)
+
+		if settings.prewarm_enabled:
+			prewarm_scheduler.start()
+
+		yield
+
+		await prewarm_scheduler.stop()
+
+		# Batches in flight still need the HTTP client.
+		if app.state.micro_batcher is not None:
+			await app.state.micro_batcher.close()
+
+	await create_cache_service().close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 # Custom exception handlers, which will catch instances of corresponding errors,
@@ -26,12 +126,10 @@ async def weather_forecast_not_available_error_handler(
 		request: Request, error: WeatherForecastNotAvailableError
 ) -> JSONResponse:
 	logger.error(error)
-
-	# HTTP status code returned for WeatherForecastNotAvailableError Error
-	status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+	NOT_AVAILABLE_ERRORS.inc(error.__class__.__name__)
 
 	# Return a JSON response with the error class name.
-	return JSONResponse(status_code=status_code, content={"id": error.__class__.__name__})
+	return create_not_available_response(error)
 
 
 @app.exception_handler(WeatherWeekSummaryNotAvailableError)
@@ -39,39 +137,230 @@ async def week_summary_not_available_error_handler(
 		request: Request, error: WeatherWeekSummaryNotAvailableError
 ) -> JSONResponse:
 	logger.error(error)
-	status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+	NOT_AVAILABLE_ERRORS.inc(error.__class__.__name__)
+
+	return create_not_available_response(error)
+
+
+# Errors are returned with 500 status code, except for upstream requests rejected by the rate limiter -
+# a temporary overload (503), which clients should retry later.
+def create_not_available_response(error: Exception) -> JSONResponse:
+	content = {"id": error.__class__.__name__}
+
+	if error.args and isinstance(error.args[0], RateLimiterTimeoutError):
+		return JSONResponse(
+			status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+			content=content,
+			headers={'Retry-After': str(math.ceil(settings.open_meteo_rate_limit_max_wait_seconds))}
+		)
 
-	return JSONResponse(status_code=status_code, content={"id": error.__class__.__name__})
+	return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content=content)
 
 
-# Middleware to log incoming requests details. It is run before reaching the endpoint.
+# Middleware writing a compact access log record of every request: method, path, status, latency and cache status
+# (set by the services handling the request). Server errors are logged as warnings, so they are never sampled out.
 @app.middleware("http")
 async def log_request(request: Request, call_next: Callable) -> Response:
-	logger.info(f"Request: {request.method} {request.url} {request.headers}")
+	started_at = time.perf_counter()
+	fields = {'method': request.method, 'path': request.url.path, 'query': request.url.query}
+	token = access_log_fields.set(fields)
+	status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+
+	try:
+		# Calling "next step" (middleware, endpoint etc.)
+		response = await call_next(request)
+		status_code = response.status_code
+
+		return response
+	finally:
+		latency = time.perf_counter() - started_at
+		access_log_fields.reset(token)
+		# Route path (e.g. "/api/v1/week_forecast"), so the number of label values doesn't grow with requested URLs.
+		route = request.scope.get('route')
+		REQUEST_DURATION.observe(
+			latency, route.path if route else 'unmatched', request.method, str(status_code)
+		)
+		fields['status'] = status_code
+		fields['latency_ms'] = round(latency * 1000, 3)
+		access_logger.log(
+			logging.WARNING if status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR else logging.INFO,
+			f'{request.method} {request.url.path} {status_code}',
+			extra={'fields': fields}
+		)
+
+
+# Cached entries are returned with HTTP caching headers:
+# - strong ETag of the body - requests with a matching "If-None-Match" get 304 Not Modified without the body,
+# - "Cache-Control: max-age" equal to the time left until the entry becomes stale (and is refreshed),
+# - "Surrogate-Key" with the endpoint and (snapped) location, so CDN can purge responses for a location.
+# Body is sent in one of its compressed variants, when accepted by the client (each variant is compressed once
+# per cache entry, when first sent).
+def create_cached_response(request: Request, entry: CacheEntry, surrogate_keys: list[str]) -> Response:
+	encoding = select_content_encoding(
+		request.headers.get('Accept-Encoding'),
+		[encoding for encoding in CONTENT_ENCODERS if encoding in entry.content_encodings]
+	)
+	max_age = max(int(settings.cache_soft_ttl_seconds - entry.get_age()), 0)
+	headers = {
+		'ETag': entry.get_etag(encoding),
+		'Cache-Control': f'public, max-age={max_age}',
+		'Surrogate-Key': ' '.join(surrogate_keys),
+		'Vary': 'Accept-Encoding'
+	}
+
+	if is_etag_matched(request.headers.get('If-None-Match'), headers['ETag']):
+		return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+	if encoding is None:
+		return Response(content=entry.get_body(), media_type='application/json', headers=headers)
+
+	headers['Content-Encoding'] = encoding
 
-	# Calling "next step" (middleware, endpoint etc.)
-	return await call_next(request)
+	return Response(content=entry.get_encoded_body(encoding), media_type='application/json', headers=headers)
+
+
+# Picks the encoding with the highest "q" value in "Accept-Encoding" (the first one of "encodings" on a tie),
+# None means the identity (not encoded) body.
+def select_content_encoding(accept_encoding: str | None, encodings: list[str]) -> str | None:
+	if not accept_encoding:
+		return None
+
+	accepted = {}
+
+	for item in accept_encoding.split(','):
+		coding, *params = item.split(';')
+		quality = 1.0
+
+		for param in params:
+			name, _, value = param.strip().partition('=')
+
+			if name == 'q':
+				try:
+					quality = float(value)
+				except ValueError:
+					quality = 0
+
+		accepted[coding.strip().lower()] = quality
+
+	selected_encoding, selected_quality = None, 0
+
+	for encoding in encodings:
+		quality = accepted.get(encoding, accepted.get('*', 0))
+
+		if quality > selected_quality:
+			selected_encoding, selected_quality = encoding, quality
+
+	return selected_encoding
+
+
+# "If-None-Match" uses weak comparison (ignores "W/" prefix) and may contain many ETags or "*".
+def is_etag_matched(if_none_match: str | None, etag: str) -> bool:
+	if not if_none_match:
+		return False
+
+	return any(candidate.strip().removeprefix('W/') in ('*', etag) for candidate in if_none_match.split(','))
+
+
+def create_location_surrogate_key(coordinate_grid: CoordinateGrid, latitude: float, longitude: float) -> str:
+	latitude, longitude = coordinate_grid.snap(latitude, longitude)
+
+	return f'location_{latitude}_{longitude}'
 
 
 # Endpoint 1: retrieving weather forecast for the incoming week.
 # Latitude and longitude are taken as non-optional query parameters and validated
-# (float between given min and max values).
-@app.get('/api/v1/week_forecast')
-def get_forecast(
+# (float between given min and max values). Optional installation power and efficiency replace the configured ones -
+# forecasts of all installations are created from the same cached weather of the location.
+# Forecast is returned as JSON rendered once per cache entry ("response_model" is used only for the documentation).
+@app.get('/api/v1/week_forecast', response_model=WeatherForecast)
+async def get_forecast(
+		request: Request,
 		latitude: Annotated[float, Query(ge=settings.min_latitude, le=settings.max_latitude)],
 		longitude: Annotated[float, Query(ge=settings.min_longitude, le=settings.max_longitude)],
+		installation_power_kw: Annotated[float | None, Query(gt=0)] = None,
+		installation_efficiency: Annotated[float | None, Query(gt=0, le=1)] = None,
+		forecast_service: WeatherForecastService = Depends(get_forecast_service),
+		coordinate_grid: CoordinateGrid = Depends(get_coordinate_grid)
+) -> Response:
+	entry = await forecast_service.get_weather_forecast_entry(
+		latitude, longitude, installation_power_kw, installation_efficiency
+	)
+	surrogate_keys = ['week_forecast', create_location_surrogate_key(coordinate_grid, latitude, longitude)]
+
+	return create_cached_response(request, entry, surrogate_keys)
+
+
+# Endpoint 1b: retrieving weather forecasts for many locations at once.
+# Forecasts are returned in the order of given locations, each item contains either
+# a forecast or an error id - one unavailable forecast doesn't fail the whole batch.
+@app.post('/api/v1/week_forecast/batch')
+async def get_forecast_batch(
+		batch_request: WeatherForecastBatchRequest,
+		forecast_service: WeatherForecastService = Depends(get_forecast_service)
+) -> WeatherForecastBatch:
+	forecasts = await forecast_service.get_weather_forecasts(
+		[(location.latitude, location.longitude) for location in batch_request.locations]
+	)
+	items = []
+
+	for forecast in forecasts:
+		if isinstance(forecast, Exception):
+			logger.error(forecast)
+			NOT_AVAILABLE_ERRORS.inc(forecast.__class__.__name__)
+			items.append(WeatherForecastBatchItem(error=forecast.__class__.__name__))
+		else:
+			items.append(WeatherForecastBatchItem(forecast=forecast))
+
+	return WeatherForecastBatch(items=items)
+
+
+# Endpoint 1c: retrieving energy generated by many PV installations (a fleet) at once.
+# Items are returned in the order of given installations, each with either energy or an error id. Installations
+# of the same forecast cell share one error, which is logged once. Response is rendered to JSON directly
+# (up to "fleet_max_installations" items are not validated again, "response_model" is used for the documentation).
+@app.post('/api/v1/week_forecast/fleet', response_model=FleetEnergy)
+async def get_fleet_energy(
+		fleet_request: FleetEnergyRequest,
 		forecast_service: WeatherForecastService = Depends(get_forecast_service)
-) -> WeatherForecast:
-	return forecast_service.get_weather_forecast(latitude, longitude)
+) -> Response:
+	energies = await forecast_service.get_installations_energy(fleet_request.installations)
+	logged_errors = set()
+	items = []
+
+	for energy in energies:
+		if isinstance(energy, Exception):
+			if id(energy) not in logged_errors:
+				logged_errors.add(id(energy))
+				logger.error(energy)
+
+			NOT_AVAILABLE_ERRORS.inc(energy.__class__.__name__)
+			items.append(FleetEnergyItem(error=energy.__class__.__name__))
+		else:
+			items.append(FleetEnergyItem(energy=energy))
+
+	fleet_energy = FleetEnergy(generated_energy_unit='kWh', items=items)
+
+	return Response(content=fleet_energy.model_dump_json(), media_type='application/json')
 
 
 # Endpoint 2: retrieving summary for the incoming week's weather.
 # Latitude and longitude are taken as non-optional query parameters and validated
 # (float between given min and max values).
-@app.get('/api/v1/week_summary')
-def get_week_summary(
+@app.get('/api/v1/week_summary', response_model=WeatherWeekSummary)
+async def get_week_summary(
+		request: Request,
 		latitude: Annotated[float, Query(ge=settings.min_latitude, le=settings.max_latitude)],
 		longitude: Annotated[float, Query(ge=settings.min_longitude, le=settings.max_longitude)],
-		week_summary_service: WeatherWeekSummaryService = Depends(get_week_summary_service)
-) -> WeatherWeekSummary:
-	return week_summary_service.get_week_summary(latitude, longitude)
+		week_summary_service: WeatherWeekSummaryService = Depends(get_week_summary_service),
+		coordinate_grid: CoordinateGrid = Depends(get_coordinate_grid)
+) -> Response:
+	entry = await week_summary_service.get_week_summary_entry(latitude, longitude)
+	surrogate_keys = ['week_summary', create_location_surrogate_key(coordinate_grid, latitude, longitude)]
+
+	return create_cached_response(request, entry, surrogate_keys)
+
+
+# Metrics in Prometheus text format.
+@app.get('/metrics', include_in_schema=False)
+async def get_metrics() -> Response:
+	return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,229 @@
+# Application metrics in Prometheus text format (exposed by the "/metrics" endpoint).
+# Metrics are updated on the event loop thread only, so counters are plain integers in dicts - no locks and
+# no allocations on the hot path besides the first update of a label set. Values owned by other objects
+# (e.g. cache service counters) are read when metrics are rendered, with callbacks.
+import bisect
+import time
+from collections.abc import Callable
+from types import TracebackType
+from typing import TypeVar
+
+from src.constants import METRICS_LATENCY_BUCKETS
+
+Labels = tuple[str, ...]
+
+
+def format_labels(label_names: Labels, labels: Labels, extra: str = '') -> str:
+	pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(label_names, labels)]
+
+	if extra:
+		pairs.append(extra)
+
+	return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def escape_label_value(value: str) -> str:
+	return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+	name: str
+	description: str
+	label_names: Labels
+	values: dict[Labels, float]
+
+	def __init__(self, name: str, description: str, label_names: Labels = ()) -> None:
+		self.name = name
+		self.description = description
+		self.label_names = label_names
+		self.values = {}
+
+	def inc(self, *labels: str, value: float = 1) -> None:
+		self.values[labels] = self.values.get(labels, 0) + value
+
+	def render(self) -> list[str]:
+		return [
+			f'# HELP {self.name} {self.description}',
+			f'# TYPE {self.name} counter',
+			*[
+				f'{self.name}{format_labels(self.label_names, labels)} {value}'
+				for labels, value in sorted(self.values.items())
+			]
+		]
+
+
+# Buckets are counted separately (a single increment per observation) and made cumulative when rendered.
+class Histogram:
+	name: str
+	description: str
+	label_names: Labels
+	buckets: tuple[float, ...]
+	counts: dict[Labels, list[int]]
+	sums: dict[Labels, float]
+
+	def __init__(
+			self,
+			name: str,
+			description: str,
+			label_names: Labels = (),
+			buckets: tuple[float, ...] = METRICS_LATENCY_BUCKETS
+	) -> None:
+		self.name = name
+		self.description = description
+		self.label_names = label_names
+		self.buckets = buckets
+		self.counts = {}
+		self.sums = {}
+
+	def observe(self, value: float, *labels: str) -> None:
+		counts = self.counts.get(labels)
+
+		if counts is None:
+			# The last one counts values above the highest bucket.
+			counts = self.counts[labels] = [0] * (len(self.buckets) + 1)
+			self.sums[labels] = 0.0
+
+		counts[bisect.bisect_left(self.buckets, value)] += 1
+		self.sums[labels] += value
+
+	def time(self, *labels: str) -> 'Timer':
+		return Timer(self, labels)
+
+	def render(self) -> list[str]:
+		lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+
+		for labels, counts in sorted(self.counts.items()):
+			total = 0
+
+			for bucket, count in zip((*self.buckets, float('inf')), counts):
+				total += count
+				le = 'le="+Inf"' if bucket == float('inf') else f'le="{bucket!r}"'
+				lines.append(f'{self.name}_bucket{format_labels(self.label_names, labels, le)} {total}')
+
+			lines.append(f'{self.name}_sum{format_labels(self.label_names, labels)} {self.sums[labels]}')
+			lines.append(f'{self.name}_count{format_labels(self.label_names, labels)} {total}')
+
+		return lines
+
+
+# Measures time of the "with" block (also when it raises) in seconds.
+class Timer:
+	histogram: Histogram
+	labels: Labels
+	started_at: float
+
+	def __init__(self, histogram: Histogram, labels: Labels) -> None:
+		self.histogram = histogram
+		self.labels = labels
+
+	def __enter__(self) -> 'Timer':
+		self.started_at = time.perf_counter()
+
+		return self
+
+	def __exit__(
+			self,
+			exc_type: type[BaseException] | None,
+			exc_value: BaseException | None,
+			traceback: TracebackType | None
+	) -> None:
+		self.histogram.observe(time.perf_counter() - self.started_at, *self.labels)
+
+
+# Metric with values read from "callback" (label values to value) when rendered.
+class CallbackMetric:
+	name: str
+	description: str
+	metric_type: str
+	label_names: Labels
+	callback: Callable[[], dict[Labels, float]]
+
+	def __init__(
+			self,
+			name: str,
+			description: str,
+			metric_type: str,
+			label_names: Labels,
+			callback: Callable[[], dict[Labels, float]]
+	) -> None:
+		self.name = name
+		self.description = description
+		self.metric_type = metric_type
+		self.label_names = label_names
+		self.callback = callback
+
+	def render(self) -> list[str]:
+		return [
+			f'# HELP {self.name} {self.description}',
+			f'# TYPE {self.name} {self.metric_type}',
+			*[
+				f'{self.name}{format_labels(self.label_names, labels)} {value}'
+				for labels, value in sorted(self.callback().items())
+			]
+		]
+
+
+M = TypeVar('M', 'Counter', 'Histogram')
+
+
+class MetricsRegistry:
+	metrics: dict[str, Counter | Histogram | CallbackMetric]
+
+	def __init__(self) -> None:
+		self.metrics = {}
+
+	def counter(self, name: str, description: str, label_names: Labels = ()) -> Counter:
+		return self._register(Counter(name, description, label_names))
+
+	def histogram(self, name: str, description: str, label_names: Labels = ()) -> Histogram:
+		return self._register(Histogram(name, description, label_names))
+
+	# Callbacks are registered by name, so registering again (e.g. for a new cache service) replaces the old one.
+	def callback(
+			self,
+			name: str,
+			description: str,
+			metric_type: str,
+			label_names: Labels,
+			callback: Callable[[], dict[Labels, float]]
+	) -> CallbackMetric:
+		metric = CallbackMetric(name, description, metric_type, label_names, callback)
+		self.metrics[name] = metric
+
+		return metric
+
+	def _register(self, metric: M) -> M:
+		if metric.name in self.metrics:
+			raise ValueError(f'Metric {metric.name} is already registered.')
+
+		self.metrics[metric.name] = metric
+
+		return metric
+
+	def render(self) -> str:
+		return '\n'.join(line for metric in self.metrics.values() for line in metric.render()) + '\n'
+
+
+metrics = MetricsRegistry()
+
+REQUEST_DURATION = metrics.histogram(
+	'http_request_duration_seconds', 'Latency of HTTP requests.', ('endpoint', 'method', 'status')
+)
+STAGE_DURATION = metrics.histogram(
+	'weather_stage_duration_seconds',
+	'Latency of request processing stages (cache_lookup, upstream_fetch including rate_limit_wait, parse, transform).',
+	('stage',)
+)
+CACHE_LOOKUPS = metrics.counter(
+	'weather_cache_lookups_total', 'Cache lookups of forecasts and summaries by result (hit, stale, miss).', ('result',)
+)
+UPSTREAM_RESPONSES = metrics.counter(
+	'open_meteo_responses_total',
+	'Open-Meteo responses by status code ("error" when no response was received, "circuit_open" and "rate_limited"'
+	' when the request was not sent).',
+	('status',)
+)
+UPSTREAM_RETRIES = metrics.counter('open_meteo_retries_total', 'Retried Open-Meteo requests.')
+NOT_AVAILABLE_ERRORS = metrics.counter(
+	'weather_not_available_errors_total', 'Forecasts and summaries which could not be returned.', ('error',)
+)
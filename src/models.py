@@ -1,8 +1,15 @@
+import hashlib
+import time
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import Any
+from typing import Annotated, Any
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from src.constants import ETAG_DIGEST_SIZE
+from src.settings import settings
+from src.utils import CONTENT_ENCODERS
 
 
 # WeatherTypeEnum provides weather code string representation (e.g. from Open Meteo API)
@@ -34,11 +41,14 @@ class DayEnum(Enum):
 
 	@staticmethod
 	def get_by_index(i: int) -> str:
-		for (day_index, day) in enumerate(DayEnum.__members__.keys()):
-			if day_index == i:
-				return day
+		if not 0 <= i < len(DAY_NAMES):
+			raise Exception("Couldn't resolve day!")
+
+		return DAY_NAMES[i]
+
 
-		raise Exception("Couldn't resolve day!")
+# Day names by week day index (0 - Monday), built once at import time.
+DAY_NAMES: tuple[str, ...] = tuple(DayEnum.__members__)
 
 
 # Models representing returned data:
@@ -68,6 +78,31 @@ class WeatherForecast(BaseModel):
 	days: list[WeatherDay]
 
 
+# Weather part of the forecast, cached per location and shared by all installations. "daily_yield" is the energy
+# generated per kW of installation power (before efficiency), so forecast of any installation is created
+# from it when read.
+class LocationWeatherDay(BaseModel):
+	time: str
+	day: DayEnum
+	weather_code: int
+	weather_type: WeatherTypeEnum
+	temp_max: float
+	temp_min: float
+	sunshine_duration: float
+	daily_yield: float
+
+
+class LocationWeatherForecast(BaseModel):
+	latitude: float
+	longitude: float
+	time_unit: str
+	weather_code_unit: str
+	temp_max_unit: str
+	temp_min_unit: str
+	sunshine_duration_unit: str
+	days: list[LocationWeatherDay]
+
+
 class WeatherWeekSummary(BaseModel):
 	latitude: float
 	longitude: float
@@ -87,28 +122,185 @@ class WeatherWeekSummary(BaseModel):
 	weather_types: list[WeatherTypeEnum] | None
 
 
+# Models representing batch requests and responses:
+class Coordinates(BaseModel):
+	latitude: Annotated[float, Field(ge=settings.min_latitude, le=settings.max_latitude)]
+	longitude: Annotated[float, Field(ge=settings.min_longitude, le=settings.max_longitude)]
+
+
+class WeatherForecastBatchRequest(BaseModel):
+	locations: Annotated[list[Coordinates], Field(min_length=1, max_length=settings.batch_max_locations)]
+
+
+# Items are returned in the order of requested locations. When forecast for a location is not available,
+# "error" contains the error class name (the same as "id" returned by the exception handlers).
+class WeatherForecastBatchItem(BaseModel):
+	forecast: WeatherForecast | None = None
+	error: str | None = None
+
+
+class WeatherForecastBatch(BaseModel):
+	items: list[WeatherForecastBatchItem]
+
+
+# Models representing fleet requests and responses:
+class Installation(Coordinates):
+	installation_power_kw: Annotated[float, Field(gt=0)]
+	installation_efficiency: Annotated[float, Field(gt=0, le=1)]
+
+
+class FleetEnergyRequest(BaseModel):
+	installations: Annotated[list[Installation], Field(min_length=1, max_length=settings.fleet_max_installations)]
+
+
+# Energy generated by an installation each day of its forecast.
+class InstallationEnergy(BaseModel):
+	time: list[str]
+	generated_energy: list[float]
+
+
+# Items are returned in the order of requested installations (as batch items).
+class FleetEnergyItem(BaseModel):
+	energy: InstallationEnergy | None = None
+	error: str | None = None
+
+
+class FleetEnergy(BaseModel):
+	generated_energy_unit: str
+	items: list[FleetEnergyItem]
+
+
+# Cached value together with its creation time (UNIX timestamp), used to tell fresh and stale entries apart.
+# "body" is the value rendered to JSON bytes, created once per entry and returned by endpoints as it is
+# (cache hits skip response validation and serialization). "etag" is the strong HTTP validator of the body.
+# "encoded_bodies" are compressed variants of the body by content encoding, created when the entry is first sent.
+@dataclass
+class CacheEntry:
+	value: BaseModel
+	created_at: float
+	body: bytes | None = field(default=None, init=False, repr=False, compare=False)
+	etag: str | None = field(default=None, init=False, repr=False, compare=False)
+	# Encodings the body can be sent in - compressed on first use and kept with the entry.
+	content_encodings: tuple[str, ...] = field(default=tuple(CONTENT_ENCODERS), init=False, repr=False, compare=False)
+	encoded_bodies: dict[str, bytes] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+	def get_age(self) -> float:
+		return time.time() - self.created_at
+
+	def get_body(self) -> bytes:
+		if self.body is None:
+			self.body = self.value.__pydantic_serializer__.to_json(self.value)
+
+		return self.body
+
+	# Each encoded variant is a different representation, so it has a different (strong) ETag.
+	def get_etag(self, encoding: str | None = None) -> str:
+		if self.etag is None:
+			self.etag = hashlib.blake2b(self.get_body(), digest_size=ETAG_DIGEST_SIZE).hexdigest()
+
+		return f'"{self.etag}-{encoding}"' if encoding else f'"{self.etag}"'
+
+	# Body compressed with given content encoding (one of "content_encodings"). Entries are compressed lazily,
+	# so values which are never sent (e.g. raw upstream data) aren't compressed at all.
+	def get_encoded_body(self, encoding: str) -> bytes:
+		if (body := self.encoded_bodies.get(encoding)) is None:
+			body = self.encoded_bodies[encoding] = CONTENT_ENCODERS[encoding](self.get_body())
+
+		return body
+
+
 # Interface used for future forecast services. As long as services have same structure,
 # they can be exchanged independently without destroying the logic (e.g. when Open-Meteo suddenly becomes not free).
 class WeatherForecastService(ABC):
+	# Returns the forecast as a cache entry (with its age and pre-rendered body). Energy is computed for the given
+	# installation, the configured one by default.
+	@abstractmethod
+	async def get_weather_forecast_entry(
+			self,
+			latitude: float,
+			longitude: float,
+			installation_power_kw: float | None = None,
+			installation_efficiency: float | None = None
+	) -> CacheEntry:
+		pass
+
+	async def get_weather_forecast(
+			self,
+			latitude: float,
+			longitude: float,
+			installation_power_kw: float | None = None,
+			installation_efficiency: float | None = None
+	) -> WeatherForecast:
+		return (
+			await self.get_weather_forecast_entry(latitude, longitude, installation_power_kw, installation_efficiency)
+		).value
+
+	# Returns forecast or error for each of given (latitude, longitude) locations, in the same order.
+	@abstractmethod
+	async def get_weather_forecasts(
+			self, locations: list[tuple[float, float]]
+	) -> list['WeatherForecast | WeatherForecastNotAvailableError']:
+		pass
+
+	# Returns generated energy or error for each of given installations, in the same order.
 	@abstractmethod
-	def get_weather_forecast(self, latitude: float, longitude: float) -> WeatherForecast:
+	async def get_installations_energy(
+			self, installations: list[Installation]
+	) -> list['InstallationEnergy | WeatherForecastNotAvailableError']:
 		pass
 
 
 class WeatherWeekSummaryService(ABC):
 	@abstractmethod
-	def get_week_summary(self, latitude: float, longitude: float) -> WeatherWeekSummary:
+	async def get_week_summary_entry(self, latitude: float, longitude: float) -> CacheEntry:
 		pass
 
+	async def get_week_summary(self, latitude: float, longitude: float) -> WeatherWeekSummary:
+		return (await self.get_week_summary_entry(latitude, longitude)).value
+
 
 # Interface used for cache functionality, e.g. Redis can be introduced without destroying the logic.
+# Methods are asynchronous, so network based backends don't block the event loop.
 class CacheService(ABC):
+	# "created_at" (current time by default) is set for values derived from older data, so they don't look
+	# fresher than the data they were created from. Backends count expiration from it as well.
+	# Returns the entry as stored (e.g. with the body rendered for the storage), so callers serving the new value
+	# don't render it again.
+	@abstractmethod
+	async def add_cache(self, cache_key: str, cache_value: BaseModel, created_at: float | None = None) -> CacheEntry:
+		pass
+
 	@abstractmethod
-	def add_cache(self, cache_key: str, cache_value: BaseModel) -> None:
+	async def get_cache_entry(self, cache_key: str) -> CacheEntry | None:
 		pass
 
+	async def get_cache(self, cache_key: str) -> BaseModel | None:
+		entry = await self.get_cache_entry(cache_key)
+
+		return entry.value if entry else None
+
+	# Backends able to fetch many keys in one round trip should override this method.
+	async def get_many_cache_entries(self, cache_keys: list[str]) -> list[CacheEntry | None]:
+		return [await self.get_cache_entry(cache_key) for cache_key in cache_keys]
+
+	async def get_many_cache(self, cache_keys: list[str]) -> list[BaseModel | None]:
+		return [entry.value if entry else None for entry in await self.get_many_cache_entries(cache_keys)]
+
+	# Counters of cache operations (e.g. hits, misses, evictions) exposed as metrics.
+	# Backends which don't count them return nothing.
+	def get_stats(self) -> dict[str, int]:
+		return {}
+
+	# Releases resources (e.g. connections) on application shutdown.
+	async def close(self) -> None:
+		pass
+
+
+# Interface used to normalize coordinates before the cache lookup and the upstream request,
+# so nearby points resolved by the weather provider to the same grid cell share one cache entry.
+class CoordinateGrid(ABC):
 	@abstractmethod
-	def get_cache(self, cache_key: str) -> BaseModel | None:
+	def snap(self, latitude: float, longitude: float) -> tuple[float, float]:
 		pass
 
 
@@ -0,0 +1,364 @@
+# Columnar (NumPy) transforms of Open-Meteo data of many locations at once.
+# Daily and hourly values of N locations are stacked into (N, days) / (N, hours) arrays, so daily yields,
+# weather types and weekly aggregates are computed with a few array operations instead of Python code per value.
+# Energy of installations is computed the same way, from daily yields of cached location forecasts.
+# Results are identical to the per-location transforms of OpenMeteoForecastService. Week summaries are built only here
+# (OpenMeteoWeekSummaryService builds the summary of a single location as a batch of one).
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import date
+from functools import cached_property
+from statistics import mean
+
+import numpy as np
+from pydantic import TypeAdapter
+
+from ..constants import (
+	COLUMNAR_ROUNDING_TOLERANCE,
+	GENERATED_ENERGY_DECIMAL_PART_LENGTH,
+	MEAN_PRESSURE_DECIMAL_PART_LENGTH,
+	MEAN_SUNSHINE_DURATION_DECIMAL_PART_LENGTH,
+)
+from ..models import (
+	DayEnum,
+	InstallationEnergy,
+	LocationWeatherForecast,
+	WeatherForecast,
+	WeatherTypeEnum,
+	WeatherWeekSummary,
+)
+from .energy import calculate_daily_yields
+from .models import WEATHER_CODE_TYPES, OpenMeteoWeatherWeekSummary
+
+# Weather types by index and index of weather type for every weather code (codes are used as array indexes).
+WEATHER_TYPES: tuple[WeatherTypeEnum, ...] = tuple(WeatherTypeEnum)
+WEATHER_CODE_TYPE_INDEXES = np.full(max(code.value for code in WEATHER_CODE_TYPES) + 1, -1, dtype=np.intp)
+
+for code, weather_type in WEATHER_CODE_TYPES.items():
+	WEATHER_CODE_TYPE_INDEXES[code.value] = WEATHER_TYPES.index(weather_type)
+
+# Validators of result lists (building models from plain values at once is faster than one by one).
+LOCATION_FORECASTS_ADAPTER = TypeAdapter(list[LocationWeatherForecast])
+WEATHER_FORECASTS_ADAPTER = TypeAdapter(list[WeatherForecast])
+WEEK_SUMMARIES_ADAPTER = TypeAdapter(list[WeatherWeekSummary])
+INSTALLATIONS_ENERGY_ADAPTER = TypeAdapter(list[InstallationEnergy])
+
+
+# Open-Meteo data of locations with the same dates (and number of hours), stacked into arrays.
+# Arrays are created on first use - forecasts and summaries need different (hourly) variables.
+@dataclass
+class OpenMeteoColumns:
+	items: list[OpenMeteoWeatherWeekSummary]
+	time: list[str]
+
+	@staticmethod
+	def create(items: list[OpenMeteoWeatherWeekSummary]) -> 'OpenMeteoColumns':
+		return OpenMeteoColumns(items=items, time=items[0].daily.time)
+
+	@cached_property
+	def weather_code(self) -> np.ndarray:
+		return np.array([[code.value for code in item.daily.weather_code] for item in self.items], dtype=np.intp)
+
+	@cached_property
+	def temperature_2m_max(self) -> np.ndarray:
+		return np.array([item.daily.temperature_2m_max for item in self.items], dtype=np.float64)
+
+	@cached_property
+	def temperature_2m_min(self) -> np.ndarray:
+		return np.array([item.daily.temperature_2m_min for item in self.items], dtype=np.float64)
+
+	@cached_property
+	def sunshine_duration(self) -> np.ndarray:
+		return np.array([item.daily.sunshine_duration for item in self.items], dtype=np.float64)
+
+	@cached_property
+	def pressure_msl(self) -> np.ndarray:
+		return np.array([item.hourly.pressure_msl for item in self.items], dtype=np.float64)
+
+	@cached_property
+	def shortwave_radiation(self) -> np.ndarray:
+		return np.array([item.hourly.shortwave_radiation for item in self.items], dtype=np.float64)
+
+	@cached_property
+	def temperature_2m(self) -> np.ndarray:
+		return np.array([item.hourly.temperature_2m for item in self.items], dtype=np.float64)
+
+	# Splits items into groups of the same shape (usually a single group - all locations of a multi-location
+	# request have the same dates). Returns indexes of items in each group, so results can be put back in order.
+	@staticmethod
+	def create_groups(
+			items: list[OpenMeteoWeatherWeekSummary]
+	) -> list[tuple[list[int], 'OpenMeteoColumns']]:
+		groups: dict[tuple[tuple[str, ...], int], list[int]] = {}
+
+		for i, item in enumerate(items):
+			groups.setdefault((tuple(item.daily.time), len(item.hourly.pressure_msl)), []).append(i)
+
+		return [
+			(indexes, OpenMeteoColumns.create([items[i] for i in indexes]))
+			for indexes in groups.values()
+		]
+
+
+def build_location_forecasts(items: list[OpenMeteoWeatherWeekSummary]) -> list[LocationWeatherForecast]:
+	forecasts: list[LocationWeatherForecast | None] = [None] * len(items)
+
+	for indexes, columns in OpenMeteoColumns.create_groups(items):
+		for i, forecast in zip(indexes, _build_location_forecasts(columns)):
+			forecasts[i] = forecast
+
+	return forecasts
+
+
+def build_week_summaries(items: list[OpenMeteoWeatherWeekSummary]) -> list[WeatherWeekSummary]:
+	summaries: list[WeatherWeekSummary | None] = [None] * len(items)
+
+	for indexes, columns in OpenMeteoColumns.create_groups(items):
+		for i, summary in zip(indexes, _build_week_summaries(columns)):
+			summaries[i] = summary
+
+	return summaries
+
+
+# Forecasts of an installation created from cached location forecasts - energy of all locations with the same dates
+# is computed with a single array operation.
+def build_weather_forecasts(
+		forecasts: list[LocationWeatherForecast], installation_power_kw: float, installation_efficiency: float
+) -> list[WeatherForecast]:
+	weather_forecasts: list[dict | None] = [None] * len(forecasts)
+
+	for indexes, _, daily_yields in _group_daily_yields(forecasts):
+		energy = _calculate_energy(installation_power_kw, daily_yields, installation_efficiency)
+
+		for i, generated_energy in zip(indexes, energy.tolist()):
+			forecast = forecasts[i]
+			weather_forecasts[i] = {
+				'latitude': forecast.latitude,
+				'longitude': forecast.longitude,
+				'time_unit': forecast.time_unit,
+				'weather_code_unit': forecast.weather_code_unit,
+				'temp_max_unit': forecast.temp_max_unit,
+				'temp_min_unit': forecast.temp_min_unit,
+				'sunshine_duration_unit': forecast.sunshine_duration_unit,
+				'generated_energy_unit': 'kWh',
+				'installation_power_unit': 'kW',
+				'installation_power': installation_power_kw,
+				'installation_efficiency': installation_efficiency,
+				'days': [
+					{
+						'time': day.time,
+						'day': day.day,
+						'weather_code': day.weather_code,
+						'weather_type': day.weather_type,
+						'temp_max': day.temp_max,
+						'temp_min': day.temp_min,
+						'sunshine_duration': day.sunshine_duration,
+						'generated_energy': day_energy
+					}
+					for day, day_energy in zip(forecast.days, generated_energy)
+				]
+			}
+
+	# Models of all locations are validated with a single call.
+	return WEATHER_FORECASTS_ADAPTER.validate_python(weather_forecasts)
+
+
+# Energy generated by many installations - "cell_indexes" point to the location forecast (of a forecast cell)
+# of each installation. Energy of all installations of cells with the same dates is computed with a single
+# array operation.
+def build_installations_energy(
+		forecasts: list[LocationWeatherForecast],
+		cell_indexes: list[int],
+		installation_power_kw: list[float],
+		installation_efficiency: list[float]
+) -> list[InstallationEnergy]:
+	energies: list[dict | None] = [None] * len(cell_indexes)
+	cell_indexes = np.asarray(cell_indexes, dtype=np.intp)
+	power = np.asarray(installation_power_kw, dtype=np.float64)
+	efficiency = np.asarray(installation_efficiency, dtype=np.float64)
+	yields_groups = _group_daily_yields(forecasts)
+	# Group of each cell and its row within the group.
+	groups = np.empty(len(forecasts), dtype=np.intp)
+	rows = np.empty(len(forecasts), dtype=np.intp)
+
+	for group, (indexes, _, _) in enumerate(yields_groups):
+		groups[indexes] = group
+		rows[indexes] = np.arange(len(indexes))
+
+	installation_groups = groups[cell_indexes]
+
+	for group, (_, time, daily_yields) in enumerate(yields_groups):
+		installations = np.flatnonzero(installation_groups == group)
+		energy = _calculate_energy(
+			power[installations, None],
+			daily_yields[rows[cell_indexes[installations]]],
+			efficiency[installations, None]
+		)
+
+		for i, generated_energy in zip(installations.tolist(), energy.tolist()):
+			energies[i] = {'time': time, 'generated_energy': generated_energy}
+
+	return INSTALLATIONS_ENERGY_ADAPTER.validate_python(energies)
+
+
+# Daily yields of location forecasts with the same dates, stacked into (N, days) arrays. Returns indexes
+# of forecasts in each group, so results can be put back in order.
+def _group_daily_yields(
+		forecasts: list[LocationWeatherForecast]
+) -> list[tuple[list[int], list[str], np.ndarray]]:
+	groups: dict[tuple[str, ...], list[int]] = {}
+
+	for i, forecast in enumerate(forecasts):
+		groups.setdefault(tuple(day.time for day in forecast.days), []).append(i)
+
+	return [
+		(
+			indexes,
+			list(time),
+			np.array(
+				[[day.daily_yield for day in forecasts[i].days] for i in indexes], dtype=np.float64
+			).reshape(len(indexes), len(time))
+		)
+		for time, indexes in groups.items()
+	]
+
+
+# Same operations (in the same order) as OpenMeteoForecastService._calculate_energy.
+def _calculate_energy(
+		installation_power_kw: np.ndarray | float, daily_yields: np.ndarray, installation_efficiency: np.ndarray | float
+) -> np.ndarray:
+	exact_energy = installation_power_kw * daily_yields * installation_efficiency
+
+	return _round(
+		exact_energy,
+		GENERATED_ENERGY_DECIMAL_PART_LENGTH,
+		lambda i, j: round(float(exact_energy[i, j]), GENERATED_ENERGY_DECIMAL_PART_LENGTH)
+	)
+
+
+def _build_location_forecasts(columns: OpenMeteoColumns) -> list[LocationWeatherForecast]:
+	# Same operations (in the same order) as OpenMeteoForecastService._get_days.
+	daily_yields = calculate_daily_yields(columns.shortwave_radiation, columns.temperature_2m, len(columns.time))
+	weather_types = WEATHER_CODE_TYPE_INDEXES[columns.weather_code]
+	days = [DayEnum.get_by_index(date.fromisoformat(time).weekday()) for time in columns.time]
+
+	forecasts = []
+
+	for item, codes, type_indexes, t_max, t_min, sunshine, yields in zip(
+			columns.items,
+			columns.weather_code.tolist(),
+			weather_types.tolist(),
+			columns.temperature_2m_max.tolist(),
+			columns.temperature_2m_min.tolist(),
+			columns.sunshine_duration.tolist(),
+			daily_yields.tolist()
+	):
+		forecasts.append({
+			'latitude': item.latitude,
+			'longitude': item.longitude,
+			'time_unit': item.daily_units.time,
+			'weather_code_unit': item.daily_units.weather_code,
+			'temp_max_unit': item.daily_units.temperature_2m_max,
+			'temp_min_unit': item.daily_units.temperature_2m_min,
+			'sunshine_duration_unit': item.daily_units.sunshine_duration,
+			'days': [
+				{
+					'time': time,
+					'day': day,
+					'weather_code': code,
+					'weather_type': WEATHER_TYPES[type_index],
+					'temp_max': day_t_max,
+					'temp_min': day_t_min,
+					'sunshine_duration': day_sunshine,
+					'daily_yield': day_yield
+				}
+				for time, day, code, type_index, day_t_max, day_t_min, day_sunshine, day_yield in zip(
+					columns.time, days, codes, type_indexes, t_max, t_min, sunshine, yields
+				)
+			]
+		})
+
+	return LOCATION_FORECASTS_ADAPTER.validate_python(forecasts)
+
+
+def _build_week_summaries(columns: OpenMeteoColumns) -> list[WeatherWeekSummary]:
+	# Means are computed by NumPy (pairwise summation), so values close to the rounding boundary are recomputed
+	# with "statistics.mean" (exact), so they don't depend on the order of summation.
+	mean_pressures = _round(
+		columns.pressure_msl.mean(axis=1),
+		MEAN_PRESSURE_DECIMAL_PART_LENGTH,
+		lambda i: round(mean(columns.items[i].hourly.pressure_msl), MEAN_PRESSURE_DECIMAL_PART_LENGTH)
+	)
+	mean_sunshine_durations = _round(
+		columns.sunshine_duration.mean(axis=1),
+		MEAN_SUNSHINE_DURATION_DECIMAL_PART_LENGTH,
+		lambda i: round(mean(columns.items[i].daily.sunshine_duration), MEAN_SUNSHINE_DURATION_DECIMAL_PART_LENGTH)
+	)
+	summaries = []
+
+	for item, mean_pressure, mean_sunshine_duration, temp_max, temp_min, weather_types in zip(
+			columns.items,
+			mean_pressures.tolist(),
+			mean_sunshine_durations.tolist(),
+			columns.temperature_2m_max.max(axis=1).tolist(),
+			columns.temperature_2m_min.min(axis=1).tolist(),
+			_get_most_common_weather_types(columns.weather_code)
+	):
+		summaries.append({
+			'latitude': item.latitude,
+			'longitude': item.longitude,
+			'hourly_time_unit': item.hourly_units.time,
+			'pressure_msl_unit': item.hourly_units.pressure_msl,
+			'daily_time_unit': item.daily_units.time,
+			'weather_code_unit': item.daily_units.weather_code,
+			'temp_max_unit': item.daily_units.temperature_2m_max,
+			'temp_min_unit': item.daily_units.temperature_2m_min,
+			'sunshine_duration_unit': item.daily_units.sunshine_duration,
+			'mean_pressure': mean_pressure,
+			'mean_sunshine_duration': mean_sunshine_duration,
+			'temp_max_week': temp_max,
+			'temp_min_week': temp_min,
+			'weather_types': weather_types
+		})
+
+	return WEEK_SUMMARIES_ADAPTER.validate_python(summaries)
+
+
+# Most common weather types of every location, ordered by their first occurrence (as by "Counter").
+def _get_most_common_weather_types(weather_codes: np.ndarray) -> list[list[WeatherTypeEnum]]:
+	locations, days = weather_codes.shape
+
+	if days == 0:
+		raise ValueError('Given list should not be empty.')
+
+	type_indexes = WEATHER_CODE_TYPE_INDEXES[weather_codes].ravel()
+	rows = np.repeat(np.arange(locations), days)
+	counts = np.zeros((locations, len(WEATHER_TYPES)), dtype=np.intp)
+	first_days = np.full((locations, len(WEATHER_TYPES)), days, dtype=np.intp)
+
+	np.add.at(counts, (rows, type_indexes), 1)
+	np.minimum.at(first_days, (rows, type_indexes), np.tile(np.arange(days), locations))
+
+	# Types which aren't the most common are moved to the end (first day "days"), the rest is sorted by first day.
+	is_most_common = counts == counts.max(axis=1, keepdims=True)
+	first_days = np.where(is_most_common, first_days, days)
+	order = np.argsort(first_days, axis=1, kind='stable')
+
+	return [
+		[WEATHER_TYPES[t] for t in row_order[:row_count]]
+		for row_order, row_count in zip(order.tolist(), is_most_common.sum(axis=1).tolist())
+	]
+
+
+# Rounds values like built-in "round". NumPy rounds scaled values, which may differ from "round" for values
+# (almost) exactly between two results - those are rounded again by "exact" (called with index of the value).
+def _round(values: np.ndarray, digits: int, exact: Callable[..., float]) -> np.ndarray:
+	scaled = values * 10.0 ** digits
+	rounded = np.rint(scaled) / 10.0 ** digits
+	fraction = scaled - np.floor(scaled)
+
+	for index in zip(*np.nonzero(np.abs(fraction - 0.5) < COLUMNAR_ROUNDING_TOLERANCE)):
+		rounded[index] = exact(*(int(i) for i in index))
+
+	return rounded
+
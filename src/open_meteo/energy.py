@@ -0,0 +1,35 @@
+# Vectorized PV generation engine. Hourly irradiance and air temperature of N locations, as (N, hours) arrays,
+# are turned into daily specific yields - energy generated per kW of installation power (at efficiency 1), in kWh -
+# with a few array operations for all hours and locations at once.
+import numpy as np
+
+from ..constants import (
+	HOURS_IN_DAY,
+	PV_NOMINAL_OPERATING_AIR_TEMPERATURE,
+	PV_NOMINAL_OPERATING_CELL_TEMPERATURE,
+	PV_NOMINAL_OPERATING_IRRADIANCE,
+	PV_REFERENCE_CELL_TEMPERATURE,
+	PV_STANDARD_IRRADIANCE,
+	PV_TEMPERATURE_COEFFICIENT,
+)
+
+# Cell temperature rise above the air temperature per W/m² of irradiance.
+CELL_HEATING_PER_IRRADIANCE = (
+	(PV_NOMINAL_OPERATING_CELL_TEMPERATURE - PV_NOMINAL_OPERATING_AIR_TEMPERATURE) / PV_NOMINAL_OPERATING_IRRADIANCE
+)
+
+
+# Hourly values start at midnight of the first day (Open-Meteo uses GMT by default), so every day has 24 of them.
+# Irradiance is the mean of each hour (W/m²), so one hour at standard irradiance yields 1 kWh per kW.
+def calculate_daily_yields(shortwave_radiation: np.ndarray, temperature_2m: np.ndarray, days: int) -> np.ndarray:
+	if shortwave_radiation.shape[-1] != days * HOURS_IN_DAY or temperature_2m.shape != shortwave_radiation.shape:
+		raise ValueError(
+			f'Expected {HOURS_IN_DAY} hourly values of irradiance and temperature for each of {days} days, '
+			f'got {shortwave_radiation.shape[-1]} and {temperature_2m.shape[-1]}.'
+		)
+
+	cell_temperature = temperature_2m + CELL_HEATING_PER_IRRADIANCE * shortwave_radiation
+	derating = np.maximum(1 + PV_TEMPERATURE_COEFFICIENT * (cell_temperature - PV_REFERENCE_CELL_TEMPERATURE), 0)
+	hourly_yields = shortwave_radiation * derating / PV_STANDARD_IRRADIANCE
+
+	return hourly_yields.reshape(*hourly_yields.shape[:-1], days, HOURS_IN_DAY).sum(axis=-1)
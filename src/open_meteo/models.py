@@ -1,6 +1,6 @@
 from enum import Enum
 
-from pydantic import BaseModel, Extra
+from pydantic import BaseModel, ConfigDict, TypeAdapter
 
 from src.models import WeatherTypeEnum
 
@@ -90,55 +90,46 @@ class OpenMeteoGroupedWeatherCodeEnum(Enum):
 
     @staticmethod
     def create_from_weather_code(code: OpenMeteoWeatherCodeEnum) -> 'OpenMeteoGroupedWeatherCodeEnum':
-        # Iterate through weather groups values to match given weather code to its group.
-        for member in OpenMeteoGroupedWeatherCodeEnum.__members__.values():
-            if code in member.value:
-                return member
+        group = WEATHER_CODE_GROUPS.get(code)
 
-        raise Exception(f'Given code is not supported: {code}')
+        if group is None:
+            raise Exception(f'Given code is not supported: {code}')
+
+        return group
 
     def to_weather_type(self) -> WeatherTypeEnum:
         # Convert weather group to weather type.
-        match self.name:
-            case 'CLEAR_SKY':
-                return WeatherTypeEnum.CLEAR_SKY
-            case 'CLOUDY':
-                return WeatherTypeEnum.CLOUDY
-            case 'FOG':
-                return WeatherTypeEnum.FOG
-            case 'DRIZZLE':
-                return WeatherTypeEnum.DRIZZLE
-            case 'FREEZING_DRIZZLE':
-                return WeatherTypeEnum.FREEZING_DRIZZLE
-            case 'RAIN':
-                return WeatherTypeEnum.RAIN
-            case 'FREEZING_RAIN':
-                return WeatherTypeEnum.FREEZING_RAIN
-            case 'SNOW':
-                return WeatherTypeEnum.SNOW
-            case 'SNOW_GRAINS':
-                return WeatherTypeEnum.SNOW_GRAINS
-            case 'RAIN_SHOWERS':
-                return WeatherTypeEnum.RAIN_SHOWERS
-            case 'SNOW_SHOWERS':
-                return WeatherTypeEnum.SNOW_SHOWERS
-            case 'THUNDERSTORM':
-                return WeatherTypeEnum.THUNDERSTORM
-            case 'THUNDERSTORM_WITH_HAIL':
-                return WeatherTypeEnum.THUNDERSTORM_WITH_HAIL
-            case _:
-                raise ValueError(f'Unexpected group name: {self.name}')
+        return WEATHER_GROUP_TYPES[self]
+
+
+# Lookup tables built once at import time, so each weather code is mapped in O(1)
+# (instead of searching all groups and comparing names for every day).
+WEATHER_CODE_GROUPS: dict[OpenMeteoWeatherCodeEnum, OpenMeteoGroupedWeatherCodeEnum] = {
+    code: group for group in OpenMeteoGroupedWeatherCodeEnum for code in group.value
+}
+# Weather groups have the same names as weather types.
+WEATHER_GROUP_TYPES: dict[OpenMeteoGroupedWeatherCodeEnum, WeatherTypeEnum] = {
+    group: WeatherTypeEnum[group.name] for group in OpenMeteoGroupedWeatherCodeEnum
+}
+WEATHER_CODE_TYPES: dict[OpenMeteoWeatherCodeEnum, WeatherTypeEnum] = {
+    code: WEATHER_GROUP_TYPES[group] for code, group in WEATHER_CODE_GROUPS.items()
+}
 
 
 # Models representing Open Meteo API responses:
 class OpenMeteoHourlyUnits(BaseModel):
     time: str
     pressure_msl: str
+    shortwave_radiation: str
+    temperature_2m: str
 
 
 class OpenMeteoHourly(BaseModel):
     time: list[str]
     pressure_msl: list[float]
+    # Global horizontal irradiance (mean of the preceding hour) and air temperature, used to estimate PV generation.
+    shortwave_radiation: list[float]
+    temperature_2m: list[float]
 
 
 class OpenMeteoDailyUnits(BaseModel):
@@ -157,16 +148,18 @@ class OpenMeteoDaily(BaseModel):
     sunshine_duration: list[float]
 
 
+# Ignores additional keys in Open Meteo response, that are not part of the model representation.
+# Only keys are cached while parsing JSON - values (e.g. hourly times) are mostly unique, so caching them is slower.
+OPEN_METEO_MODEL_CONFIG = ConfigDict(extra='ignore', cache_strings='keys')
+
+
 class OpenMeteoWeatherForecast(BaseModel):
     latitude: float
     longitude: float
     daily_units: OpenMeteoDailyUnits
     daily: OpenMeteoDaily
 
-    # Ignores additional keys in Open Meteo response,
-    # that are not part of the model representation.
-    class Config:
-        extra = Extra.ignore
+    model_config = OPEN_METEO_MODEL_CONFIG
 
 
 class OpenMeteoWeatherWeekSummary(BaseModel):
@@ -177,7 +170,9 @@ class OpenMeteoWeatherWeekSummary(BaseModel):
     daily_units: OpenMeteoDailyUnits
     daily: OpenMeteoDaily
 
-    # Ignores additional keys in Open Meteo response,
-    # that are not part of the model representation.
-    class Config:
-        extra = Extra.ignore
+    model_config = OPEN_METEO_MODEL_CONFIG
+
+
+# Open Meteo returns a list of results when multiple locations are requested.
+# Responses are validated straight from JSON bytes (without building intermediate Python objects first).
+OPEN_METEO_WEEK_SUMMARIES_ADAPTER = TypeAdapter(list[OpenMeteoWeatherWeekSummary], config=OPEN_METEO_MODEL_CONFIG)
@@ -1,239 +1,735 @@
-from collections import Counter
-from datetime import datetime
-from statistics import mean
+import asyncio
+import time
+from datetime import date
+from functools import lru_cache
 
-import requests
+import httpx
+import numpy as np
+import pydantic_core
+from pydantic import ValidationError
 
 from ..constants import (
+	DAY_CACHE_SIZE,
 	GENERATED_ENERGY_DECIMAL_PART_LENGTH,
-	HOUR_IN_SECONDS,
-	MEAN_PRESSURE_DECIMAL_PART_LENGTH,
-	MEAN_SUNSHINE_DURATION_DECIMAL_PART_LENGTH,
+	PER_REQUEST_CONTENT_ENCODINGS,
+	RETRYABLE_STATUS_CODES,
 )
+from ..metrics import CACHE_LOOKUPS, STAGE_DURATION, UPSTREAM_RESPONSES, UPSTREAM_RETRIES
 from ..models import (
+	CacheEntry,
 	CacheService,
+	CoordinateGrid,
 	DayEnum,
+	Installation,
+	InstallationEnergy,
+	LocationWeatherDay,
+	LocationWeatherForecast,
 	WeatherDay,
 	WeatherForecast,
 	WeatherForecastNotAvailableError,
 	WeatherForecastService,
-	WeatherTypeEnum,
 	WeatherWeekSummary,
 	WeatherWeekSummaryNotAvailableError,
 	WeatherWeekSummaryService,
 )
-from ..utils import create_logger
+from ..services import HotLocationTracker, StaleWhileRevalidateCache
+from ..utils import (
+	CircuitBreaker,
+	CircuitBreakerOpenError,
+	MicroBatcher,
+	RateLimiter,
+	RateLimiterTimeoutError,
+	RetryPolicy,
+	SingleFlight,
+	create_logger,
+	set_access_log_field,
+)
+from .columnar import (
+	build_installations_energy,
+	build_location_forecasts,
+	build_weather_forecasts,
+	build_week_summaries,
+)
+from .energy import calculate_daily_yields
 from .models import (
+	OPEN_METEO_WEEK_SUMMARIES_ADAPTER,
+	WEATHER_CODE_TYPES,
 	OpenMeteoDaily,
-	OpenMeteoGroupedWeatherCodeEnum,
-	OpenMeteoWeatherCodeEnum,
-	OpenMeteoWeatherForecast,
+	OpenMeteoHourly,
 	OpenMeteoWeatherWeekSummary,
 )
 
 logger = create_logger('OpenMeteoForecastService')
 
 
-class OpenMeteoForecastService(WeatherForecastService):
+# Upstream data layer shared by forecast and week summary services. It fetches the union of variables
+# required by both of them once per location, so loading both endpoints costs a single Open-Meteo request.
+# Only fresh data (younger than soft TTL) is returned from cache - it is used to (re)create cached results
+# of other services. Stale data is returned only when the upstream request fails.
+# With "micro_batcher" given, single-location fetches of concurrent requests are merged into multi-location ones.
+# Upstream requests are retried according to "retry_policy" and go through "circuit_breaker" (shared by the whole
+# application) - while it's open, requests fail fast and stale data is returned instead, when cached.
+# Every request (including retries) is sent within the limits of the shared "rate_limiter".
+class OpenMeteoWeatherDataService:
 	base_url: str
-	installation_power_kw: float
-	installation_efficiency: float
 	cache_service: CacheService
+	cache_soft_ttl_seconds: float
+	http_client: httpx.AsyncClient
+	max_locations_per_request: int
+	micro_batcher: MicroBatcher[tuple[float, float], OpenMeteoWeatherWeekSummary] | None
+	retry_policy: RetryPolicy | None
+	circuit_breaker: CircuitBreaker | None
+	rate_limiter: RateLimiter | None
+	# Shared by all service instances (a new one is created per request).
+	single_flight: SingleFlight = SingleFlight()
 
 	def __init__(
 			self,
 			base_url: str,
-			installation_power_kw: float,
-			installation_efficiency: float,
-			cache_service: CacheService
+			cache_service: CacheService,
+			cache_soft_ttl_seconds: float,
+			http_client: httpx.AsyncClient,
+			max_locations_per_request: int,
+			micro_batcher: MicroBatcher[tuple[float, float], OpenMeteoWeatherWeekSummary] | None = None,
+			retry_policy: RetryPolicy | None = None,
+			circuit_breaker: CircuitBreaker | None = None,
+			rate_limiter: RateLimiter | None = None
 	) -> None:
 		self.base_url = base_url
-		self.installation_power_kw = installation_power_kw
-		self.installation_efficiency = installation_efficiency
 		self.cache_service = cache_service
+		self.cache_soft_ttl_seconds = cache_soft_ttl_seconds
+		self.http_client = http_client
+		self.max_locations_per_request = max_locations_per_request
+		self.micro_batcher = micro_batcher
+		self.retry_policy = retry_policy
+		self.circuit_breaker = circuit_breaker
+		self.rate_limiter = rate_limiter
 
 	# Support method for creating unique cash key.
 	@staticmethod
 	def _create_cash_key(latitude: float, longitude: float) -> str:
-		return f'forecast_{latitude}_{longitude}'
+		return f'weather_data_{latitude}_{longitude}'
+
+	# Cached data older than "max_age" (soft TTL by default) is fetched again. Returned entry is dated
+	# as the data, so values created from stale data (used when the upstream request fails) stay stale.
+	async def get_weather_data(
+			self, latitude: float, longitude: float, max_age: float | None = None
+	) -> CacheEntry:
+		cache_key = OpenMeteoWeatherDataService._create_cash_key(latitude, longitude)
+
+		with STAGE_DURATION.time('cache_lookup'):
+			cached_entry = await self.cache_service.get_cache_entry(cache_key=cache_key)
+
+		max_age = self.cache_soft_ttl_seconds if max_age is None else max_age
+
+		# Return cached value if exists and is fresh.
+		if cached_entry and cached_entry.get_age() <= max_age:
+			return cached_entry
+
+		try:
+			# Concurrent cache misses for the same key share one upstream request.
+			weather_data = await self.single_flight.run(
+				cache_key, lambda: self._fetch_weather_data(latitude, longitude)
+			)
+
+			return CacheEntry(value=weather_data, created_at=time.time())
+		except Exception as e:
+			if cached_entry is None:
+				raise
+
+			# Stale data is better than no data at all.
+			logger.error(f'Fetching weather data failed, stale cache with key {cache_key} used: {e}')
 
-	def get_weather_forecast(self, latitude: float, longitude: float) -> WeatherForecast:
+			return cached_entry
+
+	# Batch version of "get_weather_data" - returns weather data or error for each of given locations.
+	# Cached data is read at once, missing data is fetched with multi-location requests
+	# (comma separated coordinates), each for up to "max_locations_per_request" locations.
+	async def get_many_weather_data(self, locations: list[tuple[float, float]]) -> list[CacheEntry | Exception]:
+		cache_keys = [OpenMeteoWeatherDataService._create_cash_key(*location) for location in locations]
+
+		with STAGE_DURATION.time('cache_lookup'):
+			cached_entries = dict(zip(locations, await self.cache_service.get_many_cache_entries(cache_keys)))
+
+		results = {
+			location: entry
+			for location, entry in cached_entries.items()
+			if entry and entry.get_age() <= self.cache_soft_ttl_seconds
+		}
+
+		missing_locations = list(dict.fromkeys(location for location in locations if location not in results))
+		chunks = [
+			missing_locations[i:i + self.max_locations_per_request]
+			for i in range(0, len(missing_locations), self.max_locations_per_request)
+		]
+		chunks_results = await asyncio.gather(
+			*[self.fetch_many_weather_data(chunk) for chunk in chunks], return_exceptions=True
+		)
+		fetched_at = time.time()
+
+		for chunk, chunk_results in zip(chunks, chunks_results):
+			# Whole request failed - the same error for each location.
+			if isinstance(chunk_results, Exception):
+				chunk_results = [chunk_results] * len(chunk)
+
+			for location, result in zip(chunk, chunk_results):
+				# Stale data is better than no data at all.
+				if not isinstance(result, Exception):
+					result = CacheEntry(value=result, created_at=fetched_at)
+				elif cached_entry := cached_entries.get(location):
+					logger.error(f'Fetching weather data for {location} failed, stale cache used: {result}')
+					result = cached_entry
+
+				results[location] = result
+
+		return [results[location] for location in locations]
+
+	async def _fetch_weather_data(self, latitude: float, longitude: float) -> OpenMeteoWeatherWeekSummary:
+		if self.micro_batcher is not None:
+			return await self.micro_batcher.submit((latitude, longitude))
+
+		[weather_data] = await self.fetch_many_weather_data([(latitude, longitude)])
+
+		if isinstance(weather_data, Exception):
+			raise weather_data
+
+		return weather_data
+
+	# Validates response body straight into models. When some of the results are invalid, the rest is validated
+	# one by one, so only invalid ones are replaced by errors.
+	@staticmethod
+	def _parse_weather_data(content: bytes, locations: int) -> list[OpenMeteoWeatherWeekSummary | Exception]:
+		try:
+			# Open-Meteo returns a list of results for multiple locations and a single result otherwise.
+			if locations > 1:
+				results = OPEN_METEO_WEEK_SUMMARIES_ADAPTER.validate_json(content)
+			else:
+				results = [OpenMeteoWeatherWeekSummary.model_validate_json(content)]
+		except ValidationError:
+			payloads = pydantic_core.from_json(content)
+			payloads = payloads if locations > 1 else [payloads]
+
+			if not isinstance(payloads, list):
+				raise
+
+			results = []
+
+			for payload in payloads:
+				try:
+					results.append(OpenMeteoWeatherWeekSummary.model_validate(payload))
+				except ValidationError as e:
+					results.append(e)
+
+		if len(results) != locations:
+			raise ValueError(f'Expected weather data for {locations} locations, got {len(results)}.')
+
+		return results
+
+	# Fetches (and caches) weather data for given locations with a single upstream request, without reading cache.
+	async def fetch_many_weather_data(
+			self, locations: list[tuple[float, float]]
+	) -> list[OpenMeteoWeatherWeekSummary | Exception]:
 		url = f'{self.base_url}/v1/forecast'
 		params = {
-			'latitude': latitude,
-			'longitude': longitude,
+			'latitude': ','.join(str(latitude) for latitude, _ in locations),
+			'longitude': ','.join(str(longitude) for _, longitude in locations),
+			'hourly': 'pressure_msl,shortwave_radiation,temperature_2m',
 			'daily': 'weather_code,temperature_2m_max,temperature_2m_min,sunshine_duration'
 		}
 
+		logger.info(f'Fetching {url} {params}')
+
+		with STAGE_DURATION.time('upstream_fetch'):
+			response = await self._get(url, params)
+
+		response.raise_for_status()
+
+		logger.info(f'Fetched weather data for {len(locations)} locations.')
+
+		results = []
+
+		with STAGE_DURATION.time('parse'):
+			parsed_weather_data = OpenMeteoWeatherDataService._parse_weather_data(response.content, len(locations))
+
+		for location, weather_data in zip(locations, parsed_weather_data):
+			if isinstance(weather_data, Exception):
+				results.append(weather_data)
+				continue
+
+			# Create new cache entry for raw weather data.
+			await self.cache_service.add_cache(
+				cache_key=OpenMeteoWeatherDataService._create_cash_key(*location), cache_value=weather_data
+			)
+			results.append(weather_data)
+
+		return results
+
+	# Failed requests count as failures of the circuit breaker only when retries didn't help
+	# (other client errors, e.g. 400 for invalid coordinates, are not a sign of unhealthy upstream).
+	async def _get(self, url: str, params: dict[str, str]) -> httpx.Response:
+		if self.circuit_breaker is None:
+			return await self._get_with_retries(url, params)
+
 		try:
-			cache_key = OpenMeteoForecastService._create_cash_key(latitude, longitude)
+			return await self.circuit_breaker.call(lambda: self._get_with_retries(url, params))
+		except CircuitBreakerOpenError:
+			UPSTREAM_RESPONSES.inc('circuit_open')
+			raise
 
-			# Return cached value if exists.
-			if cached_forecast := self.cache_service.get_cache(cache_key=cache_key):
-				return cached_forecast
+	# Open-Meteo requests are idempotent (GET), so network errors, timeouts and retryable statuses are retried.
+	# The last retryable response is raised as an error.
+	async def _get_with_retries(self, url: str, params: dict[str, str]) -> httpx.Response:
+		for attempt in range(self.retry_policy.max_retries if self.retry_policy else 0):
+			try:
+				response = await self._send(url, params)
 
-			logger.info(f'Fetching {url} {params}')
+				if response.status_code not in RETRYABLE_STATUS_CODES:
+					return response
+			except httpx.TransportError:
+				pass
 
-			response = requests.get(url, params=params)
+			delay = self.retry_policy.get_delay(attempt)
+			logger.warning(f'Request to {url} failed (attempt {attempt + 1}), retrying in {delay:.3f}s.')
+			UPSTREAM_RETRIES.inc()
+			await asyncio.sleep(delay)
+
+		response = await self._send(url, params)
+
+		if response.status_code in RETRYABLE_STATUS_CODES:
+			response.raise_for_status()
+
+		return response
+
+	async def _send(self, url: str, params: dict[str, str]) -> httpx.Response:
+		if self.rate_limiter is None:
+			return await self._send_now(url, params)
+
+		try:
+			with STAGE_DURATION.time('rate_limit_wait'):
+				await self.rate_limiter.acquire()
+		except RateLimiterTimeoutError:
+			UPSTREAM_RESPONSES.inc('rate_limited')
+			raise
+
+		try:
+			return await self._send_now(url, params)
+		finally:
+			self.rate_limiter.release()
+
+	async def _send_now(self, url: str, params: dict[str, str]) -> httpx.Response:
+		try:
+			response = await self.http_client.get(url, params=params)
+		except httpx.HTTPError:
+			UPSTREAM_RESPONSES.inc('error')
+			raise
 
-			logger.info('Fetched forecast.')
+		UPSTREAM_RESPONSES.inc(str(response.status_code))
+
+		return response
+
+
+# Location forecasts are cached without energy - only weather and daily yields, shared by all installations.
+# Forecast of the configured installation is created from it once and cached under its own key (so its rendered
+# and compressed bodies are kept by every cache backend), forecasts of other installations are created per request.
+class OpenMeteoForecastService(WeatherForecastService):
+	installation_power_kw: float
+	installation_efficiency: float
+	cache_service: CacheService
+	cache: StaleWhileRevalidateCache
+	weather_data_service: OpenMeteoWeatherDataService
+	coordinate_grid: CoordinateGrid
+	hot_location_tracker: HotLocationTracker
+	# Shared by all service instances (a new one is created per request).
+	single_flight: SingleFlight = SingleFlight()
+
+	def __init__(
+			self,
+			installation_power_kw: float,
+			installation_efficiency: float,
+			cache_service: CacheService,
+			cache_soft_ttl_seconds: float,
+			weather_data_service: OpenMeteoWeatherDataService,
+			coordinate_grid: CoordinateGrid,
+			hot_location_tracker: HotLocationTracker
+	) -> None:
+		self.installation_power_kw = installation_power_kw
+		self.installation_efficiency = installation_efficiency
+		self.cache_service = cache_service
+		self.cache = StaleWhileRevalidateCache(cache_service, cache_soft_ttl_seconds, self.single_flight)
+		self.weather_data_service = weather_data_service
+		self.coordinate_grid = coordinate_grid
+		self.hot_location_tracker = hot_location_tracker
+
+	# Support method for creating unique cash key (of the forecast of the configured installation).
+	@staticmethod
+	def _create_cash_key(latitude: float, longitude: float) -> str:
+		return f'forecast_{latitude}_{longitude}'
 
-			open_meteo_forecast = OpenMeteoWeatherForecast(**response.json())
+	# Support method for creating unique cash key of the location forecast.
+	@staticmethod
+	def _create_location_cash_key(latitude: float, longitude: float) -> str:
+		return f'location_forecast_{latitude}_{longitude}'
 
-			forecast = WeatherForecast(
-				latitude=open_meteo_forecast.latitude,
-				longitude=open_meteo_forecast.longitude,
-				time_unit=open_meteo_forecast.daily_units.time,
-				weather_code_unit=open_meteo_forecast.daily_units.weather_code,
-				temp_max_unit=open_meteo_forecast.daily_units.temperature_2m_max,
-				temp_min_unit=open_meteo_forecast.daily_units.temperature_2m_min,
-				sunshine_duration_unit=open_meteo_forecast.daily_units.sunshine_duration,
-				generated_energy_unit='kWh',
-				installation_power_unit='kW',
-				installation_power=self.installation_power_kw,
-				installation_efficiency=self.installation_efficiency,
-				days=self._get_days(open_meteo_forecast.daily)
+	async def get_weather_forecast_entry(
+			self,
+			latitude: float,
+			longitude: float,
+			installation_power_kw: float | None = None,
+			installation_efficiency: float | None = None
+	) -> CacheEntry:
+		try:
+			# Nearby coordinates are snapped to the same grid point, so they share the cache entry and upstream request.
+			latitude, longitude = self.coordinate_grid.snap(latitude, longitude)
+			self.hot_location_tracker.record(latitude, longitude)
+			installation = (
+				self.installation_power_kw if installation_power_kw is None else installation_power_kw,
+				self.installation_efficiency if installation_efficiency is None else installation_efficiency
 			)
 
-			# Create new cache entry for current forecast.
-			self.cache_service.add_cache(cache_key=cache_key, cache_value=forecast)
+			# Return cached value if exists, otherwise create (and cache) a new one.
+			if installation == (self.installation_power_kw, self.installation_efficiency):
+				cache_key = OpenMeteoForecastService._create_cash_key(latitude, longitude)
+
+				return await self.cache.get(cache_key, lambda: self._create_weather_forecast(latitude, longitude))
 
-			return forecast
+			cache_key = OpenMeteoForecastService._create_location_cash_key(latitude, longitude)
+			entry = await self.cache.get(cache_key, lambda: self._create_location_forecast(latitude, longitude))
+			forecast_entry = CacheEntry(
+				value=self._build_weather_forecast(entry.value, *installation), created_at=entry.created_at
+			)
+			forecast_entry.content_encodings = PER_REQUEST_CONTENT_ENCODINGS
+
+			return forecast_entry
 
 		# Catch any exception (e.g. from API or during parsing) and rethrow it.
 		except Exception as e:
 			raise WeatherForecastNotAvailableError(e)
 
+	async def get_weather_forecasts(
+			self, locations: list[tuple[float, float]]
+	) -> list[WeatherForecast | WeatherForecastNotAvailableError]:
+		locations = [self.coordinate_grid.snap(latitude, longitude) for latitude, longitude in locations]
+
+		for location in locations:
+			self.hot_location_tracker.record(*location)
+
+		location_forecasts = await self._get_location_forecasts(list(dict.fromkeys(locations)))
+		forecasts = {
+			location: forecast
+			for location, forecast in location_forecasts.items()
+			if isinstance(forecast, Exception)
+		}
+		available = [location for location in location_forecasts if location not in forecasts]
+
+		# Energy of all locations is computed at once, with columnar (NumPy) transforms.
+		try:
+			with STAGE_DURATION.time('transform'):
+				built_forecasts = build_weather_forecasts(
+					[location_forecasts[location] for location in available],
+					self.installation_power_kw,
+					self.installation_efficiency
+				)
+		except Exception as e:
+			built_forecasts = [WeatherForecastNotAvailableError(e)] * len(available)
+
+		forecasts.update(zip(available, built_forecasts))
+
+		return [forecasts[location] for location in locations]
+
+	# Installations are grouped by forecast cell (snapped coordinates) - forecast of each cell is read (or fetched)
+	# once and energy of all installations is computed together, with columnar (NumPy) transforms.
+	async def get_installations_energy(
+			self, installations: list[Installation]
+	) -> list[InstallationEnergy | WeatherForecastNotAvailableError]:
+		cells = [
+			self.coordinate_grid.snap(installation.latitude, installation.longitude) for installation in installations
+		]
+		unique_cells = list(dict.fromkeys(cells))
+
+		for cell in unique_cells:
+			self.hot_location_tracker.record(*cell)
+
+		set_access_log_field('installations', len(installations))
+		set_access_log_field('cells', len(unique_cells))
+		location_forecasts = await self._get_location_forecasts(unique_cells)
+
+		# Installations of cells without forecast share the error of their cell.
+		errors = {
+			cell: forecast
+			for cell, forecast in location_forecasts.items()
+			if isinstance(forecast, Exception)
+		}
+		available_cells = {cell: i for i, cell in enumerate(cell for cell in unique_cells if cell not in errors)}
+		available = [i for i, cell in enumerate(cells) if cell in available_cells]
+
+		try:
+			with STAGE_DURATION.time('transform'):
+				energies = build_installations_energy(
+					[location_forecasts[cell] for cell in available_cells],
+					[available_cells[cells[i]] for i in available],
+					[installations[i].installation_power_kw for i in available],
+					[installations[i].installation_efficiency for i in available]
+				)
+		except Exception as e:
+			energies = [WeatherForecastNotAvailableError(e)] * len(available)
+
+		results = [errors.get(cell) for cell in cells]
+
+		for i, energy in zip(available, energies):
+			results[i] = energy
+
+		return results
+
+	# Refreshes cached forecast (for already snapped coordinates) if it's missing or older than "max_age".
+	async def prewarm_weather_forecast(self, latitude: float, longitude: float, max_age: float) -> None:
+		cache_key = OpenMeteoForecastService._create_cash_key(latitude, longitude)
+
+		await self.cache.refresh(
+			cache_key, lambda: self._create_weather_forecast(latitude, longitude, max_age), max_age
+		)
+
+	# Returns location forecast or error for each of given (snapped, distinct) locations.
+	# Cache hits are served directly (stale ones are refreshed in the background, as in a single request),
+	# forecasts of missing locations are built at once from fetched weather data, with columnar transforms.
+	async def _get_location_forecasts(
+			self, locations: list[tuple[float, float]]
+	) -> dict[tuple[float, float], LocationWeatherForecast | WeatherForecastNotAvailableError]:
+		cache_keys = {
+			location: OpenMeteoForecastService._create_location_cash_key(*location) for location in locations
+		}
+		forecasts = {}
+
+		with STAGE_DURATION.time('cache_lookup'):
+			entries = await self.cache_service.get_many_cache_entries(list(cache_keys.values()))
+
+		for location, entry in zip(cache_keys, entries):
+			if entry is None:
+				continue
+
+			forecasts[location] = entry.value
+
+			if self.cache.is_stale(entry):
+				self.cache.refresh_in_background(
+					cache_keys[location], lambda location=location: self._create_location_forecast(*location)
+				)
+
+		missing_locations = [location for location in cache_keys if location not in forecasts]
+		CACHE_LOOKUPS.inc('hit', value=len(forecasts))
+		CACHE_LOOKUPS.inc('miss', value=len(missing_locations))
+		set_access_log_field('cache_hits', len(forecasts))
+		set_access_log_field('cache_misses', len(missing_locations))
+		weather_data = await self.weather_data_service.get_many_weather_data(missing_locations)
+
+		fetched = {}
+
+		for location, weather_data_entry in zip(missing_locations, weather_data):
+			if isinstance(weather_data_entry, Exception):
+				forecasts[location] = WeatherForecastNotAvailableError(weather_data_entry)
+			else:
+				fetched[location] = weather_data_entry
+
+		try:
+			with STAGE_DURATION.time('transform'):
+				built_forecasts = build_location_forecasts([entry.value for entry in fetched.values()])
+		except Exception as e:
+			built_forecasts = [e] * len(fetched)
+
+		for (location, weather_data_entry), forecast in zip(fetched.items(), built_forecasts):
+			try:
+				if isinstance(forecast, Exception):
+					raise forecast
+
+				await self.cache_service.add_cache(
+					cache_key=cache_keys[location], cache_value=forecast, created_at=weather_data_entry.created_at
+				)
+				forecasts[location] = forecast
+			except Exception as e:
+				forecasts[location] = WeatherForecastNotAvailableError(e)
+
+		return forecasts
+
+	# Forecast of the configured installation, created from the cached (or a new) location forecast.
+	async def _create_weather_forecast(
+			self, latitude: float, longitude: float, max_age: float | None = None
+	) -> CacheEntry:
+		location_entry = await self.cache.refresh(
+			OpenMeteoForecastService._create_location_cash_key(latitude, longitude),
+			lambda: self._create_location_forecast(latitude, longitude, max_age),
+			self.cache.soft_ttl_seconds if max_age is None else max_age
+		)
+
+		with STAGE_DURATION.time('transform'):
+			forecast = self._build_weather_forecast(
+				location_entry.value, self.installation_power_kw, self.installation_efficiency
+			)
+
+		return CacheEntry(value=forecast, created_at=location_entry.created_at)
+
+	async def _create_location_forecast(
+			self, latitude: float, longitude: float, max_age: float | None = None
+	) -> CacheEntry:
+		weather_data_entry = await self.weather_data_service.get_weather_data(latitude, longitude, max_age)
+
+		with STAGE_DURATION.time('transform'):
+			forecast = self._build_location_forecast(weather_data_entry.value)
+
+		return CacheEntry(value=forecast, created_at=weather_data_entry.created_at)
+
+	def _build_location_forecast(self, open_meteo_forecast: OpenMeteoWeatherWeekSummary) -> LocationWeatherForecast:
+		return LocationWeatherForecast(
+			latitude=open_meteo_forecast.latitude,
+			longitude=open_meteo_forecast.longitude,
+			time_unit=open_meteo_forecast.daily_units.time,
+			weather_code_unit=open_meteo_forecast.daily_units.weather_code,
+			temp_max_unit=open_meteo_forecast.daily_units.temperature_2m_max,
+			temp_min_unit=open_meteo_forecast.daily_units.temperature_2m_min,
+			sunshine_duration_unit=open_meteo_forecast.daily_units.sunshine_duration,
+			days=self._get_days(open_meteo_forecast.daily, open_meteo_forecast.hourly)
+		)
+
 	# Group and map days from Open Meteo response to our format.
-	def _get_days(self, daily: OpenMeteoDaily) -> list[WeatherDay]:
+	def _get_days(self, daily: OpenMeteoDaily, hourly: OpenMeteoHourly) -> list[LocationWeatherDay]:
 		# Open Meteo returns info per day in separated lists where index points to each day.
 		grouped_days = zip(
 			daily.time,
 			daily.weather_code,
 			daily.temperature_2m_max,
 			daily.temperature_2m_min,
-			daily.sunshine_duration
+			daily.sunshine_duration,
+			OpenMeteoForecastService._get_daily_yields(hourly, len(daily.time))
 		)
 
 		return [
-			WeatherDay(
+			LocationWeatherDay(
 				time=time,
 				day=OpenMeteoForecastService._get_day(time),
 				weather_code=code,
-				weather_type=OpenMeteoGroupedWeatherCodeEnum.create_from_weather_code(code).to_weather_type(),
+				weather_type=WEATHER_CODE_TYPES[code],
 				temp_max=t_max,
 				temp_min=t_min,
 				sunshine_duration=sunshine,
-				generated_energy=self._calculate_energy(sunshine)
+				daily_yield=daily_yield
 			)
-			for (time, code, t_max, t_min, sunshine) in grouped_days
+			for (time, code, t_max, t_min, sunshine, daily_yield) in grouped_days
 		]
 
+	# Energy generated per kW of installation power each day, estimated from hourly irradiance and temperature.
 	@staticmethod
+	def _get_daily_yields(hourly: OpenMeteoHourly, days: int) -> list[float]:
+		return calculate_daily_yields(
+			np.array(hourly.shortwave_radiation, dtype=np.float64),
+			np.array(hourly.temperature_2m, dtype=np.float64),
+			days
+		).tolist()
+
+	# All locations share the same forecast dates, so each date is converted once and then looked up.
+	@staticmethod
+	@lru_cache(maxsize=DAY_CACHE_SIZE)
 	def _get_day(time: str) -> DayEnum:
-		# Parse time to datetime and get week day (index) based on which we return day as string key.
-		return DayEnum.get_by_index(datetime.strptime(time, "%Y-%m-%d").weekday())
+		# Get week day (index) of ISO date, based on which we return day as string key.
+		return DayEnum.get_by_index(date.fromisoformat(time).weekday())
+
+	# Forecast of the given installation, created from the cached location forecast.
+	@staticmethod
+	def _build_weather_forecast(
+			forecast: LocationWeatherForecast, installation_power_kw: float, installation_efficiency: float
+	) -> WeatherForecast:
+		return WeatherForecast(
+			latitude=forecast.latitude,
+			longitude=forecast.longitude,
+			time_unit=forecast.time_unit,
+			weather_code_unit=forecast.weather_code_unit,
+			temp_max_unit=forecast.temp_max_unit,
+			temp_min_unit=forecast.temp_min_unit,
+			sunshine_duration_unit=forecast.sunshine_duration_unit,
+			generated_energy_unit='kWh',
+			installation_power_unit='kW',
+			installation_power=installation_power_kw,
+			installation_efficiency=installation_efficiency,
+			days=[
+				WeatherDay(
+					time=day.time,
+					day=day.day,
+					weather_code=day.weather_code,
+					weather_type=day.weather_type,
+					temp_max=day.temp_max,
+					temp_min=day.temp_min,
+					sunshine_duration=day.sunshine_duration,
+					generated_energy=OpenMeteoForecastService._calculate_energy(
+						day.daily_yield, installation_power_kw, installation_efficiency
+					)
+				)
+				for day in forecast.days
+			]
+		)
 
-	def _calculate_energy(self, sunshine_duration: float) -> float:
+	@staticmethod
+	def _calculate_energy(daily_yield: float, installation_power_kw: float, installation_efficiency: float) -> float:
 		return round(
-			self.installation_power_kw * (sunshine_duration / HOUR_IN_SECONDS) * self.installation_efficiency,
-			GENERATED_ENERGY_DECIMAL_PART_LENGTH
+			installation_power_kw * daily_yield * installation_efficiency, GENERATED_ENERGY_DECIMAL_PART_LENGTH
 		)
 
 
 class OpenMeteoWeekSummaryService(WeatherWeekSummaryService):
-	base_url: str
 	cache_service: CacheService
+	cache: StaleWhileRevalidateCache
+	weather_data_service: OpenMeteoWeatherDataService
+	coordinate_grid: CoordinateGrid
+	hot_location_tracker: HotLocationTracker
+	# Shared by all service instances (a new one is created per request).
+	single_flight: SingleFlight = SingleFlight()
 
-	def __init__(self, base_url: str, cache_service: CacheService) -> None:
-		self.base_url = base_url
+	def __init__(
+			self,
+			cache_service: CacheService,
+			cache_soft_ttl_seconds: float,
+			weather_data_service: OpenMeteoWeatherDataService,
+			coordinate_grid: CoordinateGrid,
+			hot_location_tracker: HotLocationTracker
+	) -> None:
 		self.cache_service = cache_service
+		self.cache = StaleWhileRevalidateCache(cache_service, cache_soft_ttl_seconds, self.single_flight)
+		self.weather_data_service = weather_data_service
+		self.coordinate_grid = coordinate_grid
+		self.hot_location_tracker = hot_location_tracker
 
 	# Support method for creating unique cash key.
 	@staticmethod
 	def _create_cash_key(latitude: float, longitude: float) -> str:
 		return f'summary_{latitude}_{longitude}'
 
-	def get_week_summary(self, latitude: float, longitude: float) -> WeatherWeekSummary:
-		url = f'{self.base_url}/v1/forecast'
-		params = {
-			'latitude': latitude,
-			'longitude': longitude,
-			'hourly': 'pressure_msl',
-			'daily': 'weather_code,temperature_2m_max,temperature_2m_min,sunshine_duration'
-		}
-
+	async def get_week_summary_entry(self, latitude: float, longitude: float) -> CacheEntry:
 		try:
+			# Nearby coordinates are snapped to the same grid point, so they share the cache entry and upstream request.
+			latitude, longitude = self.coordinate_grid.snap(latitude, longitude)
 			cache_key = OpenMeteoWeekSummaryService._create_cash_key(latitude, longitude)
+			self.hot_location_tracker.record(latitude, longitude)
 
-			# Return cached value if exists.
-			if cached_summary := self.cache_service.get_cache(cache_key=cache_key):
-				return cached_summary
-
-			logger.info(f'Fetching {url} {params}')
-
-			response = requests.get(url, params=params)
-			logger.info('Fetched week summary.')
-
-			open_meteo_summary = OpenMeteoWeatherWeekSummary(**response.json())
-
-			summary = WeatherWeekSummary(
-				latitude=open_meteo_summary.latitude,
-				longitude=open_meteo_summary.longitude,
-				hourly_time_unit=open_meteo_summary.hourly_units.time,
-				pressure_msl_unit=open_meteo_summary.hourly_units.pressure_msl,
-				daily_time_unit=open_meteo_summary.daily_units.time,
-				weather_code_unit=open_meteo_summary.daily_units.weather_code,
-				temp_max_unit=open_meteo_summary.daily_units.temperature_2m_max,
-				temp_min_unit=open_meteo_summary.daily_units.temperature_2m_min,
-				sunshine_duration_unit=open_meteo_summary.daily_units.sunshine_duration,
-				mean_pressure=OpenMeteoWeekSummaryService._get_mean_pressure(open_meteo_summary.hourly.pressure_msl),
-				mean_sunshine_duration=OpenMeteoWeekSummaryService._get_mean_sunshine_duration(
-					open_meteo_summary.daily.sunshine_duration
-				),
-				temp_max_week=OpenMeteoWeekSummaryService._get_max_temp(open_meteo_summary.daily.temperature_2m_max),
-				temp_min_week=OpenMeteoWeekSummaryService._get_min_temp(open_meteo_summary.daily.temperature_2m_min),
-				weather_types=OpenMeteoWeekSummaryService._get_weather_types(open_meteo_summary.daily.weather_code)
-			)
-
-			# Create new cache entry for week summary.
-			self.cache_service.add_cache(cache_key=cache_key, cache_value=summary)
-
-			return summary
+			# Return cached value if exists, otherwise create (and cache) a new one.
+			return await self.cache.get(cache_key, lambda: self._create_week_summary(latitude, longitude))
 
 		# Catch any exception (e.g. from API or during parsing) and rethrow it.
 		except Exception as e:
 			raise WeatherWeekSummaryNotAvailableError(e)
 
-	@staticmethod
-	def _get_mean_pressure(pressures: list[float]) -> float:
-		return round(mean(pressures), MEAN_PRESSURE_DECIMAL_PART_LENGTH)
+	# Refreshes cached summary (for already snapped coordinates) if it's missing or older than "max_age".
+	async def prewarm_week_summary(self, latitude: float, longitude: float, max_age: float) -> None:
+		cache_key = OpenMeteoWeekSummaryService._create_cash_key(latitude, longitude)
 
-	@staticmethod
-	def _get_mean_sunshine_duration(sunshine_durations: list[float]) -> float:
-		return round(mean(sunshine_durations), MEAN_SUNSHINE_DURATION_DECIMAL_PART_LENGTH)
+		await self.cache.refresh(cache_key, lambda: self._create_week_summary(latitude, longitude, max_age), max_age)
 
-	@staticmethod
-	def _get_max_temp(max_temps: list[float]) -> float:
-		return max(max_temps)
+	async def _create_week_summary(
+			self, latitude: float, longitude: float, max_age: float | None = None
+	) -> CacheEntry:
+		weather_data_entry = await self.weather_data_service.get_weather_data(latitude, longitude, max_age)
 
-	@staticmethod
-	def _get_min_temp(min_temps: list[float]) -> float:
-		return min(min_temps)
+		with STAGE_DURATION.time('transform'):
+			week_summary = self._build_week_summary(weather_data_entry.value)
 
-	@staticmethod
-	def _get_weather_types(weather_codes: list[OpenMeteoWeatherCodeEnum]) -> list[WeatherTypeEnum]:
-		if not weather_codes:
-			raise ValueError('Given list should not be empty.')
-
-		grouped = []
+		return CacheEntry(value=week_summary, created_at=weather_data_entry.created_at)
 
-		# Mapping weather codes from Open Meteo to weather groups.
-		for code in weather_codes:
-			grouped.append(OpenMeteoGroupedWeatherCodeEnum.create_from_weather_code(code))
-
-		counter = Counter(grouped)
-		max_count = max(counter.values())
+	@staticmethod
+	def _build_week_summary(open_meteo_summary: OpenMeteoWeatherWeekSummary) -> WeatherWeekSummary:
+		[week_summary] = build_week_summaries([open_meteo_summary])
 
-		# Return list of most common weather types as a string keys.
-		return [k.to_weather_type() for k, c in counter.items() if c == max_count]
+		return week_summary
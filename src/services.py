@@ -1,10 +1,36 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Any
+from typing import Awaitable, Callable, TypeVar
 
 from pydantic import BaseModel
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
 
-from src.models import CacheService
-from src.utils import create_logger
+from src.constants import (
+	CACHE_FORMAT_VERSION,
+	CACHE_MODEL_VERSION_LENGTH,
+	COORDINATE_GRID_DECIMAL_PART_LENGTH,
+	HOT_LOCATION_SKETCH_DEPTH,
+	HOT_LOCATION_SKETCH_WIDTH,
+	PER_REQUEST_CONTENT_ENCODINGS,
+	SQLITE_BUSY_TIMEOUT_MS,
+	SQLITE_MAX_QUERY_PARAMETERS,
+	SQLITE_SWEEP_INTERVAL_SECONDS,
+)
+from src.metrics import CACHE_LOOKUPS, STAGE_DURATION
+from src.models import CacheEntry, CacheService, CoordinateGrid
+from src.utils import CountMinSketch, SingleFlight, create_logger, set_access_log_field
+
+R = TypeVar('R')
 
 logger = create_logger('DailyCacheService')
 
@@ -13,13 +39,13 @@ class DailyCacheService(CacheService):
 	# Cache will look like this:
 	# {
 	# 	['2024-12-09']: {
-	# 		['key']: {...},
-	# 		['key2']: {...},
+	# 		['key']: CacheEntry(...),
+	# 		['key2']: CacheEntry(...),
 	# 	}
 	# }
-	cache: dict[str, dict[str, Any]] = {}
+	cache: dict[str, dict[str, CacheEntry]] = {}
 
-	def add_cache(self, cache_key: str, cache_value: BaseModel) -> None:
+	async def add_cache(self, cache_key: str, cache_value: BaseModel, created_at: float | None = None) -> CacheEntry:
 		today_date = datetime.now().date()
 		self._delete_old_cache(today_date)
 
@@ -28,11 +54,14 @@ class DailyCacheService(CacheService):
 			self.cache[str(today_date)] = {}
 
 		# Save data in cache by date key and individual key.
-		self.cache[str(today_date)][cache_key] = cache_value
+		entry = CacheEntry(value=cache_value, created_at=time.time() if created_at is None else created_at)
+		self.cache[str(today_date)][cache_key] = entry
 
 		logger.info(f'Added new cache for {today_date} with key {cache_key}.')
 
-	def get_cache(self, cache_key: str) -> BaseModel | None:
+		return entry
+
+	async def get_cache_entry(self, cache_key: str) -> CacheEntry | None:
 		today_date = datetime.now().date()
 
 		if date_cache := self.cache.get(str(today_date)):
@@ -60,5 +89,531 @@ class DailyCacheService(CacheService):
 			logger.info(f'Deleted old cache from {key_to_remove}.')
 
 
+@dataclass
+class BoundedCacheEntry(CacheEntry):
+	size: int
+	expires_at: float
+
+
+# In-memory cache with a fixed budget, safe against unbounded growth (e.g. a crawler sweeping coordinates).
+# Entries expire after given TTL and least recently used entries are evicted when either
+# the entry count or the approximate size (length of the JSON body - compressed variants, created when the entry
+# is first sent, are a fraction of it) exceeds the limit.
+# A single instance has to be shared by the application (see create_cache_service).
+class BoundedCacheService(CacheService):
+	max_entries: int
+	max_bytes: int
+	ttl_seconds: float
+	entries: OrderedDict[str, BoundedCacheEntry]
+	size: int
+	# Counters for monitoring (e.g. cache hit ratio, eviction rate).
+	hits: int
+	misses: int
+	evictions: int
+	expirations: int
+
+	def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float) -> None:
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self.ttl_seconds = ttl_seconds
+		self.entries = OrderedDict()
+		self.size = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.expirations = 0
+
+	async def add_cache(self, cache_key: str, cache_value: BaseModel, created_at: float | None = None) -> CacheEntry:
+		created_at = time.time() if created_at is None else created_at
+		entry = BoundedCacheEntry(
+			value=cache_value, created_at=created_at, size=0, expires_at=created_at + self.ttl_seconds
+		)
+		entry.size = len(entry.get_body())
+		size = entry.size
+
+		if size > self.max_bytes:
+			logger.info(f'Value with key {cache_key} exceeds cache budget ({size} bytes), skipped.')
+
+			return entry
+
+		self._remove(cache_key)
+
+		self.entries[cache_key] = entry
+		self.size += size
+
+		# Evict least recently used entries (at the beginning of the ordered dict) until the cache fits the budget.
+		while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+			_, evicted_entry = self.entries.popitem(last=False)
+			self.size -= evicted_entry.size
+			self.evictions += 1
+
+		logger.info(f'Added new cache with key {cache_key}.')
+
+		return entry
+
+	async def get_cache_entry(self, cache_key: str) -> CacheEntry | None:
+		entry = self.entries.get(cache_key)
+
+		if entry is None:
+			self.misses += 1
+
+			return None
+
+		if entry.expires_at <= time.time():
+			self._remove(cache_key)
+			self.expirations += 1
+			self.misses += 1
+
+			return None
+
+		# Mark entry as the most recently used one.
+		self.entries.move_to_end(cache_key)
+		self.hits += 1
+
+		return entry
+
+	def get_stats(self) -> dict[str, int]:
+		return {
+			'hits': self.hits,
+			'misses': self.misses,
+			'evictions': self.evictions,
+			'expirations': self.expirations
+		}
+
+	def _remove(self, cache_key: str) -> None:
+		if (entry := self.entries.pop(cache_key, None)) is not None:
+			self.size -= entry.size
+
+
+# Serializes cache entries into compact bytes (used by out-of-process cache backends).
+# Values are stored as gzip compressed JSON prefixed with the model version (used to restore the proper model class,
+# one of given "models") and the entry creation time, e.g. b'WeatherWeekSummary@1a2b3c4d:1733702400.0:<gzip JSON>'.
+# Model version is a fingerprint of its JSON schema (and the payload format), so entries written before a model change
+# (e.g. by the previous deployment) are not restored into the new model. Such entries, as well as damaged ones,
+# are treated as cache misses.
+class CacheSerializer:
+	models: dict[str, type[BaseModel]]
+	model_versions: dict[type[BaseModel], str]
+
+	def __init__(self, models: list[type[BaseModel]]) -> None:
+		self.model_versions = {model: CacheSerializer._get_model_version(model) for model in models}
+		self.models = {version: model for model, version in self.model_versions.items()}
+
+	@staticmethod
+	def _get_model_version(model: type[BaseModel]) -> str:
+		schema = json.dumps([CACHE_FORMAT_VERSION, model.model_json_schema()], sort_keys=True).encode()
+
+		return f'{model.__name__}@{hashlib.sha1(schema).hexdigest()[:CACHE_MODEL_VERSION_LENGTH]}'
+
+	# Stored payload is the gzip encoded variant of the entry body, so the entry can be sent without compressing
+	# it again.
+	def serialize(self, entry: CacheEntry) -> bytes:
+		header = f'{self.model_versions[entry.value.__class__]}:{entry.created_at!r}:'.encode()
+
+		return header + entry.get_encoded_body('gzip')
+
+	# Entry of a value stored in (or read from) the serialized form - created per request, so it's sent only
+	# in the encodings which are fast to create.
+	@staticmethod
+	def create_entry(cache_value: BaseModel, created_at: float) -> CacheEntry:
+		entry = CacheEntry(value=cache_value, created_at=created_at)
+		entry.content_encodings = PER_REQUEST_CONTENT_ENCODINGS
+
+		return entry
+
+	def deserialize(self, payload: bytes | None) -> CacheEntry | None:
+		if payload is None:
+			return None
+
+		try:
+			model_version, created_at, compressed_json = payload.split(b':', 2)
+			model = self.models.get(model_version.decode())
+
+			# Entry written by another version of the model.
+			if model is None:
+				return None
+
+			json_value = gzip.decompress(compressed_json)
+			entry = CacheSerializer.create_entry(model.model_validate_json(json_value), float(created_at))
+			# Stored JSON is the rendered value already, and the stored payload is its gzip encoded variant.
+			entry.body = json_value
+			entry.encoded_bodies['gzip'] = compressed_json
+
+			return entry
+		except (ValueError, OSError, EOFError, zlib.error) as e:
+			logger.error(f'Reading cache entry failed: {e}')
+
+			return None
+
+
+# Cache stored in Redis (or any server speaking its protocol), shared by all workers and replicas.
+# Expiration is handled by the server (TTL set on each key).
+# Redis failures are logged and treated as cache misses, so cache outage doesn't make the API unavailable.
+class RedisCacheService(CacheService):
+	redis: Redis
+	ttl_seconds: float
+	serializer: CacheSerializer
+
+	def __init__(self, redis: Redis, ttl_seconds: float, models: list[type[BaseModel]]) -> None:
+		self.redis = redis
+		self.ttl_seconds = ttl_seconds
+		self.serializer = CacheSerializer(models)
+
+	async def add_cache(self, cache_key: str, cache_value: BaseModel, created_at: float | None = None) -> CacheEntry:
+		now = time.time()
+		created_at = now if created_at is None else created_at
+		entry = CacheSerializer.create_entry(cache_value, created_at)
+		ttl_ms = int((created_at + self.ttl_seconds - now) * 1000)
+
+		# Value created from data which is already expired.
+		if ttl_ms <= 0:
+			return entry
+
+		try:
+			await self.redis.set(cache_key, self.serializer.serialize(entry), px=ttl_ms)
+
+			logger.info(f'Added new cache with key {cache_key}.')
+		except RedisError as e:
+			logger.error(f'Adding cache with key {cache_key} failed: {e}')
+
+		return entry
+
+	async def get_cache_entry(self, cache_key: str) -> CacheEntry | None:
+		try:
+			return self.serializer.deserialize(await self.redis.get(cache_key))
+		except RedisError as e:
+			logger.error(f'Getting cache with key {cache_key} failed: {e}')
+
+			return None
+
+	# Fetches all keys with a single MGET command (one round trip).
+	async def get_many_cache_entries(self, cache_keys: list[str]) -> list[CacheEntry | None]:
+		if not cache_keys:
+			return []
+
+		try:
+			return [self.serializer.deserialize(payload) for payload in await self.redis.mget(cache_keys)]
+		except RedisError as e:
+			logger.error(f'Getting cache with keys {cache_keys} failed: {e}')
+
+			return [None] * len(cache_keys)
+
+	async def close(self) -> None:
+		await self.redis.aclose()
+
+
+# Cache stored in a local SQLite database file, shared by all worker processes on the host
+# and kept across restarts. WAL journal mode allows readers to work concurrently with a writer.
+# Queries are blocking, so they are run on a dedicated thread (one per service, which also serializes
+# access to the connection) - waiting for a lock held by another worker doesn't stall the event loop.
+# Database failures (e.g. lock timeout) are logged and treated as cache misses.
+class SqliteCacheService(CacheService):
+	connection: sqlite3.Connection
+	executor: ThreadPoolExecutor
+	ttl_seconds: float
+	serializer: CacheSerializer
+	swept_at: float
+
+	def __init__(self, path: str, ttl_seconds: float, models: list[type[BaseModel]]) -> None:
+		self.connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+		self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='SqliteCacheService')
+		self.ttl_seconds = ttl_seconds
+		self.serializer = CacheSerializer(models)
+		self.swept_at = 0
+
+		self.connection.execute('PRAGMA journal_mode=WAL')
+		# With WAL, NORMAL synchronization is safe from corruption and doesn't sync the disk on every write.
+		self.connection.execute('PRAGMA synchronous=NORMAL')
+		self.connection.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+		self.connection.execute(
+			'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)'
+			' WITHOUT ROWID'
+		)
+		self.connection.execute('CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)')
+
+	async def _run(self, function: Callable[[], R]) -> R:
+		return await asyncio.get_running_loop().run_in_executor(self.executor, function)
+
+	async def add_cache(self, cache_key: str, cache_value: BaseModel, created_at: float | None = None) -> CacheEntry:
+		now = time.time()
+		created_at = now if created_at is None else created_at
+		entry = CacheSerializer.create_entry(cache_value, created_at)
+		payload = self.serializer.serialize(entry)
+
+		try:
+			await self._run(lambda: self._insert(cache_key, payload, created_at + self.ttl_seconds, now))
+
+			logger.info(f'Added new cache with key {cache_key}.')
+		except sqlite3.Error as e:
+			logger.error(f'Adding cache with key {cache_key} failed: {e}')
+
+		return entry
+
+	def _insert(self, cache_key: str, payload: bytes, expires_at: float, now: float) -> None:
+		self.connection.execute(
+			'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)', (cache_key, payload, expires_at)
+		)
+
+		# Expired entries are removed periodically (uses expires_at index), reads just skip them.
+		if now - self.swept_at >= SQLITE_SWEEP_INTERVAL_SECONDS:
+			self.swept_at = now
+			self.connection.execute('DELETE FROM cache WHERE expires_at <= ?', (now,))
+
+	async def get_cache_entry(self, cache_key: str) -> CacheEntry | None:
+		try:
+			now = time.time()
+			row = await self._run(
+				lambda: self.connection.execute(
+					'SELECT value FROM cache WHERE key = ? AND expires_at > ?', (cache_key, now)
+				).fetchone()
+			)
+		except sqlite3.Error as e:
+			logger.error(f'Getting cache with key {cache_key} failed: {e}')
+
+			return None
+
+		return self.serializer.deserialize(row[0] if row else None)
+
+	async def get_many_cache_entries(self, cache_keys: list[str]) -> list[CacheEntry | None]:
+		try:
+			now = time.time()
+			payloads = await self._run(lambda: self._select_many(cache_keys, now))
+		except sqlite3.Error as e:
+			logger.error(f'Getting cache with keys {cache_keys} failed: {e}')
+
+			return [None] * len(cache_keys)
+
+		return [self.serializer.deserialize(payloads.get(cache_key)) for cache_key in cache_keys]
+
+	def _select_many(self, cache_keys: list[str], now: float) -> dict[str, bytes]:
+		payloads = {}
+
+		# Keys are queried in chunks, as SQLite limits the number of query parameters.
+		for i in range(0, len(cache_keys), SQLITE_MAX_QUERY_PARAMETERS):
+			chunk = cache_keys[i:i + SQLITE_MAX_QUERY_PARAMETERS]
+			placeholders = ', '.join('?' * len(chunk))
+			rows = self.connection.execute(
+				f'SELECT key, value FROM cache WHERE key IN ({placeholders}) AND expires_at > ?', (*chunk, now)
+			)
+			payloads.update(rows)
+
+		return payloads
+
+	async def close(self) -> None:
+		await self._run(self.connection.close)
+		self.executor.shutdown()
+
+
+# Cache access with stale-while-revalidate semantics, used by services caching their results:
+# - fresh entry (younger than soft TTL) is returned directly,
+# - stale entry (older than soft TTL, but not yet removed by the cache backend after its hard TTL) is returned
+#   immediately and refreshed in the background. When the refresh fails, stale value is served until the next one,
+# - on cache miss the value is created and cached. Concurrent creations for the same key share one call.
+# "create" returns the new value as a cache entry, dated as the data it was created from (e.g. stale upstream
+# data used when the upstream request failed) - such values are not considered fresh and are refreshed again.
+class StaleWhileRevalidateCache:
+	cache_service: CacheService
+	soft_ttl_seconds: float
+	single_flight: SingleFlight
+	# Event loop keeps only weak references to tasks, so running refreshes are referenced here.
+	refresh_tasks: set[asyncio.Task] = set()
+
+	def __init__(self, cache_service: CacheService, soft_ttl_seconds: float, single_flight: SingleFlight) -> None:
+		self.cache_service = cache_service
+		self.soft_ttl_seconds = soft_ttl_seconds
+		self.single_flight = single_flight
+
+	async def get(self, cache_key: str, create: Callable[[], Awaitable[CacheEntry]]) -> CacheEntry:
+		with STAGE_DURATION.time('cache_lookup'):
+			entry = await self.cache_service.get_cache_entry(cache_key)
+
+		if entry is None:
+			StaleWhileRevalidateCache._record_lookup('miss')
+			return await self.single_flight.run(cache_key, lambda: self._create(cache_key, create))
+
+		if self.is_stale(entry):
+			StaleWhileRevalidateCache._record_lookup('stale')
+			self.refresh_in_background(cache_key, create)
+		else:
+			StaleWhileRevalidateCache._record_lookup('hit')
+
+		return entry
+
+	@staticmethod
+	def _record_lookup(result: str) -> None:
+		CACHE_LOOKUPS.inc(result)
+		set_access_log_field('cache', result)
+
+	def is_stale(self, entry: CacheEntry) -> bool:
+		return entry.get_age() > self.soft_ttl_seconds
+
+	# Creates a new value if cached one is missing or older than "max_age" (used to refresh entries ahead of time).
+	# Returns the cached or the new entry.
+	async def refresh(
+			self, cache_key: str, create: Callable[[], Awaitable[CacheEntry]], max_age: float
+	) -> CacheEntry:
+		entry = await self.cache_service.get_cache_entry(cache_key)
+
+		if entry is None or entry.get_age() > max_age:
+			return await self.single_flight.run(cache_key, lambda: self._create(cache_key, create))
+
+		return entry
+
+	# Returns the stored entry, so what is memoized on it (e.g. the rendered body) is kept for following hits.
+	async def _create(self, cache_key: str, create: Callable[[], Awaitable[CacheEntry]]) -> CacheEntry:
+		entry = await create()
+
+		return await self.cache_service.add_cache(
+			cache_key=cache_key, cache_value=entry.value, created_at=entry.created_at
+		)
+
+	def refresh_in_background(self, cache_key: str, create: Callable[[], Awaitable[CacheEntry]]) -> None:
+		# Refresh is already running.
+		if cache_key in self.single_flight.tasks:
+			return
+
+		logger.info(f'Refreshing stale cache with key {cache_key}.')
+
+		task = asyncio.ensure_future(self.single_flight.run(cache_key, lambda: self._create(cache_key, create)))
+		self.refresh_tasks.add(task)
+		task.add_done_callback(lambda done_task: self._finish_refresh(cache_key, done_task))
+
+	def _finish_refresh(self, cache_key: str, task: asyncio.Task) -> None:
+		self.refresh_tasks.discard(task)
+
+		if not task.cancelled() and (error := task.exception()):
+			logger.error(f'Refreshing stale cache with key {cache_key} failed: {error}')
+
+
+# Tracks the most requested locations. Request counts are estimated with a count-min sketch (fixed memory
+# regardless of the number of distinct locations), and only the most popular "capacity" locations are remembered.
+class HotLocationTracker:
+	capacity: int
+	sketch: CountMinSketch
+	locations: dict[tuple[float, float], int]
+	# Lower bound of counts in "locations", less popular locations can't replace any of them.
+	min_count: int
+
+	def __init__(self, capacity: int) -> None:
+		self.capacity = capacity
+		self.sketch = CountMinSketch(width=HOT_LOCATION_SKETCH_WIDTH, depth=HOT_LOCATION_SKETCH_DEPTH)
+		self.locations = {}
+		self.min_count = 0
+
+	def record(self, latitude: float, longitude: float) -> None:
+		location = (latitude, longitude)
+		count = self.sketch.add(location)
+
+		if location in self.locations or len(self.locations) < self.capacity:
+			self.locations[location] = count
+
+			if len(self.locations) == self.capacity:
+				self.min_count = min(self.locations.values())
+		elif count > self.min_count:
+			# Replace the least popular location.
+			del self.locations[min(self.locations, key=self.locations.get)]
+			self.locations[location] = count
+			self.min_count = min(self.locations.values())
+
+	def get_top(self, limit: int) -> list[tuple[float, float]]:
+		return sorted(self.locations, key=self.locations.get, reverse=True)[:limit]
+
+	# Halves all counts, so the ranking follows current traffic rather than all-time totals.
+	# Locations not requested since a few decays drop to zero and are forgotten (they are not prewarmed anymore).
+	def decay(self) -> None:
+		self.sketch.decay()
+		self.locations = {location: count >> 1 for location, count in self.locations.items() if count >> 1}
+		self.min_count = min(self.locations.values()) if len(self.locations) == self.capacity else 0
+
+
+# Background task periodically refreshing cache for the most popular locations, before their entries
+# become stale or expire, so user requests almost never hit a cold cache. "prewarm" is called for each
+# of "top_locations" hottest locations, at most "concurrency" at a time.
+class PrewarmScheduler:
+	hot_location_tracker: HotLocationTracker
+	prewarm: Callable[[float, float], Awaitable[None]]
+	top_locations: int
+	interval_seconds: float
+	concurrency: int
+	task: asyncio.Task | None
+
+	def __init__(
+			self,
+			hot_location_tracker: HotLocationTracker,
+			prewarm: Callable[[float, float], Awaitable[None]],
+			top_locations: int,
+			interval_seconds: float,
+			concurrency: int
+	) -> None:
+		self.hot_location_tracker = hot_location_tracker
+		self.prewarm = prewarm
+		self.top_locations = top_locations
+		self.interval_seconds = interval_seconds
+		self.concurrency = concurrency
+		self.task = None
+
+	def start(self) -> None:
+		self.task = asyncio.create_task(self._run())
+
+	async def stop(self) -> None:
+		if self.task is None:
+			return
+
+		self.task.cancel()
+		await asyncio.gather(self.task, return_exceptions=True)
+		self.task = None
+
+	async def prewarm_top_locations(self) -> None:
+		locations = self.hot_location_tracker.get_top(self.top_locations)
+		semaphore = asyncio.Semaphore(self.concurrency)
+
+		logger.info(f'Prewarming cache for {len(locations)} locations.')
+
+		async def prewarm_location(latitude: float, longitude: float) -> None:
+			async with semaphore:
+				try:
+					await self.prewarm(latitude, longitude)
+				except Exception as e:
+					logger.error(f'Prewarming cache for {latitude}, {longitude} failed: {e}')
+
+		await asyncio.gather(*[prewarm_location(latitude, longitude) for latitude, longitude in locations])
+
+		self.hot_location_tracker.decay()
+
+	async def _run(self) -> None:
+		while True:
+			await asyncio.sleep(self.interval_seconds)
+			await self.prewarm_top_locations()
+
+
+# Leaves coordinates untouched (every distinct point gets its own cache entry).
+class ExactCoordinateGrid(CoordinateGrid):
+	def snap(self, latitude: float, longitude: float) -> tuple[float, float]:
+		return latitude, longitude
+
+
+# Rounds coordinates to a fixed number of decimal places (2 decimal places = ~1.1 km).
+class DecimalCoordinateGrid(CoordinateGrid):
+	decimals: int
+
+	def __init__(self, decimals: int) -> None:
+		self.decimals = decimals
+
+	def snap(self, latitude: float, longitude: float) -> tuple[float, float]:
+		return round(latitude, self.decimals), round(longitude, self.decimals)
+
+
+# Snaps coordinates to the nearest node of a regular grid with given resolution in degrees
+# (e.g. 0.1 for a weather model with ~11 km resolution).
+class ResolutionCoordinateGrid(CoordinateGrid):
+	resolution: float
+
+	def __init__(self, resolution: float) -> None:
+		self.resolution = resolution
 
+	def snap(self, latitude: float, longitude: float) -> tuple[float, float]:
+		return self._snap_value(latitude), self._snap_value(longitude)
 
+	def _snap_value(self, value: float) -> float:
+		# Final rounding removes floating point noise (e.g. 0.30000000000000004), which would break cache keys.
+		return round(round(value / self.resolution) * self.resolution, COORDINATE_GRID_DECIMAL_PART_LENGTH)
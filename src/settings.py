@@ -1,5 +1,6 @@
 import os
 import pathlib
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -27,6 +28,73 @@ class Settings(BaseSettings):
 	max_longitude: float
 	installation_power_kw: float
 	installation_efficiency: float
+	# Maximum number of locations in a single batch request.
+	batch_max_locations: int = 1000
+	# Maximum number of installations in a single fleet request.
+	fleet_max_installations: int = 10_000
+
+	# Connection pool of the shared Open-Meteo HTTP client. Keep-alive connections are reused between requests,
+	# so only the first request pays for the TCP/TLS handshake.
+	open_meteo_max_connections: int = 100
+	open_meteo_max_keepalive_connections: int = 20
+	open_meteo_keepalive_expiry: float = 30.0
+	open_meteo_http2: bool = True
+	# Timeouts of Open-Meteo requests: establishing a connection and waiting for (each chunk of) the response.
+	open_meteo_connect_timeout_seconds: float = 3.0
+	open_meteo_read_timeout_seconds: float = 10.0
+	# Failed requests (network errors, timeouts, 429 and 5xx responses) are retried with a jittered exponential
+	# backoff, up to "open_meteo_max_retries" times.
+	open_meteo_max_retries: int = 2
+	open_meteo_retry_base_delay_seconds: float = 0.2
+	open_meteo_retry_max_delay_seconds: float = 2.0
+	# After "open_meteo_circuit_failure_threshold" consecutive failed requests, requests fail fast (stale cache
+	# is used when available) for "open_meteo_circuit_reset_timeout_seconds", then a single trial request is sent.
+	open_meteo_circuit_failure_threshold: int = 5
+	open_meteo_circuit_reset_timeout_seconds: float = 30.0
+	# Limits of all Open-Meteo requests of the process: number of requests in flight and their rate
+	# (token bucket - on average "open_meteo_rate_limit_per_second", up to "open_meteo_rate_limit_burst" at once).
+	# Requests over the limits wait in a queue, for up to "open_meteo_rate_limit_max_wait_seconds".
+	open_meteo_max_in_flight_requests: int = 20
+	open_meteo_rate_limit_per_second: float = 10.0
+	open_meteo_rate_limit_burst: int = 20
+	open_meteo_rate_limit_max_wait_seconds: float = 5.0
+	# Number of coordinates sent in one multi-location Open-Meteo request.
+	open_meteo_max_locations_per_request: int = 100
+	# Opt-in micro-batching: cache misses of concurrent requests are held for up to "micro_batching_window_seconds"
+	# and fetched with one multi-location request (sent earlier when it reaches the locations limit above).
+	micro_batching_enabled: bool = False
+	micro_batching_window_seconds: float = 0.01
+
+	# Coordinates normalization before the cache lookup and the upstream request:
+	# "exact" (disabled), "decimal" (rounding to given decimal places) or "resolution" (model grid in degrees).
+	coordinate_grid: Literal['exact', 'decimal', 'resolution'] = 'decimal'
+	coordinate_grid_decimals: int = 2
+	coordinate_grid_resolution: float = 0.1
+
+	# Cache backend: "daily" (unbounded, cleared every day), "bounded" (LRU with TTL and memory budget),
+	# "redis" (shared by all workers and replicas) or "sqlite" (local file shared by all workers on the host).
+	cache_backend: Literal['daily', 'bounded', 'redis', 'sqlite'] = 'daily'
+	cache_max_entries: int = 10_000
+	cache_max_bytes: int = 64 * 1024 * 1024
+	# Hard TTL: entries are removed from cache (backends other than "daily", which is cleared every day).
+	cache_ttl_seconds: float = 3 * 3600
+	# Soft TTL: older entries are still returned, but refreshed in the background (stale-while-revalidate).
+	cache_soft_ttl_seconds: float = 3600
+	redis_url: str = 'redis://localhost:6379/0'
+	redis_max_connections: int = 50
+	sqlite_cache_path: str = 'cache.sqlite3'
+
+	# Background refresh of cache for the most requested locations, before their entries become stale.
+	prewarm_enabled: bool = True
+	prewarm_top_locations: int = 300
+	prewarm_interval_seconds: float = 300
+	prewarm_concurrency: int = 8
+
+	# Logs are written to stderr by a background thread. When more than "log_queue_size" records are waiting,
+	# new ones are dropped (and counted). Records below WARNING level can be sampled per logger name,
+	# e.g. LOG_SAMPLE_RATES='{"access": 0.1}' keeps 10% of access logs.
+	log_queue_size: int = 10_000
+	log_sample_rates: dict[str, float] = {}
 
 	model_config = SettingsConfigDict(
 		env_file=create_dotenv_file_path() if not bool(os.getenv("PRODUCTION", 0)) else None
@@ -1,27 +1,526 @@
+import asyncio
+import atexit
+import gzip
 import json
 import logging
+import logging.handlers
+import queue
+import random
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+from src.constants import BROTLI_QUALITY, CACHE_COMPRESSION_LEVEL
+from src.settings import settings
+
+# Brotli is optional - without it, responses are precompressed with gzip only.
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
+T = TypeVar('T')
+K = TypeVar('K', bound=Hashable)
+
+
+def compress_gzip(body: bytes) -> bytes:
+	# Fixed modification time makes the output (and so the ETag) the same in every process.
+	return gzip.compress(body, CACHE_COMPRESSION_LEVEL, mtime=0)
+
+
+# Content encodings used for precompressed responses, in the order of server preference.
+CONTENT_ENCODERS: dict[str, Callable[[bytes], bytes]] = {
+	**({'br': lambda body: brotli.compress(body, quality=BROTLI_QUALITY)} if brotli else {}),
+	'gzip': compress_gzip
+}
 
 
 # Logs are created in JSON format to easily integrate them with
 # some external tools used to collect and display logs (e.g. Graylog).
+# Structured fields given as "extra={'fields': {...}}" are added to the record.
 class JSONFormatter(logging.Formatter):
 	def format(self, record: logging.LogRecord) -> str:
 		log_record = {
 			"time": self.formatTime(record, self.datefmt),
 			"level": record.levelname,
 			"name": record.name,
-			"message": record.getMessage()
+			"message": record.getMessage(),
+			**getattr(record, 'fields', {})
 		}
 
+		if record.exc_info:
+			log_record['exception'] = self.formatException(record.exc_info)
+
 		return json.dumps(log_record)
 
 
+# Puts records on a bounded queue without blocking. When the queue is full (the writer can't keep up,
+# e.g. stderr is slow), records are dropped and counted instead of stalling the caller (the event loop).
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+	dropped_records: int
+
+	def __init__(self, queue_size: int) -> None:
+		super().__init__(queue.Queue(queue_size))
+		self.dropped_records = 0
+
+	# Only the message is rendered by the caller (arguments may change later), the rest is done by the writer.
+	def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+		record.msg = record.getMessage()
+		record.args = None
+
+		return record
+
+	# Called with the handler lock held, so the counter is updated by one thread at a time.
+	def enqueue(self, record: logging.LogRecord) -> None:
+		try:
+			self.queue.put_nowait(record)
+		except queue.Full:
+			self.dropped_records += 1
+
+
+# Formats and writes queued records in a background thread.
+class LogWriter(logging.handlers.QueueListener):
+	# Waits for free space in a full queue (records are still being written) instead of failing on stop.
+	def enqueue_sentinel(self) -> None:
+		self.queue.put(self._sentinel)
+
+
+# Passes only a "rate" part of records below WARNING level (warnings and errors are always logged).
+class SamplingFilter(logging.Filter):
+	rate: float
+	sampled_out_records: int
+
+	def __init__(self, rate: float) -> None:
+		super().__init__()
+		self.rate = rate
+		self.sampled_out_records = 0
+
+	def filter(self, record: logging.LogRecord) -> bool:
+		if self.rate >= 1 or record.levelno >= logging.WARNING or random.random() < self.rate:
+			return True
+
+		self.sampled_out_records += 1
+
+		return False
+
+
+# Non-blocking logging pipeline shared by all loggers: records go through BoundedQueueHandler to LogWriter,
+# which writes them to stderr. Loggers can be sampled (rates by logger name), so heavy traffic doesn't
+# flood the queue with e.g. access logs.
+class LogPipeline:
+	handler: BoundedQueueHandler
+	stream_handler: logging.Handler
+	sample_rates: dict[str, float]
+	sampling_filters: dict[str, SamplingFilter]
+	writer: LogWriter | None
+
+	def __init__(self, queue_size: int, sample_rates: dict[str, float]) -> None:
+		self.handler = BoundedQueueHandler(queue_size)
+		self.stream_handler = logging.StreamHandler()
+		self.stream_handler.setFormatter(JSONFormatter())
+		self.sample_rates = sample_rates
+		self.sampling_filters = {}
+		self.writer = None
+
+	def add_logger(self, logger: logging.Logger) -> None:
+		# Loggers are shared by name, so each of them is configured once.
+		if self.handler in logger.handlers:
+			return
+
+		sampling_filter = SamplingFilter(self.sample_rates.get(logger.name, 1.0))
+		self.sampling_filters[logger.name] = sampling_filter
+		logger.addFilter(sampling_filter)
+		logger.addHandler(self.handler)
+		self.start()
+
+	def start(self) -> None:
+		if self.writer is None:
+			self.writer = LogWriter(self.handler.queue, self.stream_handler)
+			self.writer.start()
+
+	# Writes all queued records and stops the writer.
+	def stop(self) -> None:
+		if self.writer is not None:
+			self.writer.stop()
+			self.writer = None
+
+	def get_stats(self) -> dict[str, int]:
+		return {
+			'dropped_records': self.handler.dropped_records,
+			'sampled_out_records': sum(f.sampled_out_records for f in self.sampling_filters.values())
+		}
+
+
+log_pipeline = LogPipeline(settings.log_queue_size, settings.log_sample_rates)
+# Queued records are written before the process exits.
+atexit.register(log_pipeline.stop)
+
+
 def create_logger(name: str) -> logging.Logger:
 	logger = logging.getLogger(name)
 	logger.setLevel(logging.INFO)
-
-	handler = logging.StreamHandler()
-	handler.setFormatter(JSONFormatter())
-	logger.addHandler(handler)
+	log_pipeline.add_logger(logger)
 
 	return logger
+
+
+# Fields of the access log record of the current request (e.g. cache status), set by code handling the request.
+# Middleware puts a new dict for every request - it is shared with the endpoint task, which gets a copy of the context.
+access_log_fields: ContextVar[dict[str, str | int | float] | None] = ContextVar('access_log_fields', default=None)
+
+
+def set_access_log_field(name: str, value: str | int | float) -> None:
+	fields = access_log_fields.get()
+
+	if fields is not None:
+		fields[name] = value
+
+
+# Coalesces concurrent calls for the same key into a single execution ("single-flight").
+# The first caller starts the call; every caller arriving before it finishes awaits the same task,
+# so all of them get the same result or the same exception.
+class SingleFlight:
+	tasks: dict[str, asyncio.Task]
+
+	def __init__(self) -> None:
+		self.tasks = {}
+
+	async def run(self, key: str, function: Callable[[], Awaitable[T]]) -> T:
+		task = self.tasks.get(key)
+
+		if task is None:
+			task = asyncio.ensure_future(function())
+			self.tasks[key] = task
+			task.add_done_callback(lambda done_task: self._forget(key, done_task))
+
+		# Shield protects the shared call from being cancelled together with a single (e.g. disconnected) caller.
+		return await asyncio.shield(task)
+
+	def _forget(self, key: str, task: asyncio.Task) -> None:
+		if self.tasks.get(key) is task:
+			del self.tasks[key]
+
+		# Mark the exception as retrieved, even when all callers were cancelled before receiving it.
+		if not task.cancelled():
+			task.exception()
+
+
+# Merges keys submitted concurrently (within "window_seconds" from the first one) into a single batch call.
+# "function" gets a list of distinct keys and returns a result or an exception for each of them (in the same order).
+# A batch is sent earlier when it reaches "max_batch_size" keys. Callers submitting the same key share one result.
+class MicroBatcher(Generic[K, T]):
+	function: Callable[[list[K]], Awaitable[list[T | Exception]]]
+	window_seconds: float
+	max_batch_size: int
+	pending: dict[K, asyncio.Future]
+	flush_handle: asyncio.TimerHandle | None
+	tasks: set[asyncio.Task]
+
+	def __init__(
+			self,
+			function: Callable[[list[K]], Awaitable[list[T | Exception]]],
+			window_seconds: float,
+			max_batch_size: int
+	) -> None:
+		self.function = function
+		self.window_seconds = window_seconds
+		self.max_batch_size = max_batch_size
+		self.pending = {}
+		self.flush_handle = None
+		self.tasks = set()
+
+	async def submit(self, key: K) -> T:
+		future = self.pending.get(key)
+
+		if future is None:
+			loop = asyncio.get_running_loop()
+			future = loop.create_future()
+			self.pending[key] = future
+
+			if len(self.pending) >= self.max_batch_size:
+				self.flush()
+			elif self.flush_handle is None:
+				self.flush_handle = loop.call_later(self.window_seconds, self.flush)
+
+		# Shield keeps the future (shared with other callers) alive when a single caller is cancelled.
+		return await asyncio.shield(future)
+
+	# Sends pending keys and waits for all running batches (used on shutdown, before closing their resources).
+	async def close(self) -> None:
+		self.flush()
+		await asyncio.gather(*self.tasks, return_exceptions=True)
+
+	# Sends all pending keys as one batch.
+	def flush(self) -> None:
+		if self.flush_handle is not None:
+			self.flush_handle.cancel()
+			self.flush_handle = None
+
+		if not self.pending:
+			return
+
+		batch, self.pending = self.pending, {}
+		task = asyncio.ensure_future(self._run(batch))
+		self.tasks.add(task)
+		task.add_done_callback(self.tasks.discard)
+
+	async def _run(self, batch: dict[K, asyncio.Future]) -> None:
+		try:
+			try:
+				results = await self.function(list(batch))
+			except Exception as e:
+				results = [e] * len(batch)
+
+			for future, result in zip(batch.values(), results):
+				if isinstance(result, Exception):
+					future.set_exception(result)
+					# Mark the exception as retrieved, even when all callers were cancelled before receiving it.
+					future.exception()
+				else:
+					future.set_result(result)
+		finally:
+			# Batch call was cancelled (or returned too few results) - callers mustn't wait forever.
+			for future in batch.values():
+				if not future.done():
+					future.set_exception(RuntimeError('Micro-batch call returned no result.'))
+					future.exception()
+
+
+# Delays between attempts of a failed idempotent call: exponential backoff with "full jitter" (a random delay
+# between 0 and the backoff), so clients failing at the same time don't retry at the same time again.
+class RetryPolicy:
+	max_retries: int
+	base_delay_seconds: float
+	max_delay_seconds: float
+
+	def __init__(self, max_retries: int, base_delay_seconds: float, max_delay_seconds: float) -> None:
+		self.max_retries = max_retries
+		self.base_delay_seconds = base_delay_seconds
+		self.max_delay_seconds = max_delay_seconds
+
+	# Delay before the retry following given (0-based) attempt.
+	def get_delay(self, attempt: int) -> float:
+		return random.uniform(0, min(self.max_delay_seconds, self.base_delay_seconds * 2 ** attempt))
+
+
+class CircuitBreakerOpenError(Exception):
+	pass
+
+
+CIRCUIT_BREAKER_STATES = ('closed', 'open', 'half_open')
+
+
+logger = create_logger('CircuitBreaker')
+
+
+# Stops calling an unhealthy dependency. After "failure_threshold" consecutive failed calls the circuit opens
+# and calls fail fast with CircuitBreakerOpenError (callers can fall back, e.g. to stale cache).
+# After "reset_timeout_seconds" the circuit is half-open: a single trial call is let through,
+# which closes the circuit on success or opens it again on failure. Cancelled calls are neither,
+# as well as calls failed with "ignored_errors" (e.g. rejected by a local rate limiter, not by the dependency).
+class CircuitBreaker:
+	name: str
+	failure_threshold: int
+	reset_timeout_seconds: float
+	ignored_errors: tuple[type[Exception], ...]
+	state: str
+	failures: int
+	opened_at: float
+	trial_in_flight: bool
+	# Number of transitions to each state.
+	transitions: dict[str, int]
+
+	def __init__(
+			self,
+			name: str,
+			failure_threshold: int,
+			reset_timeout_seconds: float,
+			ignored_errors: tuple[type[Exception], ...] = ()
+	) -> None:
+		self.name = name
+		self.failure_threshold = failure_threshold
+		self.reset_timeout_seconds = reset_timeout_seconds
+		self.ignored_errors = ignored_errors
+		self.state = 'closed'
+		self.failures = 0
+		self.opened_at = 0
+		self.trial_in_flight = False
+		self.transitions = dict.fromkeys(CIRCUIT_BREAKER_STATES, 0)
+
+	def get_state(self) -> str:
+		if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout_seconds:
+			self._transition('half_open')
+
+		return self.state
+
+	def get_stats(self) -> dict[str, int]:
+		return dict(self.transitions)
+
+	async def call(self, function: Callable[[], Awaitable[T]]) -> T:
+		state = self.get_state()
+
+		if state == 'open' or (state == 'half_open' and self.trial_in_flight):
+			raise CircuitBreakerOpenError(f'Circuit breaker {self.name} is open.')
+
+		trial = state == 'half_open'
+		self.trial_in_flight = self.trial_in_flight or trial
+
+		try:
+			result = await function()
+		except self.ignored_errors:
+			raise
+		except Exception:
+			self._record_failure()
+			raise
+		finally:
+			if trial:
+				self.trial_in_flight = False
+
+		self._record_success()
+
+		return result
+
+	def _record_success(self) -> None:
+		self.failures = 0
+
+		if self.state != 'closed':
+			self._transition('closed')
+
+	def _record_failure(self) -> None:
+		self.failures += 1
+
+		if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+			self.opened_at = time.monotonic()
+			self._transition('open')
+
+	def _transition(self, state: str) -> None:
+		logger.warning(f'Circuit breaker {self.name}: {self.state} -> {state}')
+		self.state = state
+		self.transitions[state] += 1
+
+
+class RateLimiterTimeoutError(Exception):
+	pass
+
+
+# Limits calls to a shared dependency: at most "max_in_flight" at once and "rate_per_second" on average
+# (token bucket allowing bursts of "burst" calls). Callers over the limits wait in a queue (FIFO) for up to
+# "max_wait_seconds" and then fail with RateLimiterTimeoutError - right away, when the wait for a token
+# would be longer than that.
+class RateLimiter:
+	name: str
+	max_in_flight: int
+	rate_per_second: float
+	burst: int
+	max_wait_seconds: float
+	semaphore: asyncio.Semaphore
+	token_lock: asyncio.Lock
+	tokens: float
+	updated_at: float
+	in_flight: int
+	waiting: int
+	rejected: int
+
+	def __init__(
+			self, name: str, max_in_flight: int, rate_per_second: float, burst: int, max_wait_seconds: float
+	) -> None:
+		self.name = name
+		self.max_in_flight = max_in_flight
+		self.rate_per_second = rate_per_second
+		self.burst = burst
+		self.max_wait_seconds = max_wait_seconds
+		self.semaphore = asyncio.Semaphore(max_in_flight)
+		self.token_lock = asyncio.Lock()
+		self.tokens = burst
+		self.updated_at = time.monotonic()
+		self.in_flight = 0
+		self.waiting = 0
+		self.rejected = 0
+
+	def get_stats(self) -> dict[str, int]:
+		return {'in_flight': self.in_flight, 'waiting': self.waiting, 'rejected': self.rejected}
+
+	# Waits for a free slot and a token, the slot has to be released after the call.
+	async def acquire(self) -> None:
+		deadline = time.monotonic() + self.max_wait_seconds
+		self.waiting += 1
+
+		try:
+			async with asyncio.timeout(self.max_wait_seconds):
+				await self.semaphore.acquire()
+
+			try:
+				await self._take_token(deadline)
+			except BaseException:
+				self.semaphore.release()
+				raise
+		except TimeoutError:
+			self.rejected += 1
+			raise RateLimiterTimeoutError(f'Waited for rate limiter {self.name} for over {self.max_wait_seconds}s.')
+		finally:
+			self.waiting -= 1
+
+		self.in_flight += 1
+
+	def release(self) -> None:
+		self.in_flight -= 1
+		self.semaphore.release()
+
+	# Callers take tokens one by one (the lock is FIFO), each waiting until the bucket refills.
+	async def _take_token(self, deadline: float) -> None:
+		async with asyncio.timeout(max(deadline - time.monotonic(), 0)):
+			await self.token_lock.acquire()
+
+		try:
+			self._refill()
+
+			if self.tokens < 1:
+				delay = (1 - self.tokens) / self.rate_per_second
+
+				if time.monotonic() + delay > deadline:
+					raise TimeoutError()
+
+				await asyncio.sleep(delay)
+				self._refill()
+
+			self.tokens -= 1
+		finally:
+			self.token_lock.release()
+
+	def _refill(self) -> None:
+		now = time.monotonic()
+		self.tokens = min(self.tokens + (now - self.updated_at) * self.rate_per_second, self.burst)
+		self.updated_at = now
+
+
+# Probabilistic frequency counter with fixed memory (count-min sketch). Estimated counts can only be
+# overestimated (by hash collisions), never underestimated. Each of "depth" rows uses a different hash function.
+class CountMinSketch:
+	width: int
+	depth: int
+	rows: list[list[int]]
+
+	def __init__(self, width: int, depth: int) -> None:
+		self.width = width
+		self.depth = depth
+		self.rows = [[0] * width for _ in range(depth)]
+
+	# Increments counters of given key and returns its estimated count.
+	def add(self, key: Hashable) -> int:
+		count = None
+
+		for row_index, row in enumerate(self.rows):
+			column = hash((row_index, key)) % self.width
+			row[column] += 1
+			count = row[column] if count is None else min(count, row[column])
+
+		return count
+
+	def estimate(self, key: Hashable) -> int:
+		return min(row[hash((row_index, key)) % self.width] for row_index, row in enumerate(self.rows))
+
+	# Halves all counters, so older occurrences weigh less than recent ones.
+	def decay(self) -> None:
+		for row in self.rows:
+			for column in range(self.width):
+				row[column] >>= 1
@@ -0,0 +1,84 @@
+# Runs all benchmarks and prints results as JSON lines. With a baseline (output of a previous run),
+# each result gets the relative change of time per call and benchmarks slower than the threshold
+# are marked as regressions - the exit code is then 1.
+#
+# Run with: python -m tests.benchmarks [--repeat N] [--only MODULE ...] [--baseline FILE] [--threshold 0.1]
+import argparse
+import asyncio
+import json
+import sys
+from collections.abc import Callable, Iterable, Iterator
+
+from tests.benchmarks import bench_cache, bench_parsing, bench_responses, bench_serialization, bench_transforms
+from tests.benchmarks.common import Result, print_results
+
+MODULES: dict[str, Callable[[argparse.Namespace], Iterable[Result]]] = {
+	'transforms': lambda args: bench_transforms.run(args.repeat),
+	'parsing': lambda args: bench_parsing.run(args.repeat),
+	'serialization': lambda args: bench_serialization.run(args.repeat),
+	'cache': lambda args: bench_cache.run(args.repeat),
+	'responses': lambda args: asyncio.run(bench_responses.run(args.requests, args.repeat))
+}
+
+
+def run_all(args: argparse.Namespace) -> Iterator[Result]:
+	for module in args.only or MODULES:
+		yield from MODULES[module](args)
+
+
+def load_baseline(path: str) -> dict[str, float]:
+	with open(path) as file:
+		results = [json.loads(line) for line in file if line.strip()]
+
+	return {result['benchmark']: result['microseconds_per_call'] for result in results}
+
+
+def compare(results: Iterator[Result], baseline: dict[str, float], threshold: float) -> Iterator[Result]:
+	for result in results:
+		baseline_time = baseline.get(result['benchmark'])
+
+		if baseline_time:
+			change = result['microseconds_per_call'] / baseline_time - 1
+			result = {
+				**result,
+				'baseline_microseconds_per_call': baseline_time,
+				'change': round(change, 3),
+				'regression': change > threshold
+			}
+
+		yield result
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(prog='python -m tests.benchmarks')
+	parser.add_argument('--repeat', type=int, default=5, help='runs per benchmark, the best one is reported')
+	parser.add_argument('--requests', type=int, default=5000, help='requests per variant of response benchmarks')
+	parser.add_argument('--only', nargs='+', choices=MODULES, help='run only these benchmark modules')
+	parser.add_argument('--baseline', help='JSON lines of a previous run to compare with')
+	parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown reported as regression')
+	args = parser.parse_args()
+
+	results = run_all(args)
+
+	if args.baseline:
+		results = compare(results, load_baseline(args.baseline), args.threshold)
+
+	regressions = []
+
+	def collect(results: Iterator[Result]) -> Iterator[Result]:
+		for result in results:
+			if result.get('regression'):
+				regressions.append(result['benchmark'])
+
+			yield result
+
+	print_results(collect(results))
+
+	if regressions:
+		print(f'Regressions: {", ".join(regressions)}', file=sys.stderr)
+
+	return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,68 @@
+# Lookups and inserts of DailyCacheService filled with 10k - 1M entries (canned forecast as the value).
+# Response bodies are rendered and compressed when first sent, so inserts only store the value.
+#
+# Run with: python -m tests.benchmarks.bench_cache [repeat]
+import itertools
+import sys
+from collections.abc import Coroutine, Iterator
+from datetime import datetime
+from typing import TypeVar
+
+from src.models import CacheEntry
+from src.open_meteo.models import OpenMeteoWeatherWeekSummary
+from src.open_meteo.services import OpenMeteoForecastService
+from src.services import DailyCacheService
+from tests.benchmarks.common import Result, measure, print_results
+from tests.open_meteo.conftest import OPEN_METEO_WEEK_SUMMARY_RESPONSE
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+T = TypeVar('T')
+
+
+# DailyCacheService never awaits anything, so its coroutines are run without an event loop (which would
+# cost more than the measured call).
+def run_coroutine(coroutine: Coroutine[None, None, T]) -> T:
+	try:
+		coroutine.send(None)
+	except StopIteration as stop:
+		return stop.value
+
+	raise RuntimeError('Coroutine is waiting for an event loop.')
+
+
+def run(repeat: int) -> Iterator[Result]:
+	forecast = OpenMeteoForecastService(
+		installation_power_kw=2.5,
+		installation_efficiency=0.2,
+		cache_service=None,
+		cache_soft_ttl_seconds=3600,
+		weather_data_service=None,
+		coordinate_grid=None,
+		hot_location_tracker=None
+	)._build_location_forecast(OpenMeteoWeatherWeekSummary(**OPEN_METEO_WEEK_SUMMARY_RESPONSE))
+	entry = CacheEntry(value=forecast, created_at=0)
+
+	for size in SIZES:
+		cache_service = DailyCacheService()
+		# Instance attribute, so the class-level cache (shared by the application) is not filled.
+		cache_service.cache = {str(datetime.now().date()): {f'forecast_{i}': entry for i in range(size)}}
+		keys = itertools.cycle([f'forecast_{i}' for i in range(0, size, max(size // 10_000, 1))])
+		new_keys = (f'new_forecast_{i}' for i in itertools.count())
+
+		yield measure(
+			f'cache.daily_get_{size}',
+			lambda: run_coroutine(cache_service.get_cache_entry(next(keys))),
+			repeat,
+			number=10_000
+		)
+		yield measure(
+			f'cache.daily_add_{size}',
+			lambda: run_coroutine(cache_service.add_cache(next(new_keys), forecast)),
+			repeat,
+			number=100
+		)
+
+
+if __name__ == '__main__':
+	print_results(run(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
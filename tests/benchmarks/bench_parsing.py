@@ -0,0 +1,61 @@
+# Parsing of Open-Meteo responses with 16 days of daily and hourly data: decoding to Python objects
+# and validating them ("dict", previous behaviour - "Model(**response.json())") vs. validating JSON bytes
+# straight into models ("json"), for a single location and a multi-location response.
+#
+# Run with: python -m tests.benchmarks.bench_parsing [repeat]
+import json
+import sys
+from collections.abc import Iterator
+from datetime import date, timedelta
+
+from src.open_meteo.models import OPEN_METEO_WEEK_SUMMARIES_ADAPTER, OpenMeteoWeatherWeekSummary
+from tests.benchmarks.common import Result, measure, print_results
+from tests.open_meteo.conftest import OPEN_METEO_WEEK_SUMMARY_RESPONSE
+
+DAYS = 16
+LOCATIONS = 100
+
+
+def create_response(days: int) -> dict:
+	response = json.loads(json.dumps(OPEN_METEO_WEEK_SUMMARY_RESPONSE))
+	first_day = date(2024, 12, 9)
+	dates = [(first_day + timedelta(days=i)).isoformat() for i in range(days)]
+	daily = response['daily']
+
+	response['hourly'] = {
+		'time': [f'{day}T{hour:02}:00' for day in dates for hour in range(24)],
+		'pressure_msl': [1000 + (i % 400) / 10 for i in range(days * 24)],
+		'shortwave_radiation': [max(0, 400 - abs(i % 24 - 12) * 60) + (i % 7) / 10 for i in range(days * 24)],
+		'temperature_2m': [(i % 150) / 10 - 5 for i in range(days * 24)]
+	}
+	response['daily'] = {
+		'time': dates,
+		**{key: [values[i % len(values)] for i in range(days)] for key, values in daily.items() if key != 'time'}
+	}
+
+	return response
+
+
+def run(repeat: int) -> Iterator[Result]:
+	response = create_response(DAYS)
+	content = json.dumps(response).encode()
+	many_content = json.dumps([response] * LOCATIONS).encode()
+
+	yield measure('parsing.single_dict', lambda: OpenMeteoWeatherWeekSummary(**json.loads(content)), repeat)
+	yield measure('parsing.single_json', lambda: OpenMeteoWeatherWeekSummary.model_validate_json(content), repeat)
+	yield measure(
+		f'parsing.many_{LOCATIONS}_dict',
+		lambda: [OpenMeteoWeatherWeekSummary(**payload) for payload in json.loads(many_content)],
+		repeat,
+		number=10
+	)
+	yield measure(
+		f'parsing.many_{LOCATIONS}_json',
+		lambda: OPEN_METEO_WEEK_SUMMARIES_ADAPTER.validate_json(many_content),
+		repeat,
+		number=10
+	)
+
+
+if __name__ == '__main__':
+	print_results(run(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
@@ -0,0 +1,118 @@
+# Requests per second of the cached week forecast endpoint on a single core (one process, one event loop),
+# with the response rendered from the model on every request ("model", previous behaviour), with
+# the JSON body pre-rendered once per cache entry ("body") and for a requested (not configured) installation,
+# created from the cached weather on every request ("body_custom_installation"). Endpoints use the application
+# dependencies (and cache service), so the whole request path is measured. Requests are sent through
+# the ASGI transport, so no network is involved. Responses are requested without compression, so all variants
+# send bodies of the same size.
+#
+# Run with: python -m tests.benchmarks.bench_responses [requests]
+import asyncio
+import sys
+import time
+from typing import Annotated
+
+import httpx
+from fastapi import Depends, FastAPI, Query
+
+from src.dependencies import create_cache_service, get_coordinate_grid, get_forecast_service
+from src.main import get_forecast
+from src.models import WeatherForecast, WeatherForecastService
+from src.open_meteo.models import OpenMeteoWeatherWeekSummary
+from src.settings import settings
+from tests.benchmarks.common import Result, create_result, print_results
+from tests.open_meteo.conftest import OPEN_METEO_WEEK_SUMMARY_RESPONSE
+
+LATITUDE = 52.52
+LONGITUDE = 13.419998
+
+
+# Weather data of the requested location is cached, so no upstream request is sent.
+async def add_weather_data() -> None:
+	latitude, longitude = (await get_coordinate_grid()).snap(LATITUDE, LONGITUDE)
+	weather_data = OpenMeteoWeatherWeekSummary(**OPEN_METEO_WEEK_SUMMARY_RESPONSE)
+	await create_cache_service().add_cache(f'weather_data_{latitude}_{longitude}', weather_data)
+
+
+def create_app() -> FastAPI:
+	app = FastAPI()
+	app.state.http_client = httpx.AsyncClient()
+	app.state.micro_batcher = None
+
+	return app
+
+
+def create_model_app() -> FastAPI:
+	app = create_app()
+
+	# Same query parameters as the endpoint, so only the response rendering differs.
+	@app.get('/api/v1/week_forecast')
+	async def get_forecast_model(
+			latitude: Annotated[float, Query(ge=settings.min_latitude, le=settings.max_latitude)],
+			longitude: Annotated[float, Query(ge=settings.min_longitude, le=settings.max_longitude)],
+			installation_power_kw: Annotated[float | None, Query(gt=0)] = None,
+			installation_efficiency: Annotated[float | None, Query(gt=0, le=1)] = None,
+			forecast_service: WeatherForecastService = Depends(get_forecast_service)
+	) -> WeatherForecast:
+		return await forecast_service.get_weather_forecast(
+			latitude, longitude, installation_power_kw, installation_efficiency
+		)
+
+	return app
+
+
+def create_body_app() -> FastAPI:
+	app = create_app()
+	app.get('/api/v1/week_forecast', response_model=WeatherForecast)(get_forecast)
+
+	return app
+
+
+async def measure(app: FastAPI, requests: int, installation: dict | None = None) -> float:
+	params = {'latitude': LATITUDE, 'longitude': LONGITUDE, **(installation or {})}
+	headers = {'Accept-Encoding': 'identity'}
+
+	async with httpx.AsyncClient(
+			transport=httpx.ASGITransport(app), base_url='http://test', headers=headers
+	) as client:
+		# Warm up (the first request creates the cache entry).
+		for _ in range(100):
+			(await client.get('/api/v1/week_forecast', params=params)).raise_for_status()
+
+		start = time.perf_counter()
+
+		for _ in range(requests):
+			await client.get('/api/v1/week_forecast', params=params)
+
+		return requests / (time.perf_counter() - start)
+
+
+async def run(requests: int, repeat: int) -> list[Result]:
+	await add_weather_data()
+	variants = {
+		'model': (create_model_app(), None),
+		'body': (create_body_app(), None),
+		'body_custom_installation': (
+			create_body_app(), {'installation_power_kw': 10, 'installation_efficiency': 0.25}
+		)
+	}
+	results = dict.fromkeys(variants, 0.0)
+
+	# Runs of variants are interleaved (the best one is reported), so a slower period doesn't affect only one of them.
+	for _ in range(repeat):
+		for variant, (app, installation) in variants.items():
+			results[variant] = max(results[variant], await measure(app, requests, installation))
+
+	return [
+		create_result(
+			f'responses.week_forecast_cache_hit_{variant}',
+			1 / requests_per_second,
+			requests=requests,
+			speedup=round(requests_per_second / results['model'], 2)
+		)
+		for variant, requests_per_second in results.items()
+	]
+
+
+if __name__ == '__main__':
+	print_results(asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000, repeat=5)))
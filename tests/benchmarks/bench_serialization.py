@@ -0,0 +1,52 @@
+# Serialization of the canned forecast: rendering JSON from the model (per request before pre-rendered bodies),
+# reading the pre-rendered body of a cache entry, compressing response variants (once per cached entry, when first
+# sent) and writing / reading cached forecasts by out-of-process cache backends.
+#
+# Run with: python -m tests.benchmarks.bench_serialization [repeat]
+import hashlib
+import sys
+from collections.abc import Iterator
+
+from src.constants import ETAG_DIGEST_SIZE
+from src.models import CacheEntry, WeatherForecast
+from src.open_meteo.models import OpenMeteoWeatherWeekSummary
+from src.open_meteo.services import OpenMeteoForecastService
+from src.services import CacheSerializer
+from src.utils import CONTENT_ENCODERS
+from tests.benchmarks.common import Result, measure, print_results
+from tests.open_meteo.conftest import OPEN_METEO_WEEK_SUMMARY_RESPONSE
+
+
+def run(repeat: int) -> Iterator[Result]:
+	location_forecast = OpenMeteoForecastService(
+		installation_power_kw=2.5,
+		installation_efficiency=0.2,
+		cache_service=None,
+		cache_soft_ttl_seconds=3600,
+		weather_data_service=None,
+		coordinate_grid=None,
+		hot_location_tracker=None
+	)._build_location_forecast(OpenMeteoWeatherWeekSummary(**OPEN_METEO_WEEK_SUMMARY_RESPONSE))
+	forecast = OpenMeteoForecastService._build_weather_forecast(location_forecast, 2.5, 0.2)
+	entry = CacheEntry(value=forecast, created_at=0)
+	body = entry.get_body()
+	serializer = CacheSerializer([WeatherForecast])
+	payload = serializer.serialize(CacheEntry(value=forecast, created_at=0))
+
+	yield measure('serialization.model_dump_json', lambda: forecast.model_dump_json(), repeat)
+	yield measure('serialization.cached_body', lambda: entry.get_body(), repeat, number=100_000)
+	yield measure(
+		'serialization.etag', lambda: hashlib.blake2b(body, digest_size=ETAG_DIGEST_SIZE).hexdigest(), repeat
+	)
+
+	for encoding, encode in CONTENT_ENCODERS.items():
+		yield measure(f'serialization.encode_{encoding}', lambda encode=encode: encode(body), repeat, number=100)
+
+	yield measure(
+		'serialization.cache_serialize', lambda: serializer.serialize(CacheEntry(value=forecast, created_at=0)), repeat
+	)
+	yield measure('serialization.cache_deserialize', lambda: serializer.deserialize(payload), repeat)
+
+
+if __name__ == '__main__':
+	print_results(run(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
@@ -0,0 +1,116 @@
+# Microbenchmarks of the per-location transforms on the canned Open-Meteo payload: mapping of daily data
+# to forecast days ("_get_days"), week summary of one location ("_build_week_summary"), daily PV yields from
+# hourly data of one location ("_get_daily_yields") and of all locations at once, forecast of an installation
+# created from the cached location forecast when read ("_build_weather_forecast"), of building location forecasts
+# and installation forecasts for many locations per location vs. with columnar (NumPy) transforms, summaries
+# for many locations, and energy of growing fleets of installations sharing the same cells.
+#
+# Run with: python -m tests.benchmarks.bench_transforms [repeat]
+import random
+import sys
+from collections.abc import Iterator
+
+from src.open_meteo.columnar import (
+	OpenMeteoColumns,
+	build_installations_energy,
+	build_location_forecasts,
+	build_weather_forecasts,
+	build_week_summaries,
+)
+from src.open_meteo.energy import calculate_daily_yields
+from src.open_meteo.models import OpenMeteoWeatherWeekSummary
+from src.open_meteo.services import OpenMeteoForecastService, OpenMeteoWeekSummaryService
+from tests.benchmarks.common import Result, measure, print_results
+from tests.open_meteo.conftest import OPEN_METEO_WEEK_SUMMARY_RESPONSE, create_weather_data
+
+LOCATIONS = 1000
+FLEET_CELLS = 100
+FLEET_SIZES = (100, 1000, 10_000)
+
+
+def run(repeat: int) -> Iterator[Result]:
+	weather_data = OpenMeteoWeatherWeekSummary(**OPEN_METEO_WEEK_SUMMARY_RESPONSE)
+	forecast_service = OpenMeteoForecastService(
+		installation_power_kw=2.5,
+		installation_efficiency=0.2,
+		cache_service=None,
+		cache_soft_ttl_seconds=3600,
+		weather_data_service=None,
+		coordinate_grid=None,
+		hot_location_tracker=None
+	)
+
+	yield measure(
+		'transforms._get_days', lambda: forecast_service._get_days(weather_data.daily, weather_data.hourly), repeat
+	)
+	yield measure(
+		'transforms._build_week_summary', lambda: OpenMeteoWeekSummaryService._build_week_summary(weather_data), repeat
+	)
+	yield measure(
+		'transforms._get_daily_yields',
+		lambda: OpenMeteoForecastService._get_daily_yields(weather_data.hourly, len(weather_data.daily.time)),
+		repeat
+	)
+
+	items = create_weather_data(seed=1, locations=LOCATIONS)
+	columns = OpenMeteoColumns.create(items)
+	yield measure(
+		f'transforms.daily_yields_columnar_{LOCATIONS}',
+		lambda: calculate_daily_yields(columns.shortwave_radiation, columns.temperature_2m, len(columns.time)),
+		repeat,
+		number=100
+	)
+	yield measure(
+		f'transforms.location_forecasts_per_location_{LOCATIONS}',
+		lambda: [forecast_service._build_location_forecast(item) for item in items],
+		repeat,
+		number=1
+	)
+	yield measure(
+		f'transforms.location_forecasts_columnar_{LOCATIONS}',
+		lambda: build_location_forecasts(items),
+		repeat,
+		number=1
+	)
+
+	location_forecasts = build_location_forecasts(items)
+	yield measure(
+		'transforms._build_weather_forecast',
+		lambda: OpenMeteoForecastService._build_weather_forecast(location_forecasts[0], 10, 0.25),
+		repeat
+	)
+	yield measure(
+		f'transforms.forecasts_per_location_{LOCATIONS}',
+		lambda: [
+			OpenMeteoForecastService._build_weather_forecast(forecast, 2.5, 0.2) for forecast in location_forecasts
+		],
+		repeat,
+		number=1
+	)
+	yield measure(
+		f'transforms.forecasts_columnar_{LOCATIONS}',
+		lambda: build_weather_forecasts(location_forecasts, installation_power_kw=2.5, installation_efficiency=0.2),
+		repeat,
+		number=1
+	)
+	yield measure(f'transforms.summaries_columnar_{LOCATIONS}', lambda: build_week_summaries(items), repeat, number=1)
+
+	generator = random.Random(1)
+	cells = location_forecasts[:FLEET_CELLS]
+
+	for size in FLEET_SIZES:
+		cell_indexes = [generator.randrange(FLEET_CELLS) for _ in range(size)]
+		power = [round(generator.uniform(0.5, 50), 2) for _ in range(size)]
+		efficiency = [round(generator.uniform(0.1, 0.3), 2) for _ in range(size)]
+		yield measure(
+			f'transforms.fleet_energy_{size}',
+			lambda cell_indexes=cell_indexes, power=power, efficiency=efficiency: build_installations_energy(
+				cells, cell_indexes, power, efficiency
+			),
+			repeat,
+			number=1
+		)
+
+
+if __name__ == '__main__':
+	print_results(run(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
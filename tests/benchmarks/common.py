@@ -0,0 +1,31 @@
+# Helpers shared by benchmarks. Every result is a JSON line with the benchmark name and the best time
+# per call (of "repeat" runs), so results of two runs can be compared line by line (see __main__.py).
+import json
+import logging
+import timeit
+from collections.abc import Callable, Iterable
+
+# Benchmarks measure the code, not the log writer (cache services log every lookup).
+logging.disable(logging.INFO)
+
+Result = dict[str, str | int | float]
+
+
+def measure(name: str, function: Callable[[], object], repeat: int, number: int = 1000) -> Result:
+	best = min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+	return create_result(name, best)
+
+
+def create_result(name: str, seconds_per_call: float, **fields: str | int | float) -> Result:
+	return {
+		'benchmark': name,
+		'microseconds_per_call': round(seconds_per_call * 1_000_000, 3),
+		'calls_per_second': round(1 / seconds_per_call, 1),
+		**fields
+	}
+
+
+def print_results(results: Iterable[Result]) -> None:
+	for result in results:
+		print(json.dumps(result), flush=True)
@@ -1,10 +1,22 @@
-from unittest.mock import MagicMock
+import time
+from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 from fastapi.testclient import TestClient
 
 from src.main import app
-from src.models import WeatherForecast, WeatherWeekSummary
+from src.models import (
+    CacheEntry,
+    InstallationEnergy,
+    WeatherForecast,
+    WeatherForecastNotAvailableError,
+    WeatherWeekSummary,
+)
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return 'asyncio'
 
 
 @pytest.fixture
@@ -15,7 +27,7 @@ def client() -> TestClient:
 @pytest.fixture
 def mock_forecast_service() -> MagicMock:
     service = MagicMock()
-    service.get_weather_forecast.return_value = WeatherForecast(
+    forecast = WeatherForecast(
         latitude=52.52,
         longitude=13.419998,
         time_unit="iso8601",
@@ -29,13 +41,22 @@ def mock_forecast_service() -> MagicMock:
         installation_efficiency=0.85,
         days=[]
     )
+    service.get_weather_forecast_entry = AsyncMock()
+    service.get_weather_forecast_entry.return_value = CacheEntry(value=forecast, created_at=time.time())
+    service.get_weather_forecasts = AsyncMock()
+    service.get_weather_forecasts.return_value = [forecast, WeatherForecastNotAvailableError('Invalid response')]
+    service.get_installations_energy = AsyncMock()
+    service.get_installations_energy.return_value = [
+        InstallationEnergy(time=['2024-12-09', '2024-12-10'], generated_energy=[1.25, 0.5]),
+        WeatherForecastNotAvailableError('Invalid response')
+    ]
     return service
 
 
 @pytest.fixture
 def mock_week_summary_service() -> MagicMock:
     service = MagicMock()
-    service.get_week_summary.return_value = WeatherWeekSummary(
+    week_summary = WeatherWeekSummary(
         latitude=52.52,
         longitude=13.419998,
         hourly_time_unit="iso8601",
@@ -51,4 +72,6 @@ def mock_week_summary_service() -> MagicMock:
         temp_min_week=-2.4,
         weather_types=[]
     )
+    service.get_week_summary_entry = AsyncMock()
+    service.get_week_summary_entry.return_value = CacheEntry(value=week_summary, created_at=time.time())
     return service
@@ -0,0 +1,160 @@
+import random
+from collections import Counter
+from statistics import mean
+
+import pytest
+
+from src.models import LocationWeatherForecast, WeatherWeekSummary
+from src.open_meteo.columnar import (
+	OpenMeteoColumns,
+	build_installations_energy,
+	build_location_forecasts,
+	build_weather_forecasts,
+	build_week_summaries,
+)
+from src.open_meteo.models import WEATHER_CODE_TYPES, OpenMeteoWeatherWeekSummary
+from src.open_meteo.services import OpenMeteoForecastService
+
+from .conftest import create_weather_data
+
+
+class TestOpenMeteoColumns:
+	def test_create_groups_by_dates(self) -> None:
+		items = create_weather_data(seed=1, locations=3)
+		items[1] = items[1].model_copy(
+			update={'daily': items[1].daily.model_copy(update={'time': [f'2025-01-0{i + 1}' for i in range(7)]})}
+		)
+
+		groups = OpenMeteoColumns.create_groups(items)
+
+		assert [indexes for indexes, _ in groups] == [[0, 2], [1]]
+		assert groups[0][1].sunshine_duration.shape == (2, 7)
+		assert groups[0][1].pressure_msl.shape == (2, len(items[0].hourly.pressure_msl))
+
+
+def create_service() -> OpenMeteoForecastService:
+	return OpenMeteoForecastService(
+		installation_power_kw=2.5,
+		installation_efficiency=0.2,
+		cache_service=None,
+		cache_soft_ttl_seconds=3600,
+		weather_data_service=None,
+		coordinate_grid=None,
+		hot_location_tracker=None
+	)
+
+
+def create_location_forecasts(seed: int, locations: int) -> list[LocationWeatherForecast]:
+	items = create_weather_data(seed, locations)
+	# Location with different dates is in a separate group.
+	items[1] = items[1].model_copy(
+		update={'daily': items[1].daily.model_copy(update={'time': [f'2025-01-0{i + 1}' for i in range(7)]})}
+	)
+
+	return build_location_forecasts(items)
+
+
+# Reference summary computed in plain Python, value by value.
+def create_week_summary(item: OpenMeteoWeatherWeekSummary) -> WeatherWeekSummary:
+	weather_types = Counter(WEATHER_CODE_TYPES[code] for code in item.daily.weather_code)
+
+	return WeatherWeekSummary(
+		latitude=item.latitude,
+		longitude=item.longitude,
+		hourly_time_unit=item.hourly_units.time,
+		pressure_msl_unit=item.hourly_units.pressure_msl,
+		daily_time_unit=item.daily_units.time,
+		weather_code_unit=item.daily_units.weather_code,
+		temp_max_unit=item.daily_units.temperature_2m_max,
+		temp_min_unit=item.daily_units.temperature_2m_min,
+		sunshine_duration_unit=item.daily_units.sunshine_duration,
+		mean_pressure=round(mean(item.hourly.pressure_msl), 1),
+		mean_sunshine_duration=round(mean(item.daily.sunshine_duration), 2),
+		temp_max_week=max(item.daily.temperature_2m_max),
+		temp_min_week=min(item.daily.temperature_2m_min),
+		weather_types=[k for k, c in weather_types.items() if c == max(weather_types.values())]
+	)
+
+
+class TestBuildLocationForecasts:
+	@pytest.mark.parametrize('seed', [1, 2, 3])
+	def test_same_as_per_location_transforms(self, seed: int) -> None:
+		items = create_weather_data(seed, locations=50)
+
+		forecasts = build_location_forecasts(items)
+
+		expected = [create_service()._build_location_forecast(item) for item in items]
+		assert forecasts == expected
+		assert [f.model_dump_json() for f in forecasts] == [f.model_dump_json() for f in expected]
+
+	def test_keeps_order_of_groups(self) -> None:
+		forecasts = create_location_forecasts(seed=1, locations=3)
+
+		assert forecasts[1].days[0].time == '2025-01-01'
+		assert forecasts[0].days[0].time == forecasts[2].days[0].time != '2025-01-01'
+
+
+class TestBuildWeatherForecasts:
+	# The default installation hits exact half-rounding cases of the test data.
+	@pytest.mark.parametrize('installation_power_kw, installation_efficiency', [(2.5, 0.2), (7.3, 0.17), (50, 1)])
+	@pytest.mark.parametrize('seed', [1, 2, 3])
+	def test_same_as_per_location_transforms(
+			self, seed: int, installation_power_kw: float, installation_efficiency: float
+	) -> None:
+		location_forecasts = create_location_forecasts(seed, locations=50)
+
+		forecasts = build_weather_forecasts(location_forecasts, installation_power_kw, installation_efficiency)
+
+		expected = [
+			OpenMeteoForecastService._build_weather_forecast(forecast, installation_power_kw, installation_efficiency)
+			for forecast in location_forecasts
+		]
+		assert forecasts == expected
+		assert [f.model_dump_json() for f in forecasts] == [f.model_dump_json() for f in expected]
+
+
+class TestBuildInstallationsEnergy:
+	@pytest.mark.parametrize('seed', [1, 2, 3])
+	def test_same_as_per_location_transforms(self, seed: int) -> None:
+		location_forecasts = create_location_forecasts(seed, locations=20)
+		generator = random.Random(seed)
+		cell_indexes = [generator.randrange(len(location_forecasts)) for _ in range(200)]
+		power = [generator.choice([2.5, round(generator.uniform(0.5, 50), 2)]) for _ in cell_indexes]
+		efficiency = [generator.choice([0.2, round(generator.uniform(0.1, 1), 2)]) for _ in cell_indexes]
+
+		energies = build_installations_energy(location_forecasts, cell_indexes, power, efficiency)
+
+		for energy, cell_index, installation_power, installation_efficiency in zip(
+				energies, cell_indexes, power, efficiency
+		):
+			forecast = OpenMeteoForecastService._build_weather_forecast(
+				location_forecasts[cell_index], installation_power, installation_efficiency
+			)
+			assert energy.time == [day.time for day in forecast.days]
+			assert energy.generated_energy == [day.generated_energy for day in forecast.days]
+
+	def test_keeps_order_of_groups(self) -> None:
+		location_forecasts = create_location_forecasts(seed=1, locations=3)
+
+		energies = build_installations_energy(location_forecasts, [1, 0, 1, 2], [1, 2, 3, 4], [0.5, 0.5, 0.5, 0.5])
+
+		assert [energy.time[0] for energy in energies] == [
+			'2025-01-01', location_forecasts[0].days[0].time, '2025-01-01', location_forecasts[2].days[0].time
+		]
+		assert energies[2] == build_installations_energy([location_forecasts[1]], [0], [3], [0.5])[0]
+		assert energies[0] != energies[2]
+
+	def test_no_installations(self) -> None:
+		assert build_installations_energy([], [], [], []) == []
+
+
+class TestBuildWeekSummaries:
+	@pytest.mark.parametrize('seed', [1, 2, 3])
+	def test_same_as_reference_summaries(self, seed: int) -> None:
+		items = create_weather_data(seed, locations=50)
+
+		summaries = build_week_summaries(items)
+
+		expected = [create_week_summary(item) for item in items]
+		assert summaries == expected
+		assert [s.model_dump_json() for s in summaries] == [s.model_dump_json() for s in expected]
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from src.open_meteo.energy import calculate_daily_yields
+
+
+class TestCalculateDailyYields:
+	def test_standard_conditions(self) -> None:
+		# 1000 W/m² with cells at 25 °C (air heated by 31.25 °C) for 3 hours - 3 kWh per kW.
+		radiation = np.array([0.0] * 10 + [1000.0] * 3 + [0.0] * 11)
+		temperature = np.full(24, 25 - 31.25)
+
+		actual = calculate_daily_yields(radiation, temperature, days=1)
+
+		assert actual.tolist() == pytest.approx([3.0])
+
+	def test_temperature_derating(self) -> None:
+		radiation = np.full(24, 500.0)
+
+		cold, hot = (calculate_daily_yields(radiation, np.full(24, t), days=1)[0] for t in (-10.0, 35.0))
+
+		# Cells at 5.625 °C / 50.625 °C: +7.75% / -10.25% of the output at 25 °C (12 kWh per kW).
+		assert cold == pytest.approx(12 * 1.0775)
+		assert hot == pytest.approx(12 * 0.8975)
+
+	def test_sums_hours_of_each_day(self) -> None:
+		radiation = np.array([[100.0] * 24 + [0.0] * 24, [0.0] * 24 + [50.0] * 24])
+		temperature = np.full((2, 48), 10.0)
+
+		actual = calculate_daily_yields(radiation, temperature, days=2)
+
+		assert actual.shape == (2, 2)
+		assert actual[0, 1] == actual[1, 0] == 0
+		# Higher irradiance heats cells more - 100 W/m² yields less than twice as much as 50 W/m².
+		assert actual[0, 0] == pytest.approx(2.4 * 1.0475)
+		assert actual[1, 1] == pytest.approx(1.2 * 1.05375)
+
+	def test_rows_computed_independently(self) -> None:
+		generator = np.random.default_rng(1)
+		radiation = generator.uniform(0, 900, (5, 168))
+		temperature = generator.uniform(-20, 35, (5, 168))
+
+		actual = calculate_daily_yields(radiation, temperature, days=7)
+
+		for row in range(5):
+			assert actual[row].tolist() == calculate_daily_yields(radiation[row], temperature[row], days=7).tolist()
+
+	def test_invalid_number_of_hours_error(self) -> None:
+		with pytest.raises(ValueError):
+			calculate_daily_yields(np.zeros(23), np.zeros(23), days=1)
@@ -1,7 +1,7 @@
 import pytest
 
 from src.models import WeatherTypeEnum
-from src.open_meteo.models import OpenMeteoGroupedWeatherCodeEnum, OpenMeteoWeatherCodeEnum
+from src.open_meteo.models import WEATHER_CODE_TYPES, OpenMeteoGroupedWeatherCodeEnum, OpenMeteoWeatherCodeEnum
 
 
 class TestOpenMeteoWeatherCodeEnum:
@@ -20,3 +20,8 @@ class TestOpenMeteoWeatherCodeEnum:
 		for group in OpenMeteoGroupedWeatherCodeEnum:
 			assert isinstance(group.to_weather_type(), WeatherTypeEnum)
 
+
+	def test_weather_code_types_cover_all_codes(self) -> None:
+		for code in OpenMeteoWeatherCodeEnum:
+			group = OpenMeteoGroupedWeatherCodeEnum.create_from_weather_code(code)
+			assert WEATHER_CODE_TYPES[code] == group.to_weather_type()
@@ -1,12 +1,22 @@
+import asyncio
+import time
 from datetime import datetime
-from unittest.mock import MagicMock, patch
+from typing import Callable
 
+import httpx
 import pytest
 from freezegun import freeze_time
 
+from src.metrics import UPSTREAM_RESPONSES, UPSTREAM_RETRIES
 from src.models import (
+	CacheEntry,
 	CacheService,
+	CoordinateGrid,
 	DayEnum,
+	Installation,
+	InstallationEnergy,
+	LocationWeatherDay,
+	LocationWeatherForecast,
 	WeatherDay,
 	WeatherForecast,
 	WeatherForecastNotAvailableError,
@@ -14,8 +24,29 @@ from src.models import (
 	WeatherWeekSummary,
 	WeatherWeekSummaryNotAvailableError,
 )
-from src.open_meteo.models import OpenMeteoDaily, OpenMeteoWeatherCodeEnum
-from src.open_meteo.services import OpenMeteoForecastService, OpenMeteoWeekSummaryService
+from src.open_meteo.models import (
+	OpenMeteoDaily,
+	OpenMeteoHourly,
+	OpenMeteoWeatherCodeEnum,
+	OpenMeteoWeatherWeekSummary,
+)
+from src.open_meteo.services import OpenMeteoForecastService, OpenMeteoWeatherDataService, OpenMeteoWeekSummaryService
+from src.services import (
+	DecimalCoordinateGrid,
+	ExactCoordinateGrid,
+	HotLocationTracker,
+	StaleWhileRevalidateCache,
+)
+from src.utils import (
+	CircuitBreaker,
+	CircuitBreakerOpenError,
+	MicroBatcher,
+	RateLimiter,
+	RateLimiterTimeoutError,
+	RetryPolicy,
+)
+
+from .conftest import MockOpenMeteoApi
 
 
 class TestOpenMeteoForecastService:
@@ -24,47 +55,79 @@ class TestOpenMeteoForecastService:
 	installation_efficiency = 0.2
 	latitude = 52.52
 	longitude = 13.419998
-
-	def create_service(self, cache_service: CacheService) -> OpenMeteoForecastService:
+	cache_soft_ttl_seconds = 3600
+	max_locations_per_request = 2
+
+	def create_service(
+			self,
+			cache_service: CacheService,
+			http_client: httpx.AsyncClient | None = None,
+			coordinate_grid: CoordinateGrid = ExactCoordinateGrid(),
+			micro_batcher: MicroBatcher | None = None,
+			retry_policy: RetryPolicy | None = None,
+			circuit_breaker: CircuitBreaker | None = None,
+			rate_limiter: RateLimiter | None = None
+	) -> OpenMeteoForecastService:
 		return OpenMeteoForecastService(
-			base_url=self.base_url,
 			installation_power_kw=self.installation_power_kw,
 			installation_efficiency=self.installation_efficiency,
-			cache_service=cache_service
+			cache_service=cache_service,
+			cache_soft_ttl_seconds=self.cache_soft_ttl_seconds,
+			weather_data_service=OpenMeteoWeatherDataService(
+				self.base_url,
+				cache_service,
+				self.cache_soft_ttl_seconds,
+				http_client,
+				self.max_locations_per_request,
+				micro_batcher=micro_batcher,
+				retry_policy=retry_policy,
+				circuit_breaker=circuit_breaker,
+				rate_limiter=rate_limiter
+			),
+			coordinate_grid=coordinate_grid,
+			hot_location_tracker=HotLocationTracker(capacity=10)
 		)
 
 	@freeze_time('2024-12-08')
-	@patch('requests.get')
-	def test_get_weather_forecast_success(
-			self, mock_get: MagicMock, cache_service: CacheService, open_meteo_forecast_response: dict
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_success(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
 	) -> None:
-		open_meteo_forecast_service = self.create_service(cache_service)
+		open_meteo_forecast_service = self.create_service(cache_service, http_client)
 
-		mock_get.return_value.status_code = 200
-		mock_get.return_value.json.return_value = open_meteo_forecast_response
+		open_meteo_api.json = open_meteo_week_summary_response
 
-		actual = open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+		actual = await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
 
-		mock_get.assert_called_once_with(
-			f'{self.base_url}/v1/forecast',
-			params={
-				'latitude': self.latitude,
-				'longitude': self.longitude,
-				'daily': 'weather_code,temperature_2m_max,temperature_2m_min,sunshine_duration'
-			}
-		)
+		assert len(open_meteo_api.requests) == 1
+		request = open_meteo_api.requests[0]
+		assert str(request.url.copy_with(query=None)) == f'{self.base_url}/v1/forecast'
+		assert dict(request.url.params) == {
+			'latitude': str(self.latitude),
+			'longitude': str(self.longitude),
+			'hourly': 'pressure_msl,shortwave_radiation,temperature_2m',
+			'daily': 'weather_code,temperature_2m_max,temperature_2m_min,sunshine_duration'
+		}
 
 		assert isinstance(actual, WeatherForecast)
 		assert isinstance(actual.days[0], WeatherDay)
 		assert actual.installation_power == self.installation_power_kw
 		assert actual.installation_power_unit is not None
 		assert actual.installation_efficiency == self.installation_efficiency
-		assert len(actual.days) == len(open_meteo_forecast_response['daily']['time'])
+		assert len(actual.days) == len(open_meteo_week_summary_response['daily']['time'])
 
-		cache_key = f'forecast_{self.latitude}_{self.longitude}'
+		# Forecast of the configured installation is cached together with the location forecast it's created from.
 		date_key = str(datetime.now().date())
-		assert cache_key in cache_service.cache[date_key]
-		assert cache_service.cache[date_key][cache_key] == actual
+		assert cache_service.cache[date_key][f'forecast_{self.latitude}_{self.longitude}'].value == actual
+		location_forecast = cache_service.cache[date_key][f'location_forecast_{self.latitude}_{self.longitude}'].value
+		assert isinstance(location_forecast, LocationWeatherForecast)
+		assert actual == OpenMeteoForecastService._build_weather_forecast(
+			location_forecast, self.installation_power_kw, self.installation_efficiency
+		)
 
 	@pytest.mark.parametrize(
 		'status_code, exception_message',
@@ -73,30 +136,37 @@ class TestOpenMeteoForecastService:
 			(400, 'Invalid response')
 		]
 	)
-	@patch('requests.get')
-	def test_get_weather_forecast_api_error(
-			self, mock_get: MagicMock, cache_service: CacheService, status_code: int, exception_message: str
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_api_error(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			status_code: int,
+			exception_message: str
 	) -> None:
-		open_meteo_forecast_service = self.create_service(cache_service)
+		open_meteo_forecast_service = self.create_service(cache_service, http_client)
+		responses = UPSTREAM_RESPONSES.values.get((str(status_code),), 0)
 
-		mock_get.return_value.status_code = status_code
-		mock_get.return_value.json.side_effect = ValueError(exception_message)
+		open_meteo_api.status_code = status_code
+		open_meteo_api.json = {'error': True, 'reason': exception_message}
 
 		with pytest.raises(WeatherForecastNotAvailableError) as exc_info:
-			open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+			await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
 
-		assert "Invalid response" in str(exc_info.value)
+		assert str(status_code) in str(exc_info.value)
+		assert UPSTREAM_RESPONSES.values[(str(status_code),)] == responses + 1
 
 	@freeze_time("2024-12-08")
-	@patch('requests.get')
-	def test_get_weather_forecast_from_cache(
-			self, mock_get: MagicMock, cache_service: CacheService, open_meteo_forecast_response: dict
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_from_cache(
+			self, open_meteo_api: MockOpenMeteoApi, http_client: httpx.AsyncClient, cache_service: CacheService
 	) -> None:
-		open_meteo_forecast_service = self.create_service(cache_service)
-		cache_key = f"forecast_{self.latitude}_{self.longitude}"
+		open_meteo_forecast_service = self.create_service(cache_service, http_client)
+		cache_key = f"location_forecast_{self.latitude}_{self.longitude}"
 		date_key = str(datetime.now().date())
 
-		expected_forecast = WeatherForecast(
+		location_forecast = LocationWeatherForecast(
 			latitude=self.latitude,
 			longitude=self.longitude,
 			time_unit="iso8601",
@@ -104,31 +174,643 @@ class TestOpenMeteoForecastService:
 			temp_max_unit="°C",
 			temp_min_unit="°C",
 			sunshine_duration_unit="s",
+			days=[
+				LocationWeatherDay(
+					time="2024-12-08",
+					day=DayEnum.SUNDAY,
+					weather_code=1,
+					weather_type=WeatherTypeEnum.CLEAR_SKY,
+					temp_max=10.0,
+					temp_min=5.0,
+					sunshine_duration=3600,
+					daily_yield=3.0
+				)
+			]
+		)
+
+		cache_service.cache[date_key] = {cache_key: CacheEntry(value=location_forecast, created_at=time.time())}
+
+		actual = await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+
+		assert not open_meteo_api.requests
+		assert actual == WeatherForecast(
+			**location_forecast.model_dump(exclude={'days'}),
 			generated_energy_unit="kWh",
 			installation_power_unit="kW",
 			installation_power=2.5,
 			installation_efficiency=0.2,
-			days=[]
+			days=[
+				WeatherDay(
+					**location_forecast.days[0].model_dump(exclude={'daily_yield'}),
+					generated_energy=1.5
+				)
+			]
 		)
 
-		cache_service.cache[date_key] = {cache_key: expected_forecast}
+	@freeze_time("2024-12-08")
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_installations_share_cache_entry(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		open_meteo_forecast_service = self.create_service(cache_service, http_client)
 
-		actual = open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+		open_meteo_api.json = open_meteo_week_summary_response
 
-		mock_get.assert_not_called()
-		assert actual == expected_forecast
+		default_entry = await open_meteo_forecast_service.get_weather_forecast_entry(self.latitude, self.longitude)
+		custom_entry = await open_meteo_forecast_service.get_weather_forecast_entry(
+			self.latitude, self.longitude, installation_power_kw=10, installation_efficiency=0.25
+		)
+		power_entry = await open_meteo_forecast_service.get_weather_forecast_entry(
+			self.latitude, self.longitude, installation_power_kw=5
+		)
 
-	@patch('requests.get')
-	def test_get_weather_forecast_connection_error(self, mock_get: MagicMock, cache_service: CacheService) -> None:
-		open_meteo_forecast_service = self.create_service(cache_service)
+		assert len(open_meteo_api.requests) == 1
+		date_key = str(datetime.now().date())
+		assert list(cache_service.cache[date_key]) == [
+			f'weather_data_{self.latitude}_{self.longitude}',
+			f'location_forecast_{self.latitude}_{self.longitude}',
+			f'forecast_{self.latitude}_{self.longitude}'
+		]
 
-		mock_get.side_effect = ConnectionError("API not reachable")
+		assert (custom_entry.value.installation_power, custom_entry.value.installation_efficiency) == (10, 0.25)
+		assert (power_entry.value.installation_power, power_entry.value.installation_efficiency) == (5, 0.2)
+		assert [day.generated_energy for day in custom_entry.value.days] == [
+			round(10 * daily_yield * 0.25, 4)
+			for daily_yield in OpenMeteoForecastService._get_daily_yields(
+				OpenMeteoHourly(**open_meteo_week_summary_response['hourly']), 7
+			)
+		]
+		assert custom_entry.get_etag() != default_entry.get_etag()
+		assert custom_entry.created_at == default_entry.created_at
+		assert custom_entry.content_encodings == ('gzip',)
+
+		# Forecast of the configured installation is cached, so it's created (and rendered) once.
+		assert await open_meteo_forecast_service.get_weather_forecast_entry(
+			self.latitude, self.longitude
+		) is default_entry
+		assert await open_meteo_forecast_service.get_weather_forecast_entry(
+			self.latitude, self.longitude, installation_power_kw=2.5, installation_efficiency=0.2
+		) is default_entry
+		assert await open_meteo_forecast_service.get_weather_forecast_entry(
+			self.latitude, self.longitude, installation_power_kw=10, installation_efficiency=0.25
+		) is not custom_entry
+
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_connection_error(
+			self, open_meteo_api: MockOpenMeteoApi, http_client: httpx.AsyncClient, cache_service: CacheService
+	) -> None:
+		open_meteo_forecast_service = self.create_service(cache_service, http_client)
+
+		open_meteo_api.side_effect = httpx.ConnectError("API not reachable")
 
 		with pytest.raises(WeatherForecastNotAvailableError) as exc_info:
-			open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+			await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
 
 		assert "API not reachable" in str(exc_info.value)
 
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_concurrent_misses_share_request(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		open_meteo_forecast_service = self.create_service(cache_service, http_client)
+
+		open_meteo_api.json = open_meteo_week_summary_response
+
+		forecasts = await asyncio.gather(
+			*[open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude) for _ in range(5)]
+		)
+
+		assert len(open_meteo_api.requests) == 1
+		assert all(forecast == forecasts[0] for forecast in forecasts)
+
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_concurrent_misses_share_error(
+			self, open_meteo_api: MockOpenMeteoApi, http_client: httpx.AsyncClient, cache_service: CacheService
+	) -> None:
+		open_meteo_forecast_service = self.create_service(cache_service, http_client)
+
+		open_meteo_api.side_effect = httpx.ConnectError("API not reachable")
+
+		results = await asyncio.gather(
+			*[open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude) for _ in range(5)],
+			return_exceptions=True
+		)
+
+		assert len(open_meteo_api.requests) == 1
+		assert all(isinstance(result, WeatherForecastNotAvailableError) for result in results)
+
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_nearby_coordinates_share_cache(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		open_meteo_forecast_service = self.create_service(cache_service, http_client, DecimalCoordinateGrid(2))
+
+		open_meteo_api.json = open_meteo_week_summary_response
+
+		first = await open_meteo_forecast_service.get_weather_forecast(52.2297, 21.0122)
+		second = await open_meteo_forecast_service.get_weather_forecast(52.2298, 21.0121)
+
+		assert len(open_meteo_api.requests) == 1
+		assert open_meteo_api.requests[0].url.params['latitude'] == '52.23'
+		assert open_meteo_api.requests[0].url.params['longitude'] == '21.01'
+		assert first == second
+
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_and_week_summary_share_request(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		weather_data_service = OpenMeteoWeatherDataService(
+			self.base_url, cache_service, self.cache_soft_ttl_seconds, http_client, self.max_locations_per_request
+		)
+		open_meteo_forecast_service = OpenMeteoForecastService(
+			installation_power_kw=self.installation_power_kw,
+			installation_efficiency=self.installation_efficiency,
+			cache_service=cache_service,
+			cache_soft_ttl_seconds=self.cache_soft_ttl_seconds,
+			weather_data_service=weather_data_service,
+			coordinate_grid=ExactCoordinateGrid(),
+			hot_location_tracker=HotLocationTracker(capacity=10)
+		)
+		open_meteo_week_summary_service = OpenMeteoWeekSummaryService(
+			cache_service=cache_service,
+			cache_soft_ttl_seconds=self.cache_soft_ttl_seconds,
+			weather_data_service=weather_data_service,
+			coordinate_grid=ExactCoordinateGrid(),
+			hot_location_tracker=HotLocationTracker(capacity=10)
+		)
+
+		open_meteo_api.json = open_meteo_week_summary_response
+
+		forecast = await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+		summary = await open_meteo_week_summary_service.get_week_summary(self.latitude, self.longitude)
+
+		assert len(open_meteo_api.requests) == 1
+		assert isinstance(forecast, WeatherForecast)
+		assert isinstance(summary, WeatherWeekSummary)
+
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_stale_cache_refreshed_in_background(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		open_meteo_forecast_service = self.create_service(cache_service, http_client)
+
+		open_meteo_api.json = open_meteo_week_summary_response
+
+		with freeze_time('2024-12-09 12:00:00') as frozen_time:
+			forecast = await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+
+			frozen_time.tick(self.cache_soft_ttl_seconds + 1)
+			open_meteo_api.json = {
+				**open_meteo_week_summary_response,
+				'daily': {**open_meteo_week_summary_response['daily'], 'temperature_2m_max': [20.0] * 7}
+			}
+
+			# Stale value is returned immediately, new one is created in the background.
+			stale_forecast = await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+			await asyncio.gather(*StaleWhileRevalidateCache.refresh_tasks)
+			refreshed_forecast = await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+
+		assert len(open_meteo_api.requests) == 2
+		assert stale_forecast == forecast
+		assert refreshed_forecast.days[0].temp_max == 20.0
+
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_stale_cache_refresh_error(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		open_meteo_forecast_service = self.create_service(cache_service, http_client)
+
+		open_meteo_api.json = open_meteo_week_summary_response
+
+		with freeze_time('2024-12-09 12:00:00') as frozen_time:
+			forecast = await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+
+			frozen_time.tick(self.cache_soft_ttl_seconds + 1)
+			open_meteo_api.side_effect = httpx.ConnectError("API not reachable")
+
+			stale_forecast = await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+			await asyncio.gather(*StaleWhileRevalidateCache.refresh_tasks, return_exceptions=True)
+			stale_forecast_after_refresh = await open_meteo_forecast_service.get_weather_forecast(
+				self.latitude, self.longitude
+			)
+
+		assert stale_forecast == forecast
+		assert stale_forecast_after_refresh == forecast
+
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_refreshed_after_upstream_recovers(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		open_meteo_forecast_service = self.create_service(cache_service, http_client)
+		cache_key = f'forecast_{self.latitude}_{self.longitude}'
+
+		open_meteo_api.json = open_meteo_week_summary_response
+
+		with freeze_time('2024-12-09 12:00:00') as frozen_time:
+			await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+
+			frozen_time.tick(self.cache_soft_ttl_seconds + 1)
+			open_meteo_api.side_effect = httpx.ConnectError("API not reachable")
+
+			await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+			await asyncio.gather(*StaleWhileRevalidateCache.refresh_tasks, return_exceptions=True)
+
+			# Forecast created from stale weather data is as old as the data.
+			assert (await cache_service.get_cache_entry(cache_key)).get_age() == self.cache_soft_ttl_seconds + 1
+
+			frozen_time.tick(60)
+			open_meteo_api.side_effect = None
+
+			await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+			await asyncio.gather(*StaleWhileRevalidateCache.refresh_tasks)
+
+			assert len(open_meteo_api.requests) == 3
+			assert (await cache_service.get_cache_entry(cache_key)).get_age() == 0
+
+	@pytest.mark.anyio
+	async def test_prewarm_weather_forecast(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		open_meteo_forecast_service = self.create_service(cache_service, http_client)
+
+		open_meteo_api.json = open_meteo_week_summary_response
+
+		with freeze_time('2024-12-09 12:00:00') as frozen_time:
+			# Missing entry is created.
+			await open_meteo_forecast_service.prewarm_weather_forecast(self.latitude, self.longitude, max_age=600)
+			assert len(open_meteo_api.requests) == 1
+
+			# Entry younger than max age is left as it is.
+			frozen_time.tick(600)
+			await open_meteo_forecast_service.prewarm_weather_forecast(self.latitude, self.longitude, max_age=600)
+			assert len(open_meteo_api.requests) == 1
+
+			# Older entry is refreshed together with weather data, even though both are not stale yet.
+			frozen_time.tick(1)
+			await open_meteo_forecast_service.prewarm_weather_forecast(self.latitude, self.longitude, max_age=600)
+			assert len(open_meteo_api.requests) == 2
+
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_records_hot_location(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		open_meteo_forecast_service = self.create_service(cache_service, http_client, DecimalCoordinateGrid(2))
+
+		open_meteo_api.json = open_meteo_week_summary_response
+
+		await open_meteo_forecast_service.get_weather_forecast(52.2297, 21.0122)
+
+		assert open_meteo_forecast_service.hot_location_tracker.get_top(1) == [(52.23, 21.01)]
+
+	@staticmethod
+	def respond_per_location(payload: dict) -> Callable[[httpx.Request], dict | list[dict]]:
+		# Mimics Open-Meteo multi-location responses: a list for many coordinates, an object for one.
+		def respond(request: httpx.Request) -> dict | list[dict]:
+			latitudes = request.url.params['latitude'].split(',')
+			longitudes = request.url.params['longitude'].split(',')
+			payloads = [
+				{**payload, 'latitude': float(latitude), 'longitude': float(longitude)}
+				for latitude, longitude in zip(latitudes, longitudes)
+			]
+
+			return payloads if len(payloads) > 1 else payloads[0]
+
+		return respond
+
+	@freeze_time('2024-12-08')
+	@pytest.mark.anyio
+	async def test_get_weather_forecasts_chunks_missing_locations(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		open_meteo_forecast_service = self.create_service(cache_service, http_client)
+		locations = [(50.0, 10.0), (51.0, 11.0), (50.0, 10.0), (52.0, 12.0)]
+
+		open_meteo_api.json = self.respond_per_location(open_meteo_week_summary_response)
+
+		actual = await open_meteo_forecast_service.get_weather_forecasts(locations)
+
+		# Three distinct locations, up to two per request.
+		assert [request.url.params['latitude'] for request in open_meteo_api.requests] == ['50.0,51.0', '52.0']
+		assert [(forecast.latitude, forecast.longitude) for forecast in actual] == locations
+
+		date_key = str(datetime.now().date())
+		assert OpenMeteoForecastService._build_weather_forecast(
+			cache_service.cache[date_key]['location_forecast_52.0_12.0'].value,
+			self.installation_power_kw,
+			self.installation_efficiency
+		) == actual[3]
+
+		# Second batch is served from cache.
+		assert await open_meteo_forecast_service.get_weather_forecasts(locations) == actual
+		assert len(open_meteo_api.requests) == 2
+
+	@freeze_time('2024-12-08')
+	@pytest.mark.anyio
+	async def test_get_weather_forecasts_returns_error_per_location(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		open_meteo_forecast_service = self.create_service(cache_service, http_client)
+		await cache_service.add_cache(
+			'weather_data_50.0_10.0', OpenMeteoWeatherWeekSummary(**open_meteo_week_summary_response)
+		)
+
+		open_meteo_api.status_code = 500
+		open_meteo_api.json = {'error': True, 'reason': 'Invalid response'}
+
+		actual = await open_meteo_forecast_service.get_weather_forecasts([(51.0, 11.0), (50.0, 10.0)])
+
+		assert isinstance(actual[0], WeatherForecastNotAvailableError)
+		assert isinstance(actual[1], WeatherForecast)
+		assert len(open_meteo_api.requests) == 1
+
+	@freeze_time('2024-12-08')
+	@pytest.mark.anyio
+	async def test_get_weather_forecasts_invalid_item_in_response(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		open_meteo_forecast_service = self.create_service(cache_service, http_client)
+		invalid_response = {**open_meteo_week_summary_response, 'daily': {}}
+
+		open_meteo_api.json = [open_meteo_week_summary_response, invalid_response]
+
+		actual = await open_meteo_forecast_service.get_weather_forecasts([(52.52, 13.419998), (50.0, 10.0)])
+
+		assert isinstance(actual[0], WeatherForecast)
+		assert isinstance(actual[1], WeatherForecastNotAvailableError)
+
+	@freeze_time('2024-12-08')
+	@pytest.mark.anyio
+	async def test_get_installations_energy_fetches_each_cell_once(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		open_meteo_forecast_service = self.create_service(cache_service, http_client, DecimalCoordinateGrid(0))
+		installations = [
+			Installation(latitude=50.1, longitude=10.2, installation_power_kw=2.5, installation_efficiency=0.2),
+			Installation(latitude=51.0, longitude=11.0, installation_power_kw=5, installation_efficiency=0.2),
+			Installation(latitude=49.9, longitude=9.8, installation_power_kw=10, installation_efficiency=0.5)
+		]
+
+		open_meteo_api.json = self.respond_per_location(open_meteo_week_summary_response)
+
+		actual = await open_meteo_forecast_service.get_installations_energy(installations)
+
+		# Two cells, fetched with a single request.
+		assert [request.url.params['latitude'] for request in open_meteo_api.requests] == ['50.0,51.0']
+		assert all(isinstance(energy, InstallationEnergy) for energy in actual)
+		forecast = await open_meteo_forecast_service.get_weather_forecast(50.0, 10.0)
+		assert actual[0].generated_energy == [day.generated_energy for day in forecast.days]
+		assert actual[2].generated_energy == [
+			round(10 * daily_yield * 0.5, 4)
+			for daily_yield in OpenMeteoForecastService._get_daily_yields(
+				OpenMeteoHourly(**open_meteo_week_summary_response['hourly']), 7
+			)
+		]
+
+		# Weather data of cells is cached.
+		await open_meteo_forecast_service.get_installations_energy(installations)
+		assert len(open_meteo_api.requests) == 1
+
+	@freeze_time('2024-12-08')
+	@pytest.mark.anyio
+	async def test_get_installations_energy_returns_error_per_cell(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		open_meteo_forecast_service = self.create_service(cache_service, http_client)
+		invalid_response = {**open_meteo_week_summary_response, 'daily': {}}
+		installations = [
+			Installation(latitude=latitude, longitude=10.0, installation_power_kw=2.5, installation_efficiency=0.2)
+			for latitude in (50.0, 51.0, 50.0)
+		]
+
+		open_meteo_api.json = [open_meteo_week_summary_response, invalid_response]
+
+		actual = await open_meteo_forecast_service.get_installations_energy(installations)
+
+		assert isinstance(actual[0], InstallationEnergy)
+		assert isinstance(actual[1], WeatherForecastNotAvailableError)
+		assert actual[2] == actual[0]
+
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_micro_batches_concurrent_misses(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		batching_service = OpenMeteoWeatherDataService(
+			self.base_url, cache_service, self.cache_soft_ttl_seconds, http_client, self.max_locations_per_request
+		)
+		micro_batcher = MicroBatcher(batching_service.fetch_many_weather_data, window_seconds=0.01, max_batch_size=10)
+		open_meteo_forecast_service = self.create_service(cache_service, http_client, micro_batcher=micro_batcher)
+
+		open_meteo_api.json = self.respond_per_location(open_meteo_week_summary_response)
+
+		actual = await asyncio.gather(
+			open_meteo_forecast_service.get_weather_forecast(50.0, 10.0),
+			open_meteo_forecast_service.get_weather_forecast(51.0, 11.0)
+		)
+
+		assert [request.url.params['latitude'] for request in open_meteo_api.requests] == ['50.0,51.0']
+		assert [(forecast.latitude, forecast.longitude) for forecast in actual] == [(50.0, 10.0), (51.0, 11.0)]
+
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_retries_failed_requests(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		retry_policy = RetryPolicy(max_retries=2, base_delay_seconds=0.001, max_delay_seconds=0.001)
+		open_meteo_forecast_service = self.create_service(cache_service, http_client, retry_policy=retry_policy)
+		retries = UPSTREAM_RETRIES.values.get((), 0)
+
+		open_meteo_api.json = open_meteo_week_summary_response
+		open_meteo_api.failures = [httpx.ReadTimeout('Timed out'), 503]
+
+		actual = await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+
+		assert len(open_meteo_api.requests) == 3
+		assert isinstance(actual, WeatherForecast)
+		assert UPSTREAM_RETRIES.values[()] == retries + 2
+
+	@pytest.mark.parametrize('failures, requests', [([503, 503, 503], 3), ([400], 1)])
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_retries_limited_to_retryable_errors(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict,
+			failures: list[int],
+			requests: int
+	) -> None:
+		retry_policy = RetryPolicy(max_retries=2, base_delay_seconds=0.001, max_delay_seconds=0.001)
+		open_meteo_forecast_service = self.create_service(cache_service, http_client, retry_policy=retry_policy)
+
+		open_meteo_api.json = open_meteo_week_summary_response
+		open_meteo_api.failures = failures
+
+		with pytest.raises(WeatherForecastNotAvailableError):
+			await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+
+		assert len(open_meteo_api.requests) == requests
+
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_open_circuit_fails_fast(
+			self, open_meteo_api: MockOpenMeteoApi, http_client: httpx.AsyncClient, cache_service: CacheService
+	) -> None:
+		circuit_breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout_seconds=60)
+		open_meteo_forecast_service = self.create_service(cache_service, http_client, circuit_breaker=circuit_breaker)
+
+		open_meteo_api.side_effect = httpx.ConnectError("API not reachable")
+
+		errors = []
+
+		for latitude in (50.0, 51.0, 52.0):
+			with pytest.raises(WeatherForecastNotAvailableError) as exc_info:
+				await open_meteo_forecast_service.get_weather_forecast(latitude, self.longitude)
+
+			errors.append(exc_info.value)
+
+		assert len(open_meteo_api.requests) == 2
+		assert isinstance(errors[2].args[0], CircuitBreakerOpenError)
+		assert circuit_breaker.get_state() == 'open'
+
+	@pytest.mark.anyio
+	async def test_get_weather_data_open_circuit_uses_stale_cache(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		circuit_breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout_seconds=60)
+		open_meteo_forecast_service = self.create_service(cache_service, http_client, circuit_breaker=circuit_breaker)
+		weather_data_service = open_meteo_forecast_service.weather_data_service
+
+		open_meteo_api.json = open_meteo_week_summary_response
+
+		with freeze_time('2024-12-09 12:00:00') as frozen_time:
+			cached_entry = await weather_data_service.get_weather_data(self.latitude, self.longitude)
+
+			frozen_time.tick(self.cache_soft_ttl_seconds + 1)
+			open_meteo_api.side_effect = httpx.ConnectError("API not reachable")
+
+			# The first failure opens the circuit, the next request doesn't reach upstream - both use stale data.
+			first = await weather_data_service.get_weather_data(self.latitude, self.longitude)
+			second = await weather_data_service.get_weather_data(self.latitude, self.longitude)
+
+		assert len(open_meteo_api.requests) == 2
+		assert circuit_breaker.get_state() == 'open'
+		assert first.value == second.value == cached_entry.value
+		assert first.created_at == cached_entry.created_at
+
+	@pytest.mark.anyio
+	async def test_get_weather_forecasts_share_rate_limiter(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
+	) -> None:
+		rate_limiter = RateLimiter('test', max_in_flight=1, rate_per_second=1000, burst=10, max_wait_seconds=1)
+		open_meteo_forecast_service = self.create_service(cache_service, http_client, rate_limiter=rate_limiter)
+		in_flight = []
+
+		def respond(request: httpx.Request) -> dict:
+			in_flight.append(rate_limiter.in_flight)
+			return {**open_meteo_week_summary_response, 'latitude': float(request.url.params['latitude'])}
+
+		open_meteo_api.json = respond
+
+		await asyncio.gather(
+			*[open_meteo_forecast_service.get_weather_forecast(latitude, self.longitude) for latitude in range(5)]
+		)
+
+		assert in_flight == [1] * 5
+		assert rate_limiter.get_stats() == {'in_flight': 0, 'waiting': 0, 'rejected': 0}
+
+	@pytest.mark.anyio
+	async def test_get_weather_forecast_rate_limiter_timeout(
+			self, open_meteo_api: MockOpenMeteoApi, http_client: httpx.AsyncClient, cache_service: CacheService
+	) -> None:
+		rate_limiter = RateLimiter('test', max_in_flight=1, rate_per_second=1000, burst=10, max_wait_seconds=0.01)
+		circuit_breaker = CircuitBreaker(
+			'test', failure_threshold=1, reset_timeout_seconds=60, ignored_errors=(RateLimiterTimeoutError,)
+		)
+		open_meteo_forecast_service = self.create_service(
+			cache_service, http_client, circuit_breaker=circuit_breaker, rate_limiter=rate_limiter
+		)
+		rate_limited = UPSTREAM_RESPONSES.values.get(('rate_limited',), 0)
+
+		await rate_limiter.acquire()
+
+		with pytest.raises(WeatherForecastNotAvailableError) as exc_info:
+			await open_meteo_forecast_service.get_weather_forecast(self.latitude, self.longitude)
+
+		assert isinstance(exc_info.value.args[0], RateLimiterTimeoutError)
+		assert not open_meteo_api.requests
+		assert UPSTREAM_RESPONSES.values[('rate_limited',)] == rate_limited + 1
+		assert circuit_breaker.get_state() == 'closed'
+
 	def test_get_days(self) -> None:
 		service = self.create_service(None)
 		daily = OpenMeteoDaily(
@@ -138,24 +820,29 @@ class TestOpenMeteoForecastService:
 			temperature_2m_min=[5.0, 6.0],
 			sunshine_duration=[3600, 7200]
 		)
+		hourly = OpenMeteoHourly(
+			time=[f"2024-12-{day:02}T{hour:02}:00" for day in (8, 9) for hour in range(24)],
+			pressure_msl=[1000.0] * 48,
+			shortwave_radiation=[0.0] * 12 + [500.0] * 12 + [0.0] * 24,
+			temperature_2m=[10.0] * 48
+		)
 
-		days = service._get_days(daily)
+		days = service._get_days(daily, hourly)
 
 		assert len(days) == 2
 		assert days[0].time == "2024-12-08"
-		assert days[0].generated_energy > 0
+		assert days[0].daily_yield > 0
+		assert days[1].daily_yield == 0
 
 	def test_get_day(self) -> None:
 		assert OpenMeteoForecastService._get_day("2024-12-08") == DayEnum.SUNDAY.value
 		assert OpenMeteoForecastService._get_day("2024-12-09") == DayEnum.MONDAY.value
 
 	def test_calculate_energy(self) -> None:
-		service = self.create_service(None)
-		energy = service._calculate_energy(7200)
-		expected_energy = round(
-			service.installation_power_kw * (7200 / 3600) * service.installation_efficiency,
-			2
+		energy = OpenMeteoForecastService._calculate_energy(
+			2.0, self.installation_power_kw, self.installation_efficiency
 		)
+		expected_energy = round(self.installation_power_kw * 2.0 * self.installation_efficiency, 2)
 
 		assert energy == expected_energy
 
@@ -164,11 +851,23 @@ class TestOpenMeteoWeekSummaryService:
 	base_url = 'http://example.com'
 	latitude = 52.52
 	longitude = 13.419998
-
-	def create_service(self, cache_service: CacheService) -> OpenMeteoWeekSummaryService:
+	cache_soft_ttl_seconds = 3600
+	max_locations_per_request = 2
+
+	def create_service(
+			self,
+			cache_service: CacheService,
+			http_client: httpx.AsyncClient | None = None,
+			coordinate_grid: CoordinateGrid = ExactCoordinateGrid()
+	) -> OpenMeteoWeekSummaryService:
 		return OpenMeteoWeekSummaryService(
-			base_url=self.base_url,
-			cache_service=cache_service
+			cache_service=cache_service,
+			cache_soft_ttl_seconds=self.cache_soft_ttl_seconds,
+			weather_data_service=OpenMeteoWeatherDataService(
+				self.base_url, cache_service, self.cache_soft_ttl_seconds, http_client, self.max_locations_per_request
+			),
+			coordinate_grid=coordinate_grid,
+			hot_location_tracker=HotLocationTracker(capacity=10)
 		)
 
 	def create_expected_summary(self) -> WeatherWeekSummary:
@@ -192,29 +891,32 @@ class TestOpenMeteoWeekSummaryService:
 	def setup_cache(self, cache_service: CacheService, expected_summary: WeatherWeekSummary) -> (str, str):
 		cache_key = f'summary_{self.latitude}_{self.longitude}'
 		date_key = str(datetime.now().date())
-		cache_service.cache[date_key] = {cache_key: expected_summary}
+		cache_service.cache[date_key] = {cache_key: CacheEntry(value=expected_summary, created_at=time.time())}
 		return cache_key, date_key
 
-	@patch('requests.get')
-	def test_get_week_summary_success(
-			self, mock_get: MagicMock, cache_service: CacheService, open_meteo_week_summary_response: dict
+	@pytest.mark.anyio
+	async def test_get_week_summary_success(
+			self,
+			open_meteo_api: MockOpenMeteoApi,
+			http_client: httpx.AsyncClient,
+			cache_service: CacheService,
+			open_meteo_week_summary_response: dict
 	) -> None:
-		open_meteo_week_summary_service = self.create_service(cache_service)
+		open_meteo_week_summary_service = self.create_service(cache_service, http_client)
 
-		mock_get.return_value.status_code = 200
-		mock_get.return_value.json.return_value = open_meteo_week_summary_response
+		open_meteo_api.json = open_meteo_week_summary_response
 
-		summary = open_meteo_week_summary_service.get_week_summary(self.latitude, self.longitude)
+		summary = await open_meteo_week_summary_service.get_week_summary(self.latitude, self.longitude)
 
-		mock_get.assert_called_once_with(
-			f'{self.base_url}/v1/forecast',
-			params={
-				'latitude': self.latitude,
-				'longitude': self.longitude,
-				'daily': 'weather_code,temperature_2m_max,temperature_2m_min,sunshine_duration',
-				'hourly': 'pressure_msl'
-			}
-		)
+		assert len(open_meteo_api.requests) == 1
+		request = open_meteo_api.requests[0]
+		assert str(request.url.copy_with(query=None)) == f'{self.base_url}/v1/forecast'
+		assert dict(request.url.params) == {
+			'latitude': str(self.latitude),
+			'longitude': str(self.longitude),
+			'daily': 'weather_code,temperature_2m_max,temperature_2m_min,sunshine_duration',
+			'hourly': 'pressure_msl,shortwave_radiation,temperature_2m'
+		}
 
 		assert isinstance(summary, WeatherWeekSummary)
 
@@ -235,38 +937,47 @@ class TestOpenMeteoWeekSummaryService:
 
 		cache_key, date_key = self.setup_cache(cache_service, summary)
 		assert cache_key in cache_service.cache[date_key]
-		assert cache_service.cache[date_key][cache_key] == summary
+		assert cache_service.cache[date_key][cache_key].value == summary
 
 	@freeze_time("2024-12-09")
-	@patch('requests.get')
-	def test_get_week_summary_from_cache(
-			self, mock_get: MagicMock, cache_service: CacheService, open_meteo_week_summary_response: dict
+	@pytest.mark.anyio
+	async def test_get_week_summary_from_cache(
+			self, open_meteo_api: MockOpenMeteoApi, http_client: httpx.AsyncClient, cache_service: CacheService
 	) -> None:
-		open_meteo_week_summary_service = self.create_service(cache_service)
+		open_meteo_week_summary_service = self.create_service(cache_service, http_client)
 		expected_summary = self.create_expected_summary()
 		cache_key, date_key = self.setup_cache(cache_service, expected_summary)
-		cache_service.cache[date_key] = {cache_key: expected_summary}
 
-		summary = open_meteo_week_summary_service.get_week_summary(self.latitude, self.longitude)
+		summary = await open_meteo_week_summary_service.get_week_summary(self.latitude, self.longitude)
 
-		mock_get.assert_not_called()
+		assert not open_meteo_api.requests
 		assert summary == expected_summary
-		assert cache_service.cache[date_key][cache_key] == expected_summary
+		assert cache_service.cache[date_key][cache_key].value == expected_summary
 
-	@patch('requests.get')
-	def test_get_week_summary_no_cache_and_api_unreachable(
-			self, mock_get: MagicMock, cache_service: CacheService
+	@pytest.mark.anyio
+	async def test_get_week_summary_no_cache_and_api_unreachable(
+			self, open_meteo_api: MockOpenMeteoApi, http_client: httpx.AsyncClient, cache_service: CacheService
 	) -> None:
-		open_meteo_week_summary_service = self.create_service(cache_service)
+		open_meteo_week_summary_service = self.create_service(cache_service, http_client)
 
-		mock_get.side_effect = ConnectionError("API not reachable")
+		open_meteo_api.side_effect = httpx.ConnectError("API not reachable")
 
 		with pytest.raises(WeatherWeekSummaryNotAvailableError) as exc_info:
-			open_meteo_week_summary_service.get_week_summary(self.latitude, self.longitude)
+			await open_meteo_week_summary_service.get_week_summary(self.latitude, self.longitude)
 
 		assert "API not reachable" in str(exc_info.value)
 
-	def test_get_weather_types_success(self) -> None:
+	# Summary built from the canned response with given daily weather codes (set without validation).
+	@staticmethod
+	def build_week_summary(response: dict, weather_codes: list) -> WeatherWeekSummary:
+		weather_data = OpenMeteoWeatherWeekSummary(**response)
+		weather_data = weather_data.model_copy(
+			update={'daily': weather_data.daily.model_copy(update={'weather_code': weather_codes})}
+		)
+
+		return OpenMeteoWeekSummaryService._build_week_summary(weather_data)
+
+	def test_get_weather_types_success(self, open_meteo_week_summary_response: dict) -> None:
 		weather_codes = [
 			OpenMeteoWeatherCodeEnum.SNOW_SLIGHT,
 			OpenMeteoWeatherCodeEnum.RAIN_MODERATE,
@@ -274,11 +985,11 @@ class TestOpenMeteoWeekSummaryService:
 			OpenMeteoWeatherCodeEnum.SNOW_HEAVY
 		]
 
-		grouped_weather = OpenMeteoWeekSummaryService._get_weather_types(weather_codes)
+		summary = self.build_week_summary(open_meteo_week_summary_response, weather_codes)
 
-		assert grouped_weather == [WeatherTypeEnum.SNOW]
+		assert summary.weather_types == [WeatherTypeEnum.SNOW]
 
-	def test_get_weather_types_multiple_types(self) -> None:
+	def test_get_weather_types_multiple_types(self, open_meteo_week_summary_response: dict) -> None:
 		weather_codes = [
 			OpenMeteoWeatherCodeEnum.RAIN_SLIGHT,
 			OpenMeteoWeatherCodeEnum.RAIN_SLIGHT,
@@ -286,14 +997,14 @@ class TestOpenMeteoWeekSummaryService:
 			OpenMeteoWeatherCodeEnum.SNOW_SLIGHT
 		]
 
-		grouped_weather = OpenMeteoWeekSummaryService._get_weather_types(weather_codes)
+		summary = self.build_week_summary(open_meteo_week_summary_response, weather_codes)
 
-		assert set(grouped_weather) == {WeatherTypeEnum.RAIN, WeatherTypeEnum.SNOW}
+		assert summary.weather_types == [WeatherTypeEnum.RAIN, WeatherTypeEnum.SNOW]
 
-	def test_get_weather_types_empty_list_error(self) -> None:
+	def test_get_weather_types_empty_list_error(self, open_meteo_week_summary_response: dict) -> None:
 		with pytest.raises(ValueError):
-			OpenMeteoWeekSummaryService._get_weather_types([])
+			self.build_week_summary(open_meteo_week_summary_response, [])
 
-	def test_get_weather_types_list_with_invalid_values_error(self) -> None:
+	def test_get_weather_types_list_with_invalid_values_error(self, open_meteo_week_summary_response: dict) -> None:
 		with pytest.raises(Exception):
-			OpenMeteoWeekSummaryService._get_weather_types([1, 'a'])
+			self.build_week_summary(open_meteo_week_summary_response, [1, 'a'])
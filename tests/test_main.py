@@ -1,10 +1,19 @@
+import logging
+import math
+import time
 from unittest.mock import MagicMock
 
+import pytest
 from fastapi.testclient import TestClient
+from freezegun import freeze_time
 
-from src.dependencies import get_forecast_service, get_week_summary_service
+from src.dependencies import get_coordinate_grid, get_forecast_service, get_week_summary_service
 from src.main import app
-from src.models import WeatherForecastNotAvailableError, WeatherWeekSummaryNotAvailableError
+from src.metrics import NOT_AVAILABLE_ERRORS
+from src.models import Installation, WeatherForecastNotAvailableError, WeatherWeekSummaryNotAvailableError
+from src.services import DecimalCoordinateGrid
+from src.settings import settings
+from src.utils import RateLimiterTimeoutError
 
 
 class TestGetForecast:
@@ -21,6 +30,138 @@ class TestGetForecast:
 
         app.dependency_overrides.clear()
 
+    def test_get_forecast_installation_params(self, client: TestClient, mock_forecast_service: MagicMock) -> None:
+        app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
+
+        client.get('/api/v1/week_forecast', params={'latitude': 52.52, 'longitude': 13.419998})
+        response = client.get(
+            '/api/v1/week_forecast',
+            params={
+                'latitude': 52.52,
+                'longitude': 13.419998,
+                'installation_power_kw': 10,
+                'installation_efficiency': 0.25
+            }
+        )
+
+        assert response.status_code == 200
+        assert mock_forecast_service.get_weather_forecast_entry.await_args_list[0].args == (
+            52.52, 13.419998, None, None
+        )
+        assert mock_forecast_service.get_weather_forecast_entry.await_args_list[1].args == (52.52, 13.419998, 10, 0.25)
+
+        app.dependency_overrides.clear()
+
+    @pytest.mark.parametrize('params', [
+        {'installation_power_kw': 0},
+        {'installation_power_kw': -1},
+        {'installation_efficiency': 0},
+        {'installation_efficiency': 1.5}
+    ])
+    def test_get_forecast_invalid_installation_error(
+            self, client: TestClient, mock_forecast_service: MagicMock, params: dict
+    ) -> None:
+        app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
+
+        response = client.get('/api/v1/week_forecast', params={'latitude': 52.52, 'longitude': 13.419998, **params})
+
+        assert response.status_code == 422
+        assert response.json()['detail'][0]['loc'] == ['query', *params]
+
+        app.dependency_overrides.clear()
+
+    def test_get_forecast_access_log(
+            self, client: TestClient, mock_forecast_service: MagicMock, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
+
+        with caplog.at_level(logging.INFO, logger='access'):
+            client.get('/api/v1/week_forecast', params={'latitude': 52.52, 'longitude': 13.419998})
+
+        [record] = [record for record in caplog.records if record.name == 'access']
+        assert record.getMessage() == 'GET /api/v1/week_forecast 200'
+        assert record.fields['query'] == 'latitude=52.52&longitude=13.419998'
+        assert record.fields['status'] == 200
+        assert record.fields['latency_ms'] >= 0
+
+        app.dependency_overrides.clear()
+
+    @freeze_time('2024-12-09 12:00:00')
+    def test_get_forecast_caching_headers(self, client: TestClient, mock_forecast_service: MagicMock) -> None:
+        app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
+        app.dependency_overrides[get_coordinate_grid] = lambda: DecimalCoordinateGrid(decimals=2)
+        entry = mock_forecast_service.get_weather_forecast_entry.return_value
+        entry.created_at = time.time() - 600
+
+        response = client.get(
+            '/api/v1/week_forecast',
+            params={'latitude': 52.5219, 'longitude': 13.419998},
+            headers={'Accept-Encoding': 'identity'}
+        )
+
+        assert response.headers['ETag'] == entry.get_etag()
+        assert response.headers['Cache-Control'] == f'public, max-age={int(settings.cache_soft_ttl_seconds - 600)}'
+        assert response.headers['Surrogate-Key'] == 'week_forecast location_52.52_13.42'
+
+        app.dependency_overrides.clear()
+
+    def test_get_forecast_not_modified(self, client: TestClient, mock_forecast_service: MagicMock) -> None:
+        app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
+        etag = mock_forecast_service.get_weather_forecast_entry.return_value.get_etag()
+
+        response = client.get(
+            '/api/v1/week_forecast',
+            params={'latitude': 52.52, 'longitude': 13.419998},
+            headers={'If-None-Match': f'"other", W/{etag}', 'Accept-Encoding': 'identity'}
+        )
+
+        assert response.status_code == 304
+        assert response.content == b''
+        assert response.headers['ETag'] == etag
+
+        response = client.get(
+            '/api/v1/week_forecast',
+            params={'latitude': 52.52, 'longitude': 13.419998},
+            headers={'If-None-Match': '"other"'}
+        )
+
+        assert response.status_code == 200
+
+        app.dependency_overrides.clear()
+
+    def test_get_forecast_compressed_variant(self, client: TestClient, mock_forecast_service: MagicMock) -> None:
+        app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
+        entry = mock_forecast_service.get_weather_forecast_entry.return_value
+        params = {'latitude': 52.52, 'longitude': 13.419998}
+
+        response = client.get('/api/v1/week_forecast', params=params, headers={'Accept-Encoding': 'gzip;q=0.5, br;q=0'})
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['ETag'] == entry.get_etag('gzip')
+        assert response.headers['Vary'] == 'Accept-Encoding'
+        assert response.json()['latitude'] == 52.52
+
+        response = client.get('/api/v1/week_forecast', params=params, headers={'Accept-Encoding': 'identity'})
+
+        assert 'Content-Encoding' not in response.headers
+        assert response.headers['ETag'] == entry.get_etag()
+
+        app.dependency_overrides.clear()
+
+    def test_get_forecast_brotli_variant(self, client: TestClient, mock_forecast_service: MagicMock) -> None:
+        pytest.importorskip('brotli')
+        app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
+
+        response = client.get(
+            '/api/v1/week_forecast',
+            params={'latitude': 52.52, 'longitude': 13.419998},
+            headers={'Accept-Encoding': 'gzip, br'}
+        )
+
+        assert response.headers['Content-Encoding'] == 'br'
+
+        app.dependency_overrides.clear()
+
     def test_get_forecast_invalid_latitude_error(self, client: TestClient, mock_forecast_service: MagicMock) -> None:
         app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
 
@@ -67,13 +208,110 @@ class TestGetForecast:
         app.dependency_overrides.clear()
 
 
+class TestGetForecastBatch:
+    def test_get_forecast_batch_success(self, client: TestClient, mock_forecast_service: MagicMock) -> None:
+        app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
+
+        response = client.post(
+            '/api/v1/week_forecast/batch',
+            json={'locations': [{'latitude': 52.52, 'longitude': 13.419998}, {'latitude': 50, 'longitude': 10}]}
+        )
+
+        assert response.status_code == 200
+        mock_forecast_service.get_weather_forecasts.assert_awaited_once_with([(52.52, 13.419998), (50, 10)])
+
+        items = response.json()['items']
+        assert items[0]['forecast']['latitude'] == 52.52
+        assert items[0]['error'] is None
+        assert items[1] == {'forecast': None, 'error': 'WeatherForecastNotAvailableError'}
+
+        app.dependency_overrides.clear()
+
+    def test_get_forecast_batch_invalid_location_error(
+            self, client: TestClient, mock_forecast_service: MagicMock
+    ) -> None:
+        app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
+
+        response = client.post('/api/v1/week_forecast/batch', json={'locations': [{'latitude': 100, 'longitude': 10}]})
+
+        assert response.status_code == 422
+        assert response.json()['detail'][0]['loc'] == ['body', 'locations', 0, 'latitude']
+
+        app.dependency_overrides.clear()
+
+
+class TestGetFleetEnergy:
+    def test_get_fleet_energy_success(self, client: TestClient, mock_forecast_service: MagicMock) -> None:
+        app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
+        errors = NOT_AVAILABLE_ERRORS.values.get(('WeatherForecastNotAvailableError',), 0)
+        installations = [
+            {'latitude': 52.52, 'longitude': 13.419998, 'installation_power_kw': 5, 'installation_efficiency': 0.2},
+            {'latitude': 50, 'longitude': 10, 'installation_power_kw': 2.5, 'installation_efficiency': 0.25}
+        ]
+
+        response = client.post('/api/v1/week_forecast/fleet', json={'installations': installations})
+
+        assert response.status_code == 200
+        mock_forecast_service.get_installations_energy.assert_awaited_once_with(
+            [Installation(**installation) for installation in installations]
+        )
+        assert response.json() == {
+            'generated_energy_unit': 'kWh',
+            'items': [
+                {'energy': {'time': ['2024-12-09', '2024-12-10'], 'generated_energy': [1.25, 0.5]}, 'error': None},
+                {'energy': None, 'error': 'WeatherForecastNotAvailableError'}
+            ]
+        }
+        assert NOT_AVAILABLE_ERRORS.values.get(('WeatherForecastNotAvailableError',), 0) == errors + 1
+
+        app.dependency_overrides.clear()
+
+    @pytest.mark.parametrize('installation', [
+        {'latitude': 50, 'longitude': 10, 'installation_power_kw': 0, 'installation_efficiency': 0.2},
+        {'latitude': 50, 'longitude': 10, 'installation_power_kw': 2.5, 'installation_efficiency': 1.5},
+        {'latitude': 50, 'longitude': 10, 'installation_power_kw': 2.5}
+    ])
+    def test_get_fleet_energy_invalid_installation_error(
+            self, client: TestClient, mock_forecast_service: MagicMock, installation: dict
+    ) -> None:
+        app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
+
+        response = client.post('/api/v1/week_forecast/fleet', json={'installations': [installation]})
+
+        assert response.status_code == 422
+        assert response.json()['detail'][0]['loc'][:3] == ['body', 'installations', 0]
+
+        app.dependency_overrides.clear()
+
+    def test_get_fleet_energy_too_many_installations_error(
+            self, client: TestClient, mock_forecast_service: MagicMock
+    ) -> None:
+        app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
+        installation = {'latitude': 50, 'longitude': 10, 'installation_power_kw': 2.5, 'installation_efficiency': 0.2}
+
+        response = client.post(
+            '/api/v1/week_forecast/fleet',
+            json={'installations': [installation] * (settings.fleet_max_installations + 1)}
+        )
+
+        assert response.status_code == 422
+
+        app.dependency_overrides.clear()
+
+
 class TestGetWeekSummary:
     def test_get_week_summary_success(self, client: TestClient, mock_week_summary_service: MagicMock) -> None:
         app.dependency_overrides[get_week_summary_service] = lambda: mock_week_summary_service
 
-        response = client.get('/api/v1/week_forecast', params={'latitude': 52.52, 'longitude': 13.419998})
+        response = client.get(
+            '/api/v1/week_summary',
+            params={'latitude': 52.52, 'longitude': 13.419998},
+            headers={'Accept-Encoding': 'identity'}
+        )
 
         assert response.status_code == 200
+        assert response.headers['ETag'] == mock_week_summary_service.get_week_summary_entry.return_value.get_etag()
+        assert response.headers['Surrogate-Key'].startswith('week_summary location_')
         data = response.json()
         assert data['latitude'] == 52.52
         assert data['longitude'] == 13.419998
@@ -85,7 +323,7 @@ class TestGetWeekSummary:
     ) -> None:
         app.dependency_overrides[get_week_summary_service] = lambda: mock_week_summary_service
 
-        response = client.get('/api/v1/week_forecast', params={'latitude': -91, 'longitude': 13.419998})
+        response = client.get('/api/v1/week_summary', params={'latitude': -91, 'longitude': 13.419998})
 
         assert response.status_code == 422
 
@@ -101,7 +339,7 @@ class TestGetWeekSummary:
     ) -> None:
         app.dependency_overrides[get_week_summary_service] = lambda: mock_week_summary_service
 
-        response = client.get('/api/v1/week_forecast', params={'latitude': 52.52, 'longitude': -180.1})
+        response = client.get('/api/v1/week_summary', params={'latitude': 52.52, 'longitude': -180.1})
 
         assert response.status_code == 422
 
@@ -140,7 +378,7 @@ class TestExceptionHandel:
             raise WeatherForecastNotAvailableError()
 
         app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
-        mock_forecast_service.get_weather_forecast.side_effect = raise_error
+        mock_forecast_service.get_weather_forecast_entry.side_effect = raise_error
 
         response = client.get('/api/v1/week_forecast', params={'latitude': 52.52, 'longitude': 13.419998})
 
@@ -157,7 +395,7 @@ class TestExceptionHandel:
             raise WeatherWeekSummaryNotAvailableError()
 
         app.dependency_overrides[get_week_summary_service] = lambda: mock_week_summary_service
-        mock_week_summary_service.get_week_summary.side_effect = raise_error
+        mock_week_summary_service.get_week_summary_entry.side_effect = raise_error
 
         response = client.get('/api/v1/week_summary', params={'latitude': 52.52, 'longitude': 13.419998})
 
@@ -166,3 +404,48 @@ class TestExceptionHandel:
         assert error['id'] == 'WeatherWeekSummaryNotAvailableError'
 
         app.dependency_overrides.clear()
+
+    def test_rate_limited_error_handler(self, client: TestClient, mock_forecast_service: MagicMock) -> None:
+        def raise_error(*args, **kwargs) -> None:
+            raise WeatherForecastNotAvailableError(RateLimiterTimeoutError('Waited too long'))
+
+        app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
+        mock_forecast_service.get_weather_forecast_entry.side_effect = raise_error
+
+        response = client.get('/api/v1/week_forecast', params={'latitude': 52.52, 'longitude': 13.419998})
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == str(math.ceil(settings.open_meteo_rate_limit_max_wait_seconds))
+        assert response.json()['id'] == 'WeatherForecastNotAvailableError'
+
+        app.dependency_overrides.clear()
+
+
+class TestGetMetrics:
+    def test_get_metrics(self, client: TestClient, mock_forecast_service: MagicMock) -> None:
+        def raise_error(*args, **kwargs) -> None:
+            raise WeatherForecastNotAvailableError()
+
+        app.dependency_overrides[get_forecast_service] = lambda: mock_forecast_service
+        mock_forecast_service.get_weather_forecast_entry.side_effect = raise_error
+        errors = NOT_AVAILABLE_ERRORS.values.get(('WeatherForecastNotAvailableError',), 0)
+
+        client.get('/api/v1/week_forecast', params={'latitude': 52.52, 'longitude': 13.419998})
+        response = client.get('/metrics')
+
+        assert response.status_code == 200
+        assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+        assert (
+            'http_request_duration_seconds_count{endpoint="/api/v1/week_forecast",method="GET",status="500"}'
+            in response.text
+        )
+        assert (
+            f'weather_not_available_errors_total{{error="WeatherForecastNotAvailableError"}} {errors + 1}'
+            in response.text
+        )
+        assert '# TYPE cache_operations_total counter' in response.text
+        assert 'open_meteo_circuit_breaker_state{state="closed"} 1' in response.text
+        assert 'open_meteo_rate_limiter_requests{state="in_flight"} 0' in response.text
+        assert 'open_meteo_rate_limiter_rejections_total 0' in response.text
+
+        app.dependency_overrides.clear()
@@ -0,0 +1,71 @@
+import pytest
+
+from src.metrics import Counter, Histogram, MetricsRegistry
+
+
+class TestCounter:
+	def test_render(self) -> None:
+		counter = Counter('requests_total', 'Requests.', ('status',))
+		counter.inc('200')
+		counter.inc('200', value=2)
+		counter.inc('5"00')
+
+		assert counter.render() == [
+			'# HELP requests_total Requests.',
+			'# TYPE requests_total counter',
+			'requests_total{status="200"} 3',
+			'requests_total{status="5\\"00"} 1'
+		]
+
+
+class TestHistogram:
+	def test_render_cumulative_buckets(self) -> None:
+		histogram = Histogram('latency_seconds', 'Latency.', ('stage',), buckets=(0.1, 1))
+
+		for value in [0.05, 0.1, 0.5, 2]:
+			histogram.observe(value, 'parse')
+
+		assert histogram.render() == [
+			'# HELP latency_seconds Latency.',
+			'# TYPE latency_seconds histogram',
+			'latency_seconds_bucket{stage="parse",le="0.1"} 2',
+			'latency_seconds_bucket{stage="parse",le="1"} 3',
+			'latency_seconds_bucket{stage="parse",le="+Inf"} 4',
+			'latency_seconds_sum{stage="parse"} 2.65',
+			'latency_seconds_count{stage="parse"} 4'
+		]
+
+	def test_time_observes_block_also_on_error(self) -> None:
+		histogram = Histogram('latency_seconds', 'Latency.', ('stage',))
+
+		with histogram.time('parse'):
+			pass
+
+		with pytest.raises(ValueError):
+			with histogram.time('parse'):
+				raise ValueError()
+
+		assert sum(histogram.counts[('parse',)]) == 2
+
+
+class TestMetricsRegistry:
+	def test_render(self) -> None:
+		registry = MetricsRegistry()
+		registry.counter('errors_total', 'Errors.').inc()
+		registry.callback('cache_operations_total', 'Cache.', 'counter', ('operation',), lambda: {('hits',): 5})
+
+		assert registry.render() == (
+			'# HELP errors_total Errors.\n'
+			'# TYPE errors_total counter\n'
+			'errors_total 1\n'
+			'# HELP cache_operations_total Cache.\n'
+			'# TYPE cache_operations_total counter\n'
+			'cache_operations_total{operation="hits"} 5\n'
+		)
+
+	def test_register_same_name_error(self) -> None:
+		registry = MetricsRegistry()
+		registry.counter('errors_total', 'Errors.')
+
+		with pytest.raises(ValueError):
+			registry.histogram('errors_total', 'Errors.')
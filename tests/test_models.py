@@ -1,6 +1,9 @@
+import time
+
 import pytest
+from pydantic import BaseModel
 
-from src.models import DayEnum
+from src.models import CacheEntry, DayEnum
 
 
 class TestDayEnum:
@@ -15,3 +18,14 @@ class TestDayEnum:
 		for invalid_index in invalid_indices:
 			with pytest.raises(Exception, match="Couldn't resolve day!"):
 				DayEnum.get_by_index(invalid_index)
+
+
+class TestCacheEntry:
+	def test_get_body_rendered_once(self) -> None:
+		class CachedValue(BaseModel):
+			value: str
+
+		entry = CacheEntry(value=CachedValue(value='a'), created_at=time.time())
+
+		assert entry.get_body() == b'{"value":"a"}'
+		assert entry.get_body() is entry.get_body()
@@ -0,0 +1,394 @@
+import asyncio
+import gzip
+import time
+from pathlib import Path
+
+import pytest
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+from freezegun import freeze_time
+from pydantic import BaseModel
+
+from src.models import CacheEntry
+from src.services import (
+	BoundedCacheService,
+	DecimalCoordinateGrid,
+	ExactCoordinateGrid,
+	HotLocationTracker,
+	PrewarmScheduler,
+	RedisCacheService,
+	ResolutionCoordinateGrid,
+	SqliteCacheService,
+	StaleWhileRevalidateCache,
+)
+from src.utils import SingleFlight, access_log_fields
+
+
+class CachedValue(BaseModel):
+	value: str
+
+
+class TestCoordinateGrid:
+	def test_exact_coordinate_grid(self) -> None:
+		assert ExactCoordinateGrid().snap(52.2297, 21.0122) == (52.2297, 21.0122)
+
+	def test_decimal_coordinate_grid(self) -> None:
+		grid = DecimalCoordinateGrid(decimals=2)
+
+		assert grid.snap(52.2297, 21.0122) == (52.23, 21.01)
+		assert grid.snap(52.2297, 21.0122) == grid.snap(52.2298, 21.0121)
+
+	def test_resolution_coordinate_grid(self) -> None:
+		grid = ResolutionCoordinateGrid(resolution=0.1)
+
+		assert grid.snap(52.2297, 21.0122) == (52.2, 21.0)
+		assert grid.snap(0.26, -0.34) == (0.3, -0.3)
+		assert grid.snap(-89.99, 179.96) == (-90.0, 180.0)
+
+
+class TestBoundedCacheService:
+	@pytest.mark.anyio
+	async def test_get_cache_success(self) -> None:
+		cache_service = BoundedCacheService(max_entries=10, max_bytes=1024, ttl_seconds=60)
+		await cache_service.add_cache('key', CachedValue(value='a'))
+
+		assert await cache_service.get_cache('key') == CachedValue(value='a')
+		assert await cache_service.get_cache('other_key') is None
+		assert cache_service.get_stats() == {'hits': 1, 'misses': 1, 'evictions': 0, 'expirations': 0}
+
+	@pytest.mark.anyio
+	async def test_add_cache_evicts_least_recently_used_entry(self) -> None:
+		cache_service = BoundedCacheService(max_entries=2, max_bytes=1024, ttl_seconds=60)
+		await cache_service.add_cache('key1', CachedValue(value='a'))
+		await cache_service.add_cache('key2', CachedValue(value='b'))
+
+		# Using key1 makes key2 the least recently used entry.
+		await cache_service.get_cache('key1')
+		await cache_service.add_cache('key3', CachedValue(value='c'))
+
+		assert await cache_service.get_cache('key1') is not None
+		assert await cache_service.get_cache('key2') is None
+		assert await cache_service.get_cache('key3') is not None
+		assert cache_service.evictions == 1
+
+	@pytest.mark.anyio
+	async def test_add_cache_evicts_entries_over_byte_budget(self) -> None:
+		value = CachedValue(value='a' * 100)
+		# Size of the JSON body.
+		value_size = len(CacheEntry(value=value, created_at=0).get_body())
+		cache_service = BoundedCacheService(max_entries=10, max_bytes=value_size * 2, ttl_seconds=60)
+
+		for i in range(3):
+			await cache_service.add_cache(f'key{i}', value)
+
+		assert len(cache_service.entries) == 2
+		assert cache_service.size == value_size * 2
+		assert await cache_service.get_cache('key0') is None
+		assert cache_service.evictions == 1
+
+	@pytest.mark.anyio
+	async def test_add_cache_skips_value_over_byte_budget(self) -> None:
+		cache_service = BoundedCacheService(max_entries=10, max_bytes=10, ttl_seconds=60)
+		await cache_service.add_cache('key', CachedValue(value='a' * 100))
+
+		assert await cache_service.get_cache('key') is None
+		assert cache_service.size == 0
+
+	@pytest.mark.anyio
+	async def test_entry_compressed_when_first_sent(self) -> None:
+		cache_service = BoundedCacheService(max_entries=10, max_bytes=1024, ttl_seconds=60)
+		await cache_service.add_cache('key', CachedValue(value='a'))
+		entry = await cache_service.get_cache_entry('key')
+
+		assert entry.encoded_bodies == {}
+
+		body = entry.get_encoded_body('gzip')
+
+		assert gzip.decompress(body) == entry.get_body()
+		assert (await cache_service.get_cache_entry('key')).encoded_bodies == {'gzip': body}
+
+	@pytest.mark.anyio
+	async def test_get_cache_expired_entry(self) -> None:
+		with freeze_time('2024-12-09 12:00:00') as frozen_time:
+			cache_service = BoundedCacheService(max_entries=10, max_bytes=1024, ttl_seconds=60)
+			await cache_service.add_cache('key', CachedValue(value='a'))
+
+			frozen_time.tick(59)
+			assert await cache_service.get_cache('key') is not None
+
+			frozen_time.tick(1)
+			assert await cache_service.get_cache('key') is None
+			assert cache_service.expirations == 1
+			assert cache_service.size == 0
+
+
+class TestStaleWhileRevalidateCache:
+	@pytest.mark.anyio
+	async def test_get_sets_access_log_cache_status(self) -> None:
+		cache = StaleWhileRevalidateCache(
+			BoundedCacheService(max_entries=10, max_bytes=1024, ttl_seconds=60), 10, SingleFlight()
+		)
+		statuses = []
+
+		async def create() -> CacheEntry:
+			return CacheEntry(value=CachedValue(value='a'), created_at=time.time() - 20)
+
+		for _ in range(2):
+			fields = {}
+			token = access_log_fields.set(fields)
+			await cache.get('key', create)
+			access_log_fields.reset(token)
+			statuses.append(fields['cache'])
+
+		assert statuses == ['miss', 'stale']
+
+	@pytest.mark.anyio
+	async def test_returns_stored_entry(self) -> None:
+		cache_service = BoundedCacheService(max_entries=10, max_bytes=1024, ttl_seconds=60)
+		cache = StaleWhileRevalidateCache(cache_service, 10, SingleFlight())
+
+		async def create() -> CacheEntry:
+			return CacheEntry(value=CachedValue(value='a'), created_at=time.time())
+
+		entry = await cache.get('key', create)
+
+		# Body rendered for the first response is kept for the following hits.
+		assert entry is await cache_service.get_cache_entry('key')
+		assert await cache.get('key', create) is entry
+		assert await cache.refresh('key', create, max_age=10) is entry
+		assert await cache.refresh('key', create, max_age=-1) is await cache_service.get_cache_entry('key')
+
+
+class TestRedisCacheService:
+	def create_service(self, redis: FakeRedis) -> RedisCacheService:
+		return RedisCacheService(redis=redis, ttl_seconds=60, models=[CachedValue])
+
+	@pytest.mark.anyio
+	async def test_get_cache_success(self) -> None:
+		cache_service = self.create_service(FakeRedis())
+		await cache_service.add_cache('key', CachedValue(value='a'))
+
+		assert await cache_service.get_cache('key') == CachedValue(value='a')
+		assert await cache_service.get_cache('other_key') is None
+		# Stored JSON is reused as the rendered body, and the stored payload as its gzip variant.
+		entry = await cache_service.get_cache_entry('key')
+		assert entry.body == b'{"value":"a"}'
+		assert gzip.decompress(entry.encoded_bodies['gzip']) == entry.body
+		assert entry.content_encodings == ('gzip',)
+
+	@pytest.mark.anyio
+	async def test_add_cache_returns_stored_entry(self) -> None:
+		cache_service = self.create_service(FakeRedis())
+
+		entry = await cache_service.add_cache('key', CachedValue(value='a'))
+
+		# Body and its gzip variant are created for the stored payload already.
+		assert entry.body == b'{"value":"a"}'
+		assert entry.encoded_bodies['gzip'] == (await cache_service.get_cache_entry('key')).encoded_bodies['gzip']
+		assert entry.content_encodings == ('gzip',)
+
+	@pytest.mark.anyio
+	async def test_add_cache_sets_ttl(self) -> None:
+		redis = FakeRedis()
+		cache_service = self.create_service(redis)
+		await cache_service.add_cache('key', CachedValue(value='a'))
+
+		assert 0 < await redis.pttl('key') <= 60_000
+
+	@pytest.mark.anyio
+	async def test_add_cache_ttl_counted_from_created_at(self) -> None:
+		redis = FakeRedis()
+		cache_service = self.create_service(redis)
+		await cache_service.add_cache('key', CachedValue(value='a'), created_at=time.time() - 50)
+		await cache_service.add_cache('expired_key', CachedValue(value='b'), created_at=time.time() - 60)
+
+		assert 0 < await redis.pttl('key') <= 10_000
+		assert (await cache_service.get_cache_entry('key')).get_age() >= 50
+		assert await cache_service.get_cache('expired_key') is None
+
+	@pytest.mark.anyio
+	async def test_get_many_cache_success(self) -> None:
+		cache_service = self.create_service(FakeRedis())
+		await cache_service.add_cache('key1', CachedValue(value='a'))
+		await cache_service.add_cache('key3', CachedValue(value='c'))
+
+		values = await cache_service.get_many_cache(['key1', 'key2', 'key3'])
+
+		assert values == [CachedValue(value='a'), None, CachedValue(value='c')]
+
+	@pytest.mark.anyio
+	async def test_get_cache_redis_unavailable(self) -> None:
+		server = FakeServer()
+		server.connected = False
+		cache_service = self.create_service(FakeRedis(server=server))
+
+		await cache_service.add_cache('key', CachedValue(value='a'))
+
+		assert await cache_service.get_cache('key') is None
+		assert await cache_service.get_many_cache(['key']) == [None]
+
+
+	@pytest.mark.anyio
+	async def test_get_cache_incompatible_entries(self) -> None:
+		class CachedValueV2(BaseModel):
+			renamed_value: str
+
+		redis = FakeRedis()
+		await self.create_service(redis).add_cache('key', CachedValue(value='a'))
+		# The same model name with a changed schema (e.g. after deployment of a new version).
+		CachedValueV2.__name__ = 'CachedValue'
+		cache_service = RedisCacheService(redis=redis, ttl_seconds=60, models=[CachedValueV2])
+		model_version = cache_service.serializer.model_versions[CachedValueV2]
+		await redis.set('damaged_key', f'{model_version}:1733702400.0:not compressed'.encode())
+
+		assert await cache_service.get_cache('key') is None
+		assert await cache_service.get_many_cache(['key', 'damaged_key']) == [None, None]
+
+
+class TestSqliteCacheService:
+	def create_service(self, path: Path, ttl_seconds: float = 60) -> SqliteCacheService:
+		return SqliteCacheService(path=str(path / 'cache.sqlite3'), ttl_seconds=ttl_seconds, models=[CachedValue])
+
+	@pytest.mark.anyio
+	async def test_get_cache_success(self, tmp_path: Path) -> None:
+		cache_service = self.create_service(tmp_path)
+		await cache_service.add_cache('key', CachedValue(value='a'))
+
+		assert await cache_service.get_cache('key') == CachedValue(value='a')
+		assert await cache_service.get_cache('other_key') is None
+
+	@pytest.mark.anyio
+	async def test_get_cache_expired_entry(self, tmp_path: Path) -> None:
+		with freeze_time('2024-12-09 12:00:00') as frozen_time:
+			cache_service = self.create_service(tmp_path)
+			await cache_service.add_cache('key', CachedValue(value='a'))
+
+			frozen_time.tick(59)
+			assert await cache_service.get_cache('key') is not None
+
+			frozen_time.tick(1)
+			assert await cache_service.get_cache('key') is None
+
+	@pytest.mark.anyio
+	async def test_get_many_cache_success(self, tmp_path: Path) -> None:
+		cache_service = self.create_service(tmp_path)
+		await cache_service.add_cache('key1', CachedValue(value='a'))
+		await cache_service.add_cache('key3', CachedValue(value='c'))
+
+		values = await cache_service.get_many_cache(['key1', 'key2', 'key3'])
+
+		assert values == [CachedValue(value='a'), None, CachedValue(value='c')]
+
+	@pytest.mark.anyio
+	async def test_add_cache_sweeps_expired_entries_periodically(self, tmp_path: Path) -> None:
+		with freeze_time('2024-12-09 12:00:00') as frozen_time:
+			cache_service = self.create_service(tmp_path, ttl_seconds=10)
+			await cache_service.add_cache('key1', CachedValue(value='a'))
+
+			# Expired, but the previous sweep was less than a minute ago.
+			frozen_time.tick(10)
+			await cache_service.add_cache('key2', CachedValue(value='b'))
+			assert cache_service.connection.execute('SELECT COUNT(*) FROM cache').fetchone() == (2,)
+
+			frozen_time.tick(50)
+			await cache_service.add_cache('key3', CachedValue(value='c'))
+			assert cache_service.connection.execute('SELECT key FROM cache').fetchall() == [('key3',)]
+
+	@pytest.mark.anyio
+	async def test_get_cache_damaged_entry(self, tmp_path: Path) -> None:
+		cache_service = self.create_service(tmp_path)
+		model_version = cache_service.serializer.model_versions[CachedValue]
+		cache_service.connection.execute(
+			'INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+			('key', f'{model_version}:1733702400.0:not compressed'.encode(), time.time() + 60)
+		)
+
+		assert await cache_service.get_cache('key') is None
+		assert await cache_service.get_many_cache(['key']) == [None]
+
+	@pytest.mark.anyio
+	async def test_cache_shared_between_instances(self, tmp_path: Path) -> None:
+		cache_service = self.create_service(tmp_path)
+		await cache_service.add_cache('key', CachedValue(value='a'))
+		await cache_service.close()
+
+		# Another process (or the same one after restart) opens the same database file.
+		other_cache_service = self.create_service(tmp_path)
+
+		assert await other_cache_service.get_cache('key') == CachedValue(value='a')
+
+
+class TestHotLocationTracker:
+	def test_get_top_success(self) -> None:
+		tracker = HotLocationTracker(capacity=10)
+
+		for latitude, count in [(1.0, 1), (2.0, 3), (3.0, 2)]:
+			for _ in range(count):
+				tracker.record(latitude, 0.0)
+
+		assert tracker.get_top(2) == [(2.0, 0.0), (3.0, 0.0)]
+
+	def test_record_replaces_least_popular_location(self) -> None:
+		tracker = HotLocationTracker(capacity=2)
+
+		for latitude, count in [(1.0, 3), (2.0, 1), (3.0, 2)]:
+			for _ in range(count):
+				tracker.record(latitude, 0.0)
+
+		assert set(tracker.locations) == {(1.0, 0.0), (3.0, 0.0)}
+
+	def test_decay(self) -> None:
+		tracker = HotLocationTracker(capacity=10)
+
+		for _ in range(4):
+			tracker.record(1.0, 0.0)
+
+		tracker.decay()
+
+		assert tracker.locations[(1.0, 0.0)] == 2
+		assert tracker.sketch.estimate((1.0, 0.0)) == 2
+
+	def test_decay_forgets_locations_without_traffic(self) -> None:
+		tracker = HotLocationTracker(capacity=1)
+		tracker.record(1.0, 2.0)
+
+		for _ in range(10):
+			tracker.decay()
+
+		assert tracker.get_top(10) == []
+
+		# Freed slot is available for new locations.
+		tracker.record(3.0, 4.0)
+		assert tracker.get_top(10) == [(3.0, 4.0)]
+
+
+class TestPrewarmScheduler:
+	@pytest.mark.anyio
+	async def test_prewarm_top_locations(self) -> None:
+		tracker = HotLocationTracker(capacity=10)
+		prewarmed = []
+		running = 0
+		max_running = 0
+
+		async def prewarm(latitude: float, longitude: float) -> None:
+			nonlocal running, max_running
+			running += 1
+			max_running = max(max_running, running)
+			await asyncio.sleep(0)
+			running -= 1
+
+			if latitude == 3.0:
+				raise ValueError('Prewarm failed')
+
+			prewarmed.append((latitude, longitude))
+
+		for latitude in [1.0, 2.0, 2.0, 3.0, 3.0, 3.0]:
+			tracker.record(latitude, 0.0)
+
+		scheduler = PrewarmScheduler(
+			hot_location_tracker=tracker, prewarm=prewarm, top_locations=2, interval_seconds=60, concurrency=1
+		)
+		await scheduler.prewarm_top_locations()
+
+		assert prewarmed == [(2.0, 0.0)]
+		assert max_running == 1
@@ -0,0 +1,324 @@
+import asyncio
+import json
+import logging
+import time
+
+import pytest
+from freezegun import freeze_time
+
+from src.utils import (
+	BoundedQueueHandler,
+	CircuitBreaker,
+	CircuitBreakerOpenError,
+	JSONFormatter,
+	LogPipeline,
+	MicroBatcher,
+	RateLimiter,
+	RateLimiterTimeoutError,
+	RetryPolicy,
+	SamplingFilter,
+	create_logger,
+)
+
+
+def create_record(level: int = logging.INFO, message: str = 'message %s', args: tuple = ('a',)) -> logging.LogRecord:
+	return logging.LogRecord('test', level, __file__, 1, message, args, None)
+
+
+class TestLogging:
+	def test_create_logger_adds_handler_once(self) -> None:
+		create_logger('TestLogging')
+		logger = create_logger('TestLogging')
+
+		assert len(logger.handlers) == 1
+		assert len(logger.filters) == 1
+
+	def test_queue_handler_drops_records_when_full(self) -> None:
+		handler = BoundedQueueHandler(queue_size=2)
+
+		for _ in range(3):
+			handler.handle(create_record())
+
+		assert handler.queue.qsize() == 2
+		assert handler.dropped_records == 1
+		assert handler.queue.get_nowait().msg == 'message a'
+
+	def test_sampling_filter_keeps_warnings(self) -> None:
+		sampling_filter = SamplingFilter(rate=0)
+
+		assert not sampling_filter.filter(create_record(logging.INFO))
+		assert sampling_filter.filter(create_record(logging.WARNING))
+		assert sampling_filter.sampled_out_records == 1
+
+	def test_formatter_adds_fields(self) -> None:
+		record = create_record()
+		record.fields = {'status': 200, 'latency_ms': 1.5}
+
+		actual = json.loads(JSONFormatter().format(record))
+
+		assert actual['message'] == 'message a'
+		assert actual['status'] == 200
+		assert actual['latency_ms'] == 1.5
+
+	def test_pipeline_writes_queued_records_on_stop(self) -> None:
+		written = []
+		pipeline = LogPipeline(queue_size=10, sample_rates={'sampled': 0})
+		pipeline.stream_handler.emit = written.append
+		logger = logging.getLogger('sampled')
+		logger.setLevel(logging.INFO)
+		pipeline.add_logger(logger)
+
+		try:
+			logger.info('skipped')
+			logger.warning('written')
+		finally:
+			pipeline.stop()
+			logger.removeHandler(pipeline.handler)
+			logger.removeFilter(pipeline.sampling_filters['sampled'])
+
+		assert [record.getMessage() for record in written] == ['written']
+		assert pipeline.get_stats() == {'dropped_records': 0, 'sampled_out_records': 1}
+
+
+class TestMicroBatcher:
+	@pytest.mark.anyio
+	async def test_submit_merges_concurrent_keys(self) -> None:
+		batches = []
+
+		async def function(keys: list[int]) -> list[int | Exception]:
+			batches.append(keys)
+			return [ValueError(key) if key < 0 else key * 10 for key in keys]
+
+		batcher = MicroBatcher(function, window_seconds=0.01, max_batch_size=10)
+
+		actual = await asyncio.gather(
+			batcher.submit(1), batcher.submit(2), batcher.submit(1), batcher.submit(-1), return_exceptions=True
+		)
+
+		assert batches == [[1, 2, -1]]
+		assert actual[:3] == [10, 20, 10]
+		assert isinstance(actual[3], ValueError)
+
+	@pytest.mark.anyio
+	async def test_submit_flushes_full_batch_immediately(self) -> None:
+		batches = []
+
+		async def function(keys: list[int]) -> list[int | Exception]:
+			batches.append(keys)
+			return keys
+
+		# The window is never reached - full batches are sent right away.
+		batcher = MicroBatcher(function, window_seconds=60, max_batch_size=2)
+
+		actual = await asyncio.wait_for(asyncio.gather(*[batcher.submit(key) for key in range(4)]), timeout=1)
+
+		assert actual == [0, 1, 2, 3]
+		assert batches == [[0, 1], [2, 3]]
+
+	@pytest.mark.anyio
+	async def test_submit_shares_batch_error(self) -> None:
+		async def function(keys: list[int]) -> list[int | Exception]:
+			raise ConnectionError('Upstream not available')
+
+		batcher = MicroBatcher(function, window_seconds=0.01, max_batch_size=10)
+
+		actual = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+		assert all(isinstance(result, ConnectionError) for result in actual)
+
+	@pytest.mark.anyio
+	async def test_submit_fails_when_result_is_missing(self) -> None:
+		async def function(keys: list[int]) -> list[int | Exception]:
+			return keys[:1]
+
+		batcher = MicroBatcher(function, window_seconds=0.01, max_batch_size=10)
+
+		actual = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+		assert actual[0] == 1
+		assert isinstance(actual[1], RuntimeError)
+
+	@pytest.mark.anyio
+	async def test_close_sends_pending_keys(self) -> None:
+		batches = []
+
+		async def function(keys: list[int]) -> list[int | Exception]:
+			batches.append(keys)
+			return keys
+
+		batcher = MicroBatcher(function, window_seconds=60, max_batch_size=10)
+		submitted = asyncio.ensure_future(batcher.submit(1))
+		await asyncio.sleep(0)
+
+		await batcher.close()
+
+		assert batches == [[1]]
+		assert await submitted == 1
+
+
+class TestRetryPolicy:
+	def test_get_delay_is_jittered_and_capped(self) -> None:
+		retry_policy = RetryPolicy(max_retries=5, base_delay_seconds=0.1, max_delay_seconds=0.3)
+
+		delays = [[retry_policy.get_delay(attempt) for _ in range(100)] for attempt in range(4)]
+
+		assert all(0 <= delay <= 0.1 for delay in delays[0])
+		assert all(0 <= delay <= 0.2 for delay in delays[1])
+		assert all(0 <= delay <= 0.3 for delay in delays[3])
+		assert len(set(delays[0])) > 1
+
+
+class TestCircuitBreaker:
+	@staticmethod
+	async def succeed() -> str:
+		return 'result'
+
+	@staticmethod
+	async def fail() -> str:
+		raise ConnectionError('Upstream not available')
+
+	@pytest.mark.anyio
+	async def test_call_opens_circuit_after_consecutive_failures(self) -> None:
+		circuit_breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout_seconds=60)
+
+		with pytest.raises(ConnectionError):
+			await circuit_breaker.call(self.fail)
+
+		# Success resets the number of consecutive failures.
+		assert await circuit_breaker.call(self.succeed) == 'result'
+
+		for _ in range(2):
+			with pytest.raises(ConnectionError):
+				await circuit_breaker.call(self.fail)
+
+		with pytest.raises(CircuitBreakerOpenError):
+			await circuit_breaker.call(self.succeed)
+
+		assert circuit_breaker.get_state() == 'open'
+		assert circuit_breaker.get_stats() == {'closed': 0, 'open': 1, 'half_open': 0}
+
+	@pytest.mark.anyio
+	async def test_call_closes_circuit_after_successful_trial(self) -> None:
+		circuit_breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout_seconds=60)
+
+		with freeze_time('2024-12-09 12:00:00') as frozen_time:
+			with pytest.raises(ConnectionError):
+				await circuit_breaker.call(self.fail)
+
+			frozen_time.tick(60)
+
+			assert circuit_breaker.get_state() == 'half_open'
+			assert await circuit_breaker.call(self.succeed) == 'result'
+
+		assert circuit_breaker.get_state() == 'closed'
+		assert circuit_breaker.get_stats() == {'closed': 1, 'open': 1, 'half_open': 1}
+
+	@pytest.mark.anyio
+	async def test_call_reopens_circuit_after_failed_trial(self) -> None:
+		circuit_breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout_seconds=60)
+
+		with freeze_time('2024-12-09 12:00:00') as frozen_time:
+			with pytest.raises(ConnectionError):
+				await circuit_breaker.call(self.fail)
+
+			frozen_time.tick(60)
+
+			with pytest.raises(ConnectionError):
+				await circuit_breaker.call(self.fail)
+
+			assert circuit_breaker.get_state() == 'open'
+
+	@pytest.mark.anyio
+	async def test_call_lets_single_trial_through(self) -> None:
+		circuit_breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout_seconds=0)
+		trial_started = asyncio.Event()
+		trial_finished = asyncio.Event()
+
+		async def trial() -> str:
+			trial_started.set()
+			await trial_finished.wait()
+			return 'result'
+
+		with pytest.raises(ConnectionError):
+			await circuit_breaker.call(self.fail)
+
+		trial_task = asyncio.ensure_future(circuit_breaker.call(trial))
+		await trial_started.wait()
+
+		with pytest.raises(CircuitBreakerOpenError):
+			await circuit_breaker.call(self.succeed)
+
+		trial_finished.set()
+
+		assert await trial_task == 'result'
+		assert circuit_breaker.get_state() == 'closed'
+
+	@pytest.mark.anyio
+	async def test_call_ignores_given_errors(self) -> None:
+		circuit_breaker = CircuitBreaker(
+			'test', failure_threshold=1, reset_timeout_seconds=60, ignored_errors=(RateLimiterTimeoutError,)
+		)
+
+		async def reject() -> str:
+			raise RateLimiterTimeoutError()
+
+		with pytest.raises(RateLimiterTimeoutError):
+			await circuit_breaker.call(reject)
+
+		assert circuit_breaker.get_state() == 'closed'
+
+
+class TestRateLimiter:
+	@pytest.mark.anyio
+	async def test_acquire_limits_calls_in_flight(self) -> None:
+		rate_limiter = RateLimiter('test', max_in_flight=2, rate_per_second=1000, burst=10, max_wait_seconds=1)
+
+		await rate_limiter.acquire()
+		await rate_limiter.acquire()
+		waiting = asyncio.ensure_future(rate_limiter.acquire())
+		await asyncio.sleep(0.01)
+
+		assert not waiting.done()
+		assert rate_limiter.get_stats() == {'in_flight': 2, 'waiting': 1, 'rejected': 0}
+
+		rate_limiter.release()
+		await asyncio.wait_for(waiting, timeout=1)
+
+		assert rate_limiter.get_stats() == {'in_flight': 2, 'waiting': 0, 'rejected': 0}
+
+	@pytest.mark.anyio
+	async def test_acquire_limits_rate_after_burst(self) -> None:
+		rate_limiter = RateLimiter('test', max_in_flight=10, rate_per_second=50, burst=2, max_wait_seconds=1)
+		started_at = time.monotonic()
+
+		for _ in range(5):
+			await rate_limiter.acquire()
+			rate_limiter.release()
+
+		# Two calls use the burst, the remaining three wait for a token (20 ms) each.
+		assert time.monotonic() - started_at >= 0.055
+
+	@pytest.mark.anyio
+	async def test_acquire_fails_when_wait_is_exceeded(self) -> None:
+		rate_limiter = RateLimiter('test', max_in_flight=1, rate_per_second=1000, burst=10, max_wait_seconds=0.01)
+
+		await rate_limiter.acquire()
+
+		with pytest.raises(RateLimiterTimeoutError):
+			await rate_limiter.acquire()
+
+		assert rate_limiter.get_stats() == {'in_flight': 1, 'waiting': 0, 'rejected': 1}
+
+	@pytest.mark.anyio
+	async def test_acquire_fails_right_away_when_token_comes_too_late(self) -> None:
+		rate_limiter = RateLimiter('test', max_in_flight=1, rate_per_second=0.1, burst=1, max_wait_seconds=5)
+
+		await rate_limiter.acquire()
+		rate_limiter.release()
+
+		with pytest.raises(RateLimiterTimeoutError):
+			await asyncio.wait_for(rate_limiter.acquire(), timeout=1)
+
+		# The slot taken by the rejected call is free again.
+		rate_limiter.tokens = 1
+		await asyncio.wait_for(rate_limiter.acquire(), timeout=1)